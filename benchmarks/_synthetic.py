@@ -0,0 +1,65 @@
+"""
+Synthetic embedding corpora for the offline benchmarks.
+
+Real embedding sets are low-rank and clustered, so vectors are drawn from
+clusters in a small latent space, projected up to `dim` and perturbed with
+noise. Queries are noisy copies of corpus vectors, which gives every query
+a meaningful neighbourhood.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def corpus(n: int, dim: int = 1536, latent: int = 64, clusters: int = 50, noise: float = 0.25, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((latent, dim)).astype(np.float32)
+    centers = rng.standard_normal((clusters, latent)).astype(np.float32)
+    assign = rng.integers(0, clusters, size=n)
+    points = centers[assign] + 0.5 * rng.standard_normal((n, latent)).astype(np.float32)
+    vectors = points @ basis + noise * np.sqrt(latent) * rng.standard_normal((n, dim)).astype(np.float32)
+    return _unit(vectors).astype(np.float32)
+
+
+def queries(vectors: np.ndarray, count: int, noise: float = 0.5, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), size=count)]
+    jitter = rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return _unit(picked + noise * jitter).astype(np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """Brute-force cosine ground truth, (num_queries, k) row indices."""
+    scores = query_vectors @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def percentile_ms(samples, pct: float) -> float:
+    return float(np.percentile(np.asarray(samples) * 1000, pct)) if len(samples) else 0.0
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """cl100k token count, falling back to a ~4 chars/token estimate when tiktoken data is unavailable."""
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
@@ -0,0 +1,104 @@
+"""
+Benchmark Chroma HNSW parameters: recall@k versus exact search, latency, size.
+
+Builds one persistent Chroma collection per (space, M, construction ef) on
+a synthetic clustered corpus, then sweeps the query-time search ef on it
+(reopening the collection each time, since ef is read when it is loaded).
+Every row reports recall@k against brute-force cosine ground truth, single
+query p50 / p99 latency and the on-disk size of the vector segment. The
+first row is the brute-force numpy search itself.
+
+The parameters map to RAGBOT_HNSW_SPACE, RAGBOT_HNSW_M,
+RAGBOT_HNSW_EF_CONSTRUCTION and RAGBOT_HNSW_EF_SEARCH in ingestion.py.
+
+    python -m benchmarks.bench_hnsw --chunks 20000 --dim 768 --queries 200 --m 8 16 32 --ef-search 10 50 100 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+import chromadb
+
+from benchmarks._synthetic import corpus, exact_top_k, percentile_ms, queries
+from indexing.search import hnsw_configuration
+from indexing.tenants import directory_bytes
+
+
+def _segment_bytes(root: Path) -> int:
+    # Vector segments are the per-collection directories next to chroma.sqlite3
+    return sum(directory_bytes(p) for p in root.iterdir() if p.is_dir())
+
+
+def _row(label: str, build_s: float, recall: float, latencies, size_bytes: int) -> str:
+    return (
+        f"{label:<30}{build_s:>9.1f}{recall:>10.3f}"
+        f"{percentile_ms(latencies, 50):>9.2f}{percentile_ms(latencies, 99):>9.2f}{size_bytes / 1e6:>10.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", nargs="+", default=["cosine"], choices=("l2", "cosine", "ip"))
+    parser.add_argument("--m", nargs="+", type=int, default=[8, 16, 32], help="HNSW graph degree (max_neighbors)")
+    parser.add_argument("--ef-construction", nargs="+", type=int, default=[100, 200])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[10, 50, 100, 200])
+    args = parser.parse_args()
+
+    vectors = corpus(args.chunks, args.dim)
+    query_vectors = queries(vectors, args.queries)
+    truth = exact_top_k(vectors, query_vectors, args.k)
+
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'setting':<30}{'build s':>9}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}{'size MB':>10}")
+    latencies = []
+    for q in query_vectors:
+        start = perf_counter()
+        exact_top_k(vectors, q[None, :], args.k)
+        latencies.append(perf_counter() - start)
+    print(_row("brute force (numpy)", 0.0, 1.0, latencies, vectors.nbytes))
+
+    ids = [str(i) for i in range(len(vectors))]
+    for space in args.space:
+        for m in args.m:
+            for ef_construction in args.ef_construction:
+                with tempfile.TemporaryDirectory() as tmp:
+                    client = chromadb.PersistentClient(tmp)
+                    collection = client.create_collection(
+                        "bench-hnsw", configuration=hnsw_configuration(space, m, ef_construction)
+                    )
+                    start = perf_counter()
+                    batch = client.get_max_batch_size()
+                    for offset in range(0, len(vectors), batch):
+                        collection.add(ids=ids[offset : offset + batch], embeddings=vectors[offset : offset + batch])
+                    build_s = perf_counter() - start
+                    size = _segment_bytes(Path(tmp))
+
+                    for ef_search in args.ef_search:
+                        # Search ef is read when the segment is loaded: reopen the client
+                        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+                        client.close()
+                        client = chromadb.PersistentClient(tmp)
+                        collection = client.get_collection("bench-hnsw")
+                        hits, latencies = 0, []
+                        for q, expected in zip(query_vectors, truth):
+                            start = perf_counter()
+                            found = collection.query(query_embeddings=[q], n_results=args.k, include=[])
+                            latencies.append(perf_counter() - start)
+                            hits += len({int(i) for i in found["ids"][0]} & set(expected.tolist()))
+                        recall = hits / (len(query_vectors) * args.k)
+                        label = f"{space} M={m} efC={ef_construction} efS={ef_search}"
+                        print(_row(label, build_s, recall, latencies, size))
+                    client.close()
+    print("size: on-disk vector segment (HNSW graph + vectors); brute force: raw float32 vectors.")
+
+
+if __name__ == "__main__":
+    main()
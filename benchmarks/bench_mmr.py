@@ -0,0 +1,102 @@
+"""
+Benchmark MMR diversification against plain top-k retrieval.
+
+The corpus mimics chunk_size=250 / no-overlap splitting: every passage is
+cut into several adjacent chunks whose embeddings are near-identical. For
+each query we compare plain top-k against MMR over a fetch_k pool and
+report grader calls (chunks handed to grade_documents), context tokens,
+distinct passages covered and the cost of the MMR step itself.
+
+"Redundant" calls/tokens are spent on chunks whose passage is already in
+the result; those are what MMR saves (it either replaces them with new
+passages or, past the dedup threshold, drops them).
+
+    python -m benchmarks.bench_mmr --passages 2000 --lambda 0.5 --fetch-k 20
+"""
+
+from __future__ import annotations
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks._synthetic import corpus, count_tokens, percentile_ms, queries
+from indexing.mmr import MMRStage
+from indexing.quantization import QuantizedIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--chunks-per-passage", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--lambda", dest="lambda_mult", type=float, default=0.5)
+    parser.add_argument("--dedup", type=float, default=0.97)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(2)
+    passages = corpus(args.passages, args.dim)
+    per = args.chunks_per_passage
+    vectors = np.repeat(passages, per, axis=0)
+    vectors += 0.15 * rng.standard_normal(vectors.shape).astype(np.float32) / np.sqrt(args.dim)
+    owner = np.repeat(np.arange(args.passages), per)
+    filler = " ".join(["lorem"] * 180)
+    texts = [f"passage {p} part {i % per}: {filler}" for i, p in enumerate(owner)]
+    tokens = np.array([count_tokens(t) for t in texts])
+
+    index = QuantizedIndex.build(
+        vectors, texts, [{"passage": int(p)} for p in owner], mode="float32",
+        keep_full=False, ids=[str(i) for i in range(len(texts))],
+    )
+    stage = MMRStage(args.lambda_mult, args.dedup)
+    query_vectors = queries(passages, args.queries)
+
+    # grader calls, context tokens, distinct passages, redundant calls, redundant tokens
+    totals = {"plain": [0] * 5, "mmr": [0] * 5}
+    mmr_latency = []
+    for q in query_vectors:
+        pool = index.search(q, k=args.fetch_k, with_embeddings=True)
+        plain = pool[: args.k]
+        start = perf_counter()
+        diverse, _ = stage(pool, args.k)
+        mmr_latency.append(perf_counter() - start)
+        for name, hits in (("plain", plain), ("mmr", diverse)):
+            rows = [int(h.document.id) for h in hits]
+            seen, redundant = set(), []
+            for r in rows:
+                if owner[r] in seen:
+                    redundant.append(r)
+                seen.add(owner[r])
+            t = totals[name]
+            t[0] += len(rows)
+            t[1] += int(tokens[rows].sum())
+            t[2] += len(seen)
+            t[3] += len(redundant)
+            t[4] += int(tokens[redundant].sum())
+
+    n = len(query_vectors)
+    print(
+        f"{len(texts)} chunks ({per}/passage), {n} queries, "
+        f"k={args.k} fetch_k={args.fetch_k} lambda={args.lambda_mult} dedup={args.dedup}"
+    )
+    print(
+        f"{'mode':<8}{'grader calls/q':>16}{'context tokens/q':>18}{'distinct passages/q':>21}"
+        f"{'redundant calls/q':>19}{'redundant tokens/q':>20}"
+    )
+    for name, (calls, toks, distinct, r_calls, r_toks) in totals.items():
+        print(
+            f"{name:<8}{calls / n:>16.2f}{toks / n:>18.0f}{distinct / n:>21.2f}"
+            f"{r_calls / n:>19.2f}{r_toks / n:>20.0f}"
+        )
+    saved_calls = (totals["plain"][3] - totals["mmr"][3]) / n
+    saved_tokens = (totals["plain"][4] - totals["mmr"][4]) / n
+    print(f"saved per question: {saved_calls:.2f} redundant grader calls, {saved_tokens:.0f} redundant context tokens")
+    print(f"MMR step latency: p50 {percentile_ms(mmr_latency, 50):.3f} ms, p99 {percentile_ms(mmr_latency, 99):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
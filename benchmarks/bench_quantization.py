@@ -0,0 +1,69 @@
+"""
+Benchmark compact vector storage against full-precision search.
+
+Reports recall@k versus exact float32 cosine search, resident bytes per
+chunk and query latency for each storage configuration. Runs fully offline
+on a synthetic clustered corpus.
+
+    python -m benchmarks.bench_quantization --chunks 20000 --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+from time import perf_counter
+
+from benchmarks._synthetic import corpus, exact_top_k, percentile_ms, queries
+from indexing.quantization import QuantizedIndex
+
+# (label, mode, dim, reduction, rescore_k)
+CONFIGS = [
+    ("float32", "float32", None, "prefix", 0),
+    ("float16", "float16", None, "prefix", 0),
+    ("int8", "int8", None, "prefix", 0),
+    ("int8 + rescore", "int8", None, "prefix", 20),
+    ("int8 prefix-512", "int8", 512, "prefix", 0),
+    ("int8 prefix-512 + rescore", "int8", 512, "prefix", 20),
+    ("int8 pca-256", "int8", 256, "pca", 0),
+    ("int8 pca-256 + rescore", "int8", 256, "pca", 20),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    vectors = corpus(args.chunks, args.dim)
+    query_vectors = queries(vectors, args.queries)
+    truth = exact_top_k(vectors, query_vectors, args.k)
+    texts = [""] * len(vectors)
+    metadatas = [{}] * len(vectors)
+
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'config':<28}{'recall@k':>10}{'bytes/chunk':>13}{'p50 ms':>9}{'p99 ms':>9}")
+    for label, mode, dim, reduction, rescore_k in CONFIGS:
+        index = QuantizedIndex.build(
+            vectors, texts, metadatas, mode=mode, dim=dim, reduction=reduction,
+            keep_full=rescore_k > 0, ids=[str(i) for i in range(len(vectors))],
+        )
+        hits, latencies = 0, []
+        for q, expected in zip(query_vectors, truth):
+            start = perf_counter()
+            found = index.search(q, k=args.k, rescore_k=rescore_k)
+            latencies.append(perf_counter() - start)
+            hits += len({int(c.document.id) for c in found} & set(expected.tolist()))
+        recall = hits / (len(query_vectors) * args.k)
+        per_chunk = index.resident_bytes / len(index)
+        print(
+            f"{label:<28}{recall:>10.3f}{per_chunk:>13.0f}"
+            f"{percentile_ms(latencies, 50):>9.2f}{percentile_ms(latencies, 99):>9.2f}"
+        )
+    print("bytes/chunk counts resident codes + scales; rescoring reads full.npy rows via mmap.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark sharded indexes: ingest throughput and query latency for 1..8 shards.
+
+Chunks are hash-partitioned by synthetic source exactly as ingestion.py
+does. Ingest embeds each shard's chunks in batches with a stub embedding
+call (fixed latency per batch, as with a remote API) and builds one
+QuantizedIndex per shard, shards in parallel. Queries go through
+ShardedSearcher: single-stream latency (p50 / p99) and throughput with
+`--clients` concurrent callers. Recall is checked against exact search.
+
+    python -m benchmarks.bench_shards --chunks 100000 --max-shards 8 --clients 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks._synthetic import corpus, exact_top_k, percentile_ms, queries
+from indexing.quantization import QuantizedIndex
+from indexing.sharding import ShardedSearcher, shard_for
+
+
+def _build_shard(rows: np.ndarray, vectors: np.ndarray, mode: str, batch: int, embed_ms: float) -> QuantizedIndex:
+    for _ in range(0, len(rows), batch):
+        time.sleep(embed_ms / 1000)  # stand-in for one embed_documents() round trip
+    return QuantizedIndex.build(
+        vectors[rows], [""] * len(rows), [{}] * len(rows), mode=mode,
+        keep_full=False, ids=[str(i) for i in rows],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--sources", type=int, default=2000, help="Distinct documents the chunks belong to")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--mode", default="float32", choices=("float32", "float16", "int8"))
+    parser.add_argument("--max-shards", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent callers for the throughput run")
+    parser.add_argument("--batch", type=int, default=256, help="Chunks per embedding call")
+    parser.add_argument("--embed-ms", type=float, default=20.0, help="Simulated latency of one embedding call")
+    args = parser.parse_args()
+
+    vectors = corpus(args.chunks, args.dim)
+    query_vectors = queries(vectors, args.queries)
+    truth = exact_top_k(vectors, query_vectors, args.k)
+    sources = [f"docs/file-{i % args.sources}.md" for i in range(args.chunks)]
+
+    print(f"{args.chunks} chunks x {args.dim} dims ({args.mode}), {args.queries} queries, k={args.k}, {args.clients} clients, {os.cpu_count()} CPUs")
+    print(
+        f"{'shards':>6}{'ingest s':>10}{'chunks/s':>10}{'recall':>8}"
+        f"{'p50 ms':>9}{'p99 ms':>9}{'qps 1':>8}{'qps N':>8}"
+    )
+    for shards in range(1, args.max_shards + 1):
+        owner = np.array([shard_for(s, shards) for s in sources])
+        groups = [np.flatnonzero(owner == i) for i in range(shards)]
+
+        start = perf_counter()
+        with ThreadPoolExecutor(shards) as pool:
+            indexes = list(pool.map(lambda rows: _build_shard(rows, vectors, args.mode, args.batch, args.embed_ms), groups))
+        ingest_s = perf_counter() - start
+        searcher = ShardedSearcher(indexes)
+
+        hits, latencies = 0, []
+        for q, expected in zip(query_vectors, truth):
+            t0 = perf_counter()
+            found = searcher.search(q, k=args.k)
+            latencies.append(perf_counter() - t0)
+            hits += len({int(c.document.id) for c in found} & set(expected.tolist()))
+
+        t0 = perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            list(pool.map(lambda q: searcher.search(q, k=args.k), query_vectors))
+        qps_n = len(query_vectors) / (perf_counter() - t0)
+        searcher.close()
+
+        print(
+            f"{shards:>6}{ingest_s:>10.2f}{args.chunks / ingest_s:>10.0f}"
+            f"{hits / (len(query_vectors) * args.k):>8.3f}"
+            f"{percentile_ms(latencies, 50):>9.2f}{percentile_ms(latencies, 99):>9.2f}"
+            f"{len(latencies) / sum(latencies):>8.0f}{qps_n:>8.0f}"
+        )
+    print("qps 1 = one caller (latency-bound); qps N = --clients concurrent callers.")
+    print("Query latency only drops with shards when there are spare cores to search them on.")
+
+
+if __name__ == "__main__":
+    main()
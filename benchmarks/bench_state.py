@@ -0,0 +1,93 @@
+"""
+Benchmark GraphState traffic with many hops.
+
+Compares the old node style (every node copies `trace` / `documents` and
+returns whole lists into plain last-value channels) with the reducer-
+annotated GraphState (nodes return only deltas, trace is a bounded buffer).
+Each request loops a single node `--hops` times, like repeated
+regenerations. Reports wall time, peak traced memory per request and the
+size of the final state.
+
+    python -m benchmarks.bench_state --hops 500 --trace-limit 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Any, List, TypedDict
+
+
+def _state_bytes(state: dict) -> int:
+    total = sys.getsizeof(state)
+    for value in state.values():
+        total += sys.getsizeof(value)
+        if isinstance(value, (list, tuple)) or hasattr(value, "maxlen"):
+            total += sum(sys.getsizeof(v) for v in value if isinstance(v, str))
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hops", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--trace-limit", type=int, default=200)
+    args = parser.parse_args()
+
+    # TRACE_LIMIT is read at import time.
+    os.environ["RAGBOT_TRACE_LIMIT"] = str(args.trace_limit)
+    from langchain_core.documents import Document
+    from langgraph.graph import END, StateGraph
+
+    from graph.state import GraphState
+
+    class LegacyState(TypedDict, total=False):
+        question: str
+        documents: List[Any]
+        trace: List[str]
+        hops: int
+
+    class DeltaState(GraphState, total=False):
+        hops: int
+
+    def legacy_step(state):
+        trace = list(state.get("trace", []))
+        documents = list(state.get("documents", []))
+        trace.append(f"hop {state.get('hops', 0)}: regenerate")
+        return {"question": state["question"], "documents": documents, "trace": trace, "hops": state.get("hops", 0) + 1}
+
+    def delta_step(state):
+        return {"trace": [f"hop {state.get('hops', 0)}: regenerate"], "hops": state.get("hops", 0) + 1}
+
+    def build(state_type, step):
+        g = StateGraph(state_type)
+        g.add_node("step", step)
+        g.set_entry_point("step")
+        g.add_conditional_edges("step", lambda s: "again" if s["hops"] < args.hops else "done", {"again": "step", "done": END})
+        return g.compile()
+
+    docs = [Document(page_content="x" * 1000) for _ in range(4)]
+    config = {"recursion_limit": args.hops + 10}
+
+    print(f"{args.hops} hops/request, {args.requests} requests, trace limit {args.trace_limit}")
+    print(f"{'state':<10}{'ms/request':>12}{'peak KB/request':>17}{'trace lines':>13}{'final state KB':>16}")
+    for label, app in (("legacy", build(LegacyState, legacy_step)), ("delta", build(DeltaState, delta_step))):
+        times, peaks = [], []
+        for _ in range(args.requests):
+            tracemalloc.start()
+            start = perf_counter()
+            result = app.invoke({"question": "q", "documents": list(docs)}, config=config)
+            times.append(perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print(
+            f"{label:<10}{1000 * sum(times) / len(times):>12.1f}{sum(peaks) / len(peaks) / 1024:>17.0f}"
+            f"{len(result['trace']):>13}{_state_bytes(result) / 1024:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,11 +11,24 @@ Examples:
 
   # Just ask using existing index
   python cli.py --question "what is agent memory?"
+
+  # Only search chunks from one product manual (tagged at ingestion)
+  python cli.py --tag acme-manual --question "how do I reset the device?"
+
+  # Interactive session: graph and retriever stay warm between questions
+  python cli.py --interactive
 """
 from __future__ import annotations
 import argparse
+import contextlib
+import io
+import json
 import os
 import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -25,12 +38,20 @@ OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
 
 # Always try to import ingestion (for build_index)
 try:
+    import ingestion
     from ingestion import build_index
+    from indexing.embedding_cache import normalize_query
 except ImportError as e:
     print(f"❌ Error importing ingestion module: {e}")
     print("Please ensure all dependencies are installed: pip install -r requirements.txt")
     sys.exit(1)
 
+from graph.chains import llm_cache as llm_cache_module
+from graph.chains.llm_cache import get_llm_cache
+from graph.deadline import Deadline
+from graph.speculation import speculation_scope
+from token_usage import UsageRecorder, format_usage, track_usage
+
 # Only import the LangGraph app if we actually have an API key
 if OPENAI_AVAILABLE:
     try:
@@ -45,6 +66,371 @@ else:
     print("    CLI will return a dummy answer instead of calling the real model.\n")
 
 
+def _offline_result(question: str) -> Dict[str, Any]:
+    return {
+        "question": question,
+        "generation": (
+            "[OFFLINE MODE] I received your question, but no OpenAI API key "
+            "is configured. Configure OPENAI_API_KEY in a .env file to get "
+            "real AI-generated answers."
+        ),
+        "from_vector": False,
+        "documents": [],
+        "trace": ["offline_mode_no_openai_key"],
+    }
+
+
+def _graph_input(
+    question: str, filters: Dict[str, Any], tenant: Optional[str] = None, deadline: Optional[float] = None
+) -> Dict[str, Any]:
+    graph_input: Dict[str, Any] = {"question": question}
+    if filters:
+        graph_input["filters"] = filters
+    if tenant:
+        graph_input["tenant"] = tenant
+    if deadline:
+        graph_input["deadline"] = Deadline(deadline)
+    return graph_input
+
+
+def _print_answer(result: Dict[str, Any]) -> None:
+    from_vector = bool(result.get("from_vector", False))
+    docs_count = len(result.get("documents", []) or [])
+
+    if from_vector:
+        print("Source: 📚 Provided documents (vector DB)")
+    else:
+        print("Source: 🌐 Augmented with web search (or offline dummy mode)")
+
+    print(f"Documents used: {docs_count}")
+    print("\n" + "-" * 60)
+    print("Answer:")
+    print("-" * 60)
+    print(result.get("generation", "No answer generated."))
+    deadline = result.get("deadline")
+    if deadline is not None and deadline.degraded:
+        print(f"\n⚠️  Degraded to meet the {deadline.budget_s:g} s deadline: " + "; ".join(deadline.degraded))
+
+
+def _print_usage(report: Dict[str, Any], title: str = "🧮 Token usage:", requests: int = 1) -> None:
+    print("\n" + "-" * 60)
+    print(title)
+    print("-" * 60)
+    print(format_usage(report, requests=requests))
+
+
+def _usage_line(report: Optional[Dict[str, Any]]) -> str:
+    if not report or not report["calls"]:
+        return ""
+    approx = "~" if report["estimated_calls"] else ""
+    return f" · {approx}{report['total_tokens']:,} tokens · {approx}${report['cost_usd']:.4f}"
+
+
+def _print_trace(logs: List[str]) -> None:
+    print("\n" + "-" * 60)
+    print("📋 Process Trace:")
+    print("-" * 60)
+    for line in logs:
+        print(f"  • {line}")
+
+
+# -----------------------------
+# Interactive session
+# -----------------------------
+
+class _SessionCache:
+    """Small LRU of results computed during this session, with hit statistics."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved_ms += entry[1]
+        return entry
+
+    def put(self, key: str, value: Any, cost_ms: float) -> None:
+        self._entries[key] = (value, cost_ms)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_ms": round(self.saved_ms, 1),
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class _CachedRetriever:
+    """Reuse retrieved chunks for a question (and filter) already asked this session."""
+
+    def __init__(self, retriever, cache: _SessionCache):
+        self.retriever = retriever
+        self.cache = cache
+
+    def retrieve(self, question: str, where: Optional[Dict[str, Any]] = None):
+        key = json.dumps([normalize_query(question), where], sort_keys=True, default=str)
+        cached = self.cache.get(key)
+        if cached is not None:
+            docs, cost_ms = cached
+            return list(docs), {"k": len(docs), "chunk_cache": "hit", "chunk_saved_ms": round(cost_ms, 2)}
+
+        start = time.perf_counter()
+        if hasattr(self.retriever, "retrieve"):
+            docs, info = self.retriever.retrieve(question, where=where)
+        else:
+            docs, info = self.retriever.invoke(question), {}
+        self.cache.put(key, list(docs), (time.perf_counter() - start) * 1000)
+        return docs, {**info, "chunk_cache": "miss"}
+
+    def invoke(self, question: str, *args: Any, **kwargs: Any):
+        return self.retrieve(question)[0]
+
+
+class _CachedWebSearch:
+    """Reuse web search results for a query already searched this session."""
+
+    def __init__(self, tool, cache: _SessionCache):
+        self.tool = tool
+        self.cache = cache
+
+    def invoke(self, query: Any):
+        key = json.dumps(query, sort_keys=True, default=str)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0]
+        start = time.perf_counter()
+        result = self.tool.invoke(query)
+        self.cache.put(key, result, (time.perf_counter() - start) * 1000)
+        return result
+
+
+class ChatSession:
+    """
+    A warm question/answer session over the compiled graph.
+
+    The graph, retriever and LLM clients are created once. Retrieved chunks
+    and web results are cached for the session (query embeddings are
+    already cached by the runtime retriever), and each answer records
+    per-node timings and the trace for inspection.
+    """
+
+    def __init__(
+        self,
+        graph,
+        filters: Optional[Dict[str, Any]] = None,
+        cache_size: int = 256,
+        tenant: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ):
+        self.graph = graph
+        self.filters = dict(filters or {})
+        self.tenant = tenant
+        self.deadline = deadline  # seconds per question
+        self.chunk_cache = _SessionCache(cache_size)
+        self.web_cache = _SessionCache(cache_size)
+        self.history: List[Tuple[str, float]] = []
+        self.usage = UsageRecorder()  # all questions of the session
+        self.last: Optional[Dict[str, Any]] = None
+        self.last_timings: List[Tuple[str, float]] = []
+        self._saved: List[Tuple[Any, str, Any]] = []
+        self._leases = contextlib.ExitStack()
+
+    def __enter__(self) -> "ChatSession":
+        import graph.nodes.web_search  # noqa: F401  (module, not the node function)
+        web_module = sys.modules["graph.nodes.web_search"]
+
+        # A tenant's retriever is held open for the whole session and serves
+        # as the session's retriever, so questions need not carry the tenant
+        retriever = self._leases.enter_context(ingestion.tenant_retriever(self.tenant))
+        if retriever is not None:
+            self._swap(ingestion, "retriever", _CachedRetriever(retriever, self.chunk_cache))
+        self._swap(web_module, "web_search_tool", _CachedWebSearch(web_module.web_search_tool, self.web_cache))
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        for module, name, value in reversed(self._saved):
+            setattr(module, name, value)
+        self._saved.clear()
+        self._leases.close()
+
+    def _swap(self, module: Any, name: str, value: Any) -> None:
+        self._saved.append((module, name, getattr(module, name)))
+        setattr(module, name, value)
+
+    def ask(self, question: str) -> Tuple[Dict[str, Any], float]:
+        """Answer one question; returns (result, seconds)."""
+        start = last = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        if self.graph is None:
+            result = _offline_result(question)
+        else:
+            result = {}
+            # Nodes print progress lines; /trace shows what happened instead
+            graph_input = _graph_input(question, self.filters, deadline=self.deadline)
+            with contextlib.redirect_stdout(io.StringIO()), track_usage() as usage, speculation_scope(graph_input) as graph_input:
+                stream = self.graph.stream(graph_input, stream_mode=["updates", "values"])
+                for mode, chunk in stream:
+                    now = time.perf_counter()
+                    if mode == "values":
+                        result = chunk
+                        continue
+                    # Time since the previous update: the node plus the edge that led to it
+                    timings.extend((node, now - last) for node in chunk)
+                    last = now
+            result = {**result, "usage": usage.report()}
+            self.usage.merge(result["usage"])
+        elapsed = time.perf_counter() - start
+        self.last, self.last_timings = result, timings
+        self.history.append((question, elapsed))
+        return result, elapsed
+
+    def cache_stats(self) -> Dict[str, Any]:
+        stats = {"chunks": self.chunk_cache.stats(), "web": self.web_cache.stats()}
+        if ingestion.query_embedding_cache is not None:
+            stats["query_embeddings"] = ingestion.query_embedding_cache.stats()
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            stats["llm_responses"] = {"entries": len(llm_cache)}
+            stats.update({f"llm:{chain}": s for chain, s in llm_cache.stats()["chains"].items()})
+        return stats
+
+    def clear_caches(self) -> None:
+        self.chunk_cache.clear()
+        self.web_cache.clear()
+        if ingestion.query_embedding_cache is not None:
+            ingestion.query_embedding_cache.clear()
+
+
+REPL_HELP = """Commands:
+  /trace             process trace of the last answer
+  /timings           per-node time of the last answer
+  /cache             session cache statistics
+  /clear             empty the session caches
+  /filter [k=v ...]  show or set filters (source, source_type, path_prefix, tag, ingested_after;
+                     comma-separate several values), "/filter clear" removes them
+  /history           questions asked and their response times
+  /usage             token usage and cost of the last answer and of the session
+  /help              this text
+  /quit              leave (or Ctrl-D)
+Anything else is asked as a question."""
+
+
+def _parse_filters(args: List[str]) -> Dict[str, Any]:
+    filters: Dict[str, Any] = {}
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        if not sep or not value:
+            raise ValueError(f"expected key=value, got {arg!r}")
+        key = key.replace("-", "_")
+        if key in ("source", "source_type", "tag"):
+            filters[key] = value.split(",")
+        else:
+            filters[key] = value
+    return filters
+
+
+def _run_command(session: ChatSession, line: str) -> bool:
+    """Handle one /command; returns False when the session should end."""
+    command, *args = line[1:].split()
+    if command in ("quit", "exit", "q"):
+        return False
+    if command == "help":
+        print(REPL_HELP)
+    elif command == "trace":
+        _print_trace((session.last or {}).get("trace", []) or ["(no question asked yet)"])
+    elif command == "timings":
+        if not session.last_timings:
+            print("(no timings yet)")
+        for node, seconds in session.last_timings:
+            print(f"  {node:<18}{seconds * 1000:>9.1f} ms")
+    elif command == "cache":
+        for name, stats in session.cache_stats().items():
+            print(f"  {name:<18}" + ", ".join(f"{k}={v}" for k, v in stats.items()))
+    elif command == "clear":
+        session.clear_caches()
+        print("Session caches cleared.")
+    elif command == "filter":
+        if args == ["clear"]:
+            session.filters = {}
+        elif args:
+            from indexing.metadata import build_where
+
+            filters = _parse_filters(args)
+            build_where(filters)  # validate before applying
+            session.filters = filters
+        print(f"🔎 Filters: {session.filters or 'none'}")
+    elif command == "history":
+        for i, (question, seconds) in enumerate(session.history, 1):
+            print(f"  {i:>3}. {seconds:6.2f} s  {question}")
+    elif command == "usage":
+        if not (session.last or {}).get("usage"):
+            print("(no usage recorded yet)")
+        else:
+            _print_usage(session.last["usage"], "🧮 Last answer:")
+            _print_usage(session.usage.report(), "🧮 Session:", requests=len(session.history))
+    else:
+        print(f"Unknown command /{command}; /help lists commands.")
+    return True
+
+
+def run_repl(graph, filters: Dict[str, Any], tenant: Optional[str] = None, deadline: Optional[float] = None) -> None:
+    try:
+        import readline  # noqa: F401  (line editing and history where available)
+    except ImportError:
+        pass
+
+    print("=" * 60)
+    print("🤖 Advanced RAG Chatbot - interactive session")
+    print("=" * 60)
+    if tenant:
+        print(f"Tenant: {tenant}")
+    print("Ask a question, or /help for commands.\n")
+
+    with ChatSession(graph, filters, tenant=tenant, deadline=deadline) as session:
+        while True:
+            try:
+                line = input("❓ ").strip()
+            except EOFError:
+                print()
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            if not line:
+                continue
+            try:
+                if line.startswith("/"):
+                    if not _run_command(session, line):
+                        break
+                    continue
+                result, seconds = session.ask(line)
+            except KeyboardInterrupt:
+                print("\n⚠️  Interrupted")
+                continue
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                continue
+            print()
+            _print_answer(result)
+            print(f"\n⏱️  {seconds:.2f} s{_usage_line(result.get('usage'))}\n")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="RAG Chatbot CLI",
@@ -56,77 +442,114 @@ Examples:
 
   # Ask using existing index
   python cli.py --question "what is agent memory?"
+
+  # Restrict retrieval to PDFs under docs/manuals
+  python cli.py --source-type pdf --path-prefix docs/manuals --question "what is X?"
         """
     )
     parser.add_argument("--paths", nargs="*", help="File/dir globs to ingest (e.g., docs, *.pdf)")
     parser.add_argument("--urls", nargs="*", help="URLs to ingest")
     parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from scratch")
-    parser.add_argument("--question", required=True, help="Question to ask")
+    parser.add_argument("--question", help="Question to ask (omit to start an interactive session)")
+    parser.add_argument("-i", "--interactive", action="store_true", help="Start an interactive session (after answering --question, if given)")
+    parser.add_argument("--source", nargs="*", help="Only search chunks from these files/URLs")
+    parser.add_argument("--source-type", nargs="*", help="Only search these source types (pdf, md, txt, web)")
+    parser.add_argument("--path-prefix", help="Only search files under this directory (or URL host/path)")
+    parser.add_argument("--tag", help="Only search chunks with this collection tag (also applied to docs ingested now)")
+    parser.add_argument("--ingested-after", help="Only search chunks ingested after this ISO date / unix time")
+    parser.add_argument(
+        "--speculative-web",
+        action="store_true",
+        help="Start web search alongside retrieval when routing/retrieval confidence is low (RAGBOT_SPECULATIVE_WEB=1)",
+    )
+    parser.add_argument("--tenant", help="Ask (and ingest into) this tenant's own index instead of the shared one")
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="Answer within this many seconds, skipping grading / web search / checks when short (see graph/deadline.py)",
+    )
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the LLM response cache (RAGBOT_LLM_CACHE_BYPASS=1)")
     args = parser.parse_args()
 
+    if args.no_llm_cache:
+        llm_cache_module.LLM_CACHE_BYPASS = True
+    if args.speculative_web:
+        import graph.nodes.web_search  # noqa: F401  (module, not the node function)
+
+        sys.modules["graph.nodes.web_search"].SPECULATIVE_WEB_SEARCH = True
+
+    filters = {
+        key: value
+        for key, value in {
+            "source": args.source,
+            "source_type": args.source_type,
+            "path_prefix": args.path_prefix,
+            "tag": args.tag,
+            "ingested_after": args.ingested_after,
+        }.items()
+        if value
+    }
+    from indexing.metadata import build_where
+
+    try:
+        build_where(filters)
+    except ValueError as e:
+        parser.error(str(e))
+
     try:
         # Build index if paths or URLs provided
         if (args.paths or args.urls):
             print("📚 Building index...")
             try:
-                build_index(paths=args.paths, urls=args.urls, rebuild=args.rebuild)
+                build_index(paths=args.paths, urls=args.urls, rebuild=args.rebuild, tag=args.tag, tenant=args.tenant)
                 print("✅ Index built successfully!\n")
             except Exception as e:
                 print(f"⚠️  Warning: Error building index: {e}")
                 print("Continuing with existing index...\n")
 
+        if not args.question:
+            run_repl(app, filters, args.tenant, args.deadline)
+            return
+
         print("=" * 60)
         print("🤖 Advanced RAG Chatbot")
         print("=" * 60)
         
         print(f"\n💬 Question: {args.question}\n")
+        if filters:
+            print(f"🔎 Filters: {filters}\n")
         print("🔄 Processing...\n")
         
         # OFFLINE / NO-API-KEY MODE
+        start = time.perf_counter()
         if app is None:
-            result = {
-                "question": args.question,
-                "generation": (
-                    "[OFFLINE MODE] I received your question, but no OpenAI API key "
-                    "is configured. Configure OPENAI_API_KEY in a .env file to get "
-                    "real AI-generated answers."
-                ),
-                "from_vector": False,
-                "documents": [],
-                "trace": ["offline_mode_no_openai_key"],
-            }
+            result = _offline_result(args.question)
         else:
             # Normal online mode
-            result = app.invoke(input={"question": args.question})
-
-        from_vector = bool(result.get("from_vector", False))
-        docs_count = len(result.get("documents", []) or [])
+            graph_input = _graph_input(args.question, filters, args.tenant, args.deadline)
+            with track_usage() as usage, speculation_scope(graph_input) as graph_input:
+                result = app.invoke(input=graph_input)
+            result = {**result, "usage": usage.report()}
+        elapsed = time.perf_counter() - start
 
         print("=" * 60)
         print("✅ RESULT")
         print("=" * 60)
         print(f"Question: {result.get('question')}")
-        
-        if from_vector:
-            print("Source: 📚 Provided documents (vector DB)")
-        else:
-            print("Source: 🌐 Augmented with web search (or offline dummy mode)")
-        
-        print(f"Documents used: {docs_count}")
-        print("\n" + "-" * 60)
-        print("Answer:")
-        print("-" * 60)
-        print(result.get("generation", "No answer generated."))
+        _print_answer(result)
 
         logs = result.get("trace", [])
         if logs:
-            print("\n" + "-" * 60)
-            print("📋 Process Trace:")
-            print("-" * 60)
-            for line in logs:
-                print(f"  • {line}")
+            _print_trace(logs)
+
+        if result.get("usage"):
+            _print_usage(result["usage"])
         
+        print(f"\n⏱️  Response time: {elapsed:.2f} s")
         print("\n" + "=" * 60)
+
+        if args.interactive:
+            run_repl(app, filters, args.tenant, args.deadline)
         
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrupted by user")
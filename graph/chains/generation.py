@@ -6,9 +6,14 @@ from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from graph.chains.llm_cache import CachedChain
+from rate_limit import CLIENT_MAX_RETRIES
+from token_usage import record_estimate
+
 load_dotenv()
 
 OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
+LLM_MODEL = "gpt-4"
 
 
 class _OfflineGenerationChain:
@@ -22,17 +27,20 @@ class _OfflineGenerationChain:
     def invoke(self, inputs: dict) -> str:
         question = inputs.get("question", "")
         # We ignore context in offline mode; this is just a placeholder.
-        return (
+        answer = (
             "[OFFLINE MODE] Dummy answer.\n"
             f"I received your question: '{question}'.\n"
             "Configure OPENAI_API_KEY to enable real answer generation."
         )
+        # What the real chain would have been sent / returned, roughly
+        record_estimate("generation", LLM_MODEL, inputs, answer)
+        return answer
 
 
 if OPENAI_AVAILABLE:
     from langchain_openai import ChatOpenAI
 
-    llm = ChatOpenAI(model="gpt-4", temperature=0)
+    llm = ChatOpenAI(model=LLM_MODEL, temperature=0, max_retries=CLIENT_MAX_RETRIES)
 
     # Custom RAG prompt template
     prompt = ChatPromptTemplate.from_messages(
@@ -53,8 +61,8 @@ if OPENAI_AVAILABLE:
         ]
     )
 
-    # Real online generation chain
-    generation_chain = prompt | llm | StrOutputParser()
+    # Real online generation chain (prompt | llm | parser, behind the response cache)
+    generation_chain = CachedChain("generation", prompt, llm, parser=StrOutputParser())
 else:
     # Offline dummy chain
     generation_chain = _OfflineGenerationChain()
\ No newline at end of file
@@ -6,9 +6,14 @@ from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
+from graph.chains.llm_cache import CachedChain
+from rate_limit import CLIENT_MAX_RETRIES
+from token_usage import record_estimate
+
 load_dotenv()
 
 OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
+LLM_MODEL = "gpt-4"
 
 
 class GradeHallucination(BaseModel):
@@ -27,15 +32,15 @@ class _OfflineHallucinationGrader:
     """
 
     def invoke(self, inputs: dict) -> GradeHallucination:
-        return GradeHallucination(binary_score=True)
+        score = GradeHallucination(binary_score=True)
+        record_estimate("hallucination_grader", LLM_MODEL, inputs, score)
+        return score
 
 
 if OPENAI_AVAILABLE:
-    from langchain_core.runnables import RunnableSequence
     from langchain_openai import ChatOpenAI
 
-    llm = ChatOpenAI(model="gpt-4", temperature=0)
-    structured_llm_grader = llm.with_structured_output(GradeHallucination)
+    llm = ChatOpenAI(model=LLM_MODEL, temperature=0, max_retries=CLIENT_MAX_RETRIES)
 
     system = (
         "You are a grader assessing whether an LLM generation is grounded in / "
@@ -51,6 +56,6 @@ if OPENAI_AVAILABLE:
         ]
     )
 
-    hallucination_grader: RunnableSequence = hallucination_prompt | structured_llm_grader
+    hallucination_grader = CachedChain("hallucination_grader", hallucination_prompt, llm, schema=GradeHallucination)
 else:
     hallucination_grader = _OfflineHallucinationGrader()
\ No newline at end of file
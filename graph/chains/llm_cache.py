@@ -0,0 +1,228 @@
+"""
+Persistent response cache shared by the LLM chains.
+
+Every chain runs at temperature 0, so the same rendered prompt sent to the
+same model with the same output schema is answered the same way. With
+RAGBOT_LLM_CACHE_PATH set, CachedChain looks responses up in one SQLite
+file before calling the model; the key is a sha256 of the rendered
+messages, model name, temperature and structured-output schema.
+
+The file holds at most RAGBOT_LLM_CACHE_SIZE entries; beyond that the
+least recently used are deleted. Hits and misses are counted per chain.
+RAGBOT_LLM_CACHE_BYPASS=1 (or `with bypass_llm_cache():` around a call)
+always calls the model and leaves the cache untouched.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from time import perf_counter
+from typing import Any, Dict, Iterator, Optional, Type
+
+from pydantic import BaseModel
+
+from graph.deadline import DeadlineExceeded, call_timeout
+from rate_limit import estimate_tokens, limiter
+from token_usage import record_estimate, record_usage
+
+LLM_CACHE_PATH = os.getenv("RAGBOT_LLM_CACHE_PATH") or None
+LLM_CACHE_SIZE = int(os.getenv("RAGBOT_LLM_CACHE_SIZE", "10000"))
+LLM_CACHE_BYPASS = os.getenv("RAGBOT_LLM_CACHE_BYPASS", "0") == "1"
+
+# Per request / thread bypass; LangGraph copies the context into node threads
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextlib.contextmanager
+def bypass_llm_cache() -> Iterator[None]:
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+class LLMResponseCache:
+    """SQLite-backed LRU of serialized chain outputs, with per-chain statistics."""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses "
+            "(key TEXT PRIMARY KEY, chain TEXT, value TEXT, cost_ms REAL, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_responses_last_used ON llm_responses (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def key(messages: Any, model: str, temperature: Any, schema: Optional[Type[BaseModel]]) -> str:
+        payload = {
+            "messages": [[m.type, m.content] for m in messages],
+            "model": model,
+            "temperature": temperature,
+            "schema": schema.model_json_schema() if schema else "str",
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _chain_stats(self, chain: str) -> Dict[str, float]:
+        return self._stats.setdefault(chain, {"hits": 0, "misses": 0, "saved_ms": 0.0})
+
+    def get(self, chain: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value, cost_ms FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            stats = self._chain_stats(chain)
+            if row is None:
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            stats["saved_ms"] += row[1]
+            self._db.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, chain: str, key: str, value: str, cost_ms: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?)",
+                (key, chain, value, cost_ms, time.time()),
+            )
+            (count,) = self._db.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM llm_responses WHERE key IN "
+                    "(SELECT key FROM llm_responses ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        chains = {}
+        with self._lock:
+            for chain, s in self._stats.items():
+                lookups = s["hits"] + s["misses"]
+                chains[chain] = {
+                    "hits": int(s["hits"]),
+                    "misses": int(s["misses"]),
+                    "hit_rate": round(s["hits"] / lookups, 3) if lookups else 0.0,
+                    "saved_ms": round(s["saved_ms"], 1),
+                }
+        return {"entries": len(self), "max_entries": self.max_entries, "chains": chains}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM llm_responses")
+            self._db.commit()
+            self._stats.clear()
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """The process-wide cache, opened on first use; None when not configured."""
+    global _cache
+    if _cache is None and LLM_CACHE_PATH:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_SIZE)
+    return _cache
+
+
+class CachedChain:
+    """
+    `prompt | llm` (structured output when `schema` is given, else `parser`)
+    with the response cache between the rendered prompt and the model call.
+    """
+
+    def __init__(self, name: str, prompt, llm, schema: Optional[Type[BaseModel]] = None, parser=None):
+        self.name = name
+        self.prompt = prompt
+        self.llm = llm
+        self.schema = schema
+        self.parser = parser
+        # The raw message carries the token usage; parsing happens here
+        self.model = llm.with_structured_output(schema, include_raw=True) if schema else llm
+        self.model_name = getattr(llm, "model_name", None) or getattr(llm, "model", "") or type(llm).__name__
+        self.temperature = getattr(llm, "temperature", None)
+
+    def _decode(self, value: str) -> Any:
+        return self.schema.model_validate_json(value) if self.schema else value
+
+    def _encode(self, result: Any) -> str:
+        return result.model_dump_json() if isinstance(result, BaseModel) else result
+
+    def _model_for(self, timeout: Optional[float]) -> Any:
+        """The model, sending `timeout` as the request timeout of its API call."""
+        if timeout is None or not hasattr(self.llm, "model_kwargs"):
+            return self.model
+        # Shallow copy sharing the client; the OpenAI client takes a per-request
+        # timeout among the request parameters
+        llm = self.llm.model_copy(update={"model_kwargs": {**self.llm.model_kwargs, "timeout": timeout}})
+        return llm.with_structured_output(self.schema, include_raw=True) if self.schema else llm
+
+    def _invoke_model(self, prompt_value: Any, config: Any, **kwargs: Any) -> Any:
+        # Runs once per attempt of the limiter, each with the time left then
+        timeout = call_timeout()
+        try:
+            return self._model_for(timeout).invoke(prompt_value, config, **kwargs)
+        except Exception as e:
+            if timeout is not None and any(cls.__name__ == "APITimeoutError" for cls in type(e).__mro__):
+                raise DeadlineExceeded(f"no response within {timeout:.2f} s") from e
+            raise
+
+    def _call_model(self, prompt_value: Any, config: Any, **kwargs: Any) -> Any:
+        output = limiter.call(
+            self.model_name,
+            lambda: self._invoke_model(prompt_value, config, **kwargs),
+            tokens=estimate_tokens(prompt_value.to_string()),
+        )
+        if self.schema:
+            if output.get("parsing_error"):
+                raise output["parsing_error"]
+            message, result = output["raw"], output["parsed"]
+        else:
+            message = output
+            result = self.parser.invoke(message) if self.parser else message
+
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            record_usage(self.name, self.model_name, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+        else:
+            record_estimate(self.name, self.model_name, prompt_value.to_string(), getattr(message, "content", message))
+        return result
+
+    def invoke(self, inputs: Dict[str, Any], config: Any = None, **kwargs: Any) -> Any:
+        prompt_value = self.prompt.invoke(inputs, config)
+        cache = get_llm_cache()
+        # Only deterministic calls are safe to replay
+        if cache is None or LLM_CACHE_BYPASS or _bypass.get() or self.temperature not in (0, 0.0):
+            return self._call_model(prompt_value, config, **kwargs)
+
+        key = cache.key(prompt_value.to_messages(), self.model_name, self.temperature, self.schema)
+        cached = cache.get(self.name, key)
+        if cached is not None:
+            record_usage(self.name, self.model_name, 0, 0, cached=True)
+            return self._decode(cached)
+
+        start = perf_counter()
+        result = self._call_model(prompt_value, config, **kwargs)
+        encoded = self._encode(result)
+        if isinstance(encoded, str):
+            cache.put(self.name, key, encoded, (perf_counter() - start) * 1000)
+        return result
@@ -6,9 +6,14 @@ from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
+from graph.chains.llm_cache import CachedChain
+from rate_limit import CLIENT_MAX_RETRIES
+from token_usage import record_estimate
+
 load_dotenv()
 
 OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
+LLM_MODEL = "gpt-4"
 
 
 class GradeDocuments(BaseModel):
@@ -31,15 +36,15 @@ class _OfflineRetrievalGrader:
 
     def invoke(self, inputs: dict) -> GradeDocuments:
         # In offline mode we cannot really grade; just say 'yes'.
-        return GradeDocuments(binary_score="yes")
+        score = GradeDocuments(binary_score="yes")
+        record_estimate("retrieval_grader", LLM_MODEL, inputs, score)
+        return score
 
 
 if OPENAI_AVAILABLE:
-    from langchain_core.runnables import RunnableSequence
     from langchain_openai import ChatOpenAI
 
-    llm = ChatOpenAI(model="gpt-4", temperature=0)
-    structured_llm_grader = llm.with_structured_output(GradeDocuments)
+    llm = ChatOpenAI(model=LLM_MODEL, temperature=0, max_retries=CLIENT_MAX_RETRIES)
 
     system = """
 You are a grader assessing relevance of a retrieved document to a user question.
@@ -58,6 +63,6 @@ the document is relevant to the question.
         ]
     )
 
-    retrieval_grader: RunnableSequence = grade_prompt | structured_llm_grader
+    retrieval_grader = CachedChain("retrieval_grader", grade_prompt, llm, schema=GradeDocuments)
 else:
     retrieval_grader = _OfflineRetrievalGrader()
\ No newline at end of file
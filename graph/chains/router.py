@@ -7,9 +7,14 @@ from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
+from graph.chains.llm_cache import CachedChain
+from rate_limit import CLIENT_MAX_RETRIES
+from token_usage import record_estimate
+
 load_dotenv()
 
 OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
+LLM_MODEL = "gpt-4"
 
 
 class RouteQuery(BaseModel):
@@ -17,6 +22,12 @@ class RouteQuery(BaseModel):
     datasource: Literal["vectorstore", "websearch"] = Field(
         description="Route decision for the user query"
     )
+    confidence: float = Field(
+        default=1.0,
+        ge=0.0,
+        le=1.0,
+        description="How confident the route decision is, from 0 (guess) to 1 (certain)",
+    )
 
 
 class _OfflineQuestionRouter:
@@ -28,15 +39,15 @@ class _OfflineQuestionRouter:
     """
 
     def invoke(self, inputs: dict) -> RouteQuery:
-        return RouteQuery(datasource="vectorstore")
+        route = RouteQuery(datasource="vectorstore")
+        record_estimate("question_router", LLM_MODEL, inputs, route)
+        return route
 
 
 if OPENAI_AVAILABLE:
     from langchain_openai import ChatOpenAI
-    from langchain_core.runnables import RunnableSequence
 
-    llm = ChatOpenAI(model="gpt-4", temperature=0)
-    structured_llm_router = llm.with_structured_output(RouteQuery)
+    llm = ChatOpenAI(model=LLM_MODEL, temperature=0, max_retries=CLIENT_MAX_RETRIES)
 
     system = (
         "You are an expert at routing a user question to a vectorstore or web search.\n"
@@ -53,7 +64,7 @@ if OPENAI_AVAILABLE:
         ]
     )
 
-    question_router: RunnableSequence = route_prompt | structured_llm_router
+    question_router = CachedChain("question_router", route_prompt, llm, schema=RouteQuery)
 else:
     # Offline fallback
     question_router = _OfflineQuestionRouter()
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Per-request deadlines and the degrade rules applied when time runs short.
+
+A request may carry a Deadline in GraphState["deadline"] (server: the
+"deadline_s" payload field or RAGBOT_DEADLINE_S; CLI: --deadline). Before
+each optional stage the graph compares the time left with the typical cost
+of that stage plus the generation still ahead (STAGE_COST_S) and skips the
+stage rather than overrun:
+
+    route_question        no time to route      -> retrieve directly
+    grade_documents       no time to grade      -> keep the remaining documents ungraded
+    decide_to_generate    no time to search     -> answer from the current context
+    web_search            search not back       -> answer from the current context
+    hallucination check   no time to check      -> accept the answer unchecked
+                          no time to regenerate -> return the unsupported answer
+
+Model and web calls also get a timeout derived from the time left (see
+Deadline.timeout and call_budget). Generation always runs, so a request past
+its deadline still gets an answer, just from whatever context it has.
+
+Every degradation is recorded on the Deadline and reported as "degraded"
+in the result. Conditional edges cannot write graph state, so the record
+lives on this one mutable object, shared by reference by all nodes and
+edges of the request.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Default deadline for server requests that set none (unset: no deadline)
+DEFAULT_DEADLINE_S = float(os.environ["RAGBOT_DEADLINE_S"]) if os.environ.get("RAGBOT_DEADLINE_S") else None
+
+# Typical latency of each stage in seconds; "grade" is per document
+STAGE_COST_S: Dict[str, float] = {
+    "router": float(os.getenv("RAGBOT_COST_ROUTER_S", "1.0")),
+    "grade": float(os.getenv("RAGBOT_COST_GRADE_S", "0.8")),
+    "websearch": float(os.getenv("RAGBOT_COST_WEBSEARCH_S", "3.0")),
+    "generate": float(os.getenv("RAGBOT_COST_GENERATE_S", "4.0")),
+    "check": float(os.getenv("RAGBOT_COST_CHECK_S", "1.5")),
+}
+
+# Shortest timeout a call is started with, even past the deadline
+MIN_CALL_TIMEOUT_S = 0.5
+
+# Monotonic time by which model calls in the current call_budget() block must finish
+_call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("call_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A call did not finish within the time its request had left."""
+
+
+class Deadline:
+    """Time budget of one request and the degradations it caused; see the module docstring."""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError(f"deadline must be positive, got {seconds!r}")
+        self.budget_s = float(seconds)
+        self.at = time.monotonic() + self.budget_s
+        self.degraded: List[str] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return self.at - time.monotonic()
+
+    def allows(self, *stages: str) -> bool:
+        """Whether the time left covers the typical cost of `stages`."""
+        return self.remaining() >= sum(STAGE_COST_S[s] for s in stages)
+
+    def timeout(self, *reserve: str) -> float:
+        """Timeout for a call now, keeping the typical cost of `reserve` for the stages after it."""
+        return max(MIN_CALL_TIMEOUT_S, self.remaining() - sum(STAGE_COST_S[s] for s in reserve))
+
+    def degrade(self, reason: str) -> str:
+        """Record a degradation (once) and return it, for the trace."""
+        with self._lock:
+            if reason not in self.degraded:
+                self.degraded.append(reason)
+        return f"Degraded ({self.remaining():+.2f} s left): {reason}"
+
+    def report(self) -> Dict[str, float]:
+        return {"budget_s": self.budget_s, "remaining_s": round(self.remaining(), 3)}
+
+    def __repr__(self) -> str:
+        return f"Deadline(budget_s={self.budget_s}, remaining_s={self.remaining():.3f})"
+
+
+def get_deadline(state: Any) -> Optional[Deadline]:
+    return (state or {}).get("deadline")
+
+
+@contextmanager
+def call_budget(deadline: Optional[Deadline], *reserve: str) -> Iterator[None]:
+    """
+    Model calls made in this block (CachedChain) send the time left until
+    `deadline.timeout(*reserve)` from now as their request timeout, so the
+    client gives up on a late call instead of the call running on
+    unattended. Without a deadline this does nothing.
+    """
+    if deadline is None:
+        yield
+        return
+    token = _call_deadline.set(time.monotonic() + deadline.timeout(*reserve))
+    try:
+        yield
+    finally:
+        _call_deadline.reset(token)
+
+
+def call_timeout() -> Optional[float]:
+    """
+    Request timeout for a model call made now: None outside call_budget(),
+    DeadlineExceeded when the budget is used up (e.g. waiting for a
+    rate-limiter slot, or by an earlier attempt).
+    """
+    at = _call_deadline.get()
+    if at is None:
+        return None
+    left = at - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("no time left for the call")
+    return left
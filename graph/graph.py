@@ -7,10 +7,12 @@ from dotenv import load_dotenv
 from langgraph.graph import END, StateGraph
 
 from graph.consts import *
+from graph.deadline import DeadlineExceeded, call_budget, get_deadline
 from graph.nodes import *
 from graph.state import GraphState
 from graph.chains.hallucination_grader import hallucination_grader
 from graph.chains.router import question_router, RouteQuery
+from graph.nodes.web_search import SPECULATIVE_ROUTER_CONFIDENCE, speculation_enabled, start_speculative_search
 
 load_dotenv()
 
@@ -21,16 +23,18 @@ def decide_to_generate(state: GraphState) -> str:
     or fall back to web search.
     """
     print("--- assess graded documents ---")
-    trace = list(state.get("trace", []))
 
     if state.get("web_search"):
         # At least one doc was irrelevant or no docs → prefer web search
+        deadline = get_deadline(state)
+        if deadline is not None and not deadline.allows("websearch", "generate"):
+            deadline.degrade("web search skipped: answered from the current context")
+            print("--- decision: no time for web search, generate from current context ---")
+            return GENERATE
         print("--- decision: docs not sufficient, go to web search ---")
-        trace.append("Decision: not all docs relevant → web search")
         return WEBSEARCH
     else:
         print("--- decision: docs sufficient, generate answer ---")
-        trace.append("Decision: docs sufficient → generate")
         return GENERATE
 
 
@@ -40,18 +44,31 @@ def grade_generation_grounded_in_documents_and_question(state: GraphState) -> st
 
     If grounded → 'useful' (end the workflow).
     If not grounded → 'not supported' (regenerate).
+    Under a deadline, the check is skipped (or given up) when time is short,
+    and an unsupported answer is returned when there is no time to regenerate.
     """
     print("--- check hallucination ---")
-    trace = list(state.get("trace", []))
 
     question = state["question"]
     documents = state.get("documents", [])
     generation = state.get("generation", "")
+    deadline = get_deadline(state)
+
+    if deadline is not None and not deadline.allows("check"):
+        deadline.degrade("hallucination check skipped")
+        print("--- decision: no time to check, accept generation ---")
+        return "useful"
 
     # Call hallucination grader (offline-safe wrapper in current setup)
-    score = hallucination_grader.invoke(
-        {"documents": documents, "question": question, "generation": generation}
-    )
+    try:
+        with call_budget(deadline):
+            score = hallucination_grader.invoke(
+                {"documents": documents, "question": question, "generation": generation}
+            )
+    except DeadlineExceeded:
+        deadline.degrade("hallucination check timed out")
+        print("--- decision: check timed out, accept generation ---")
+        return "useful"
 
     binary = getattr(score, "binary_score", True)
 
@@ -62,12 +79,13 @@ def grade_generation_grounded_in_documents_and_question(state: GraphState) -> st
 
     if grounded:
         print("--- decision: generation is grounded in documents ---")
-        trace.append("Check: grounded in documents ✔")
-        trace.append("Check: answer accepted ✔")
+        return "useful"
+    elif deadline is not None and not deadline.allows("generate", "check"):
+        deadline.degrade("answer not grounded in the documents; no time to regenerate")
+        print("--- decision: generation is not grounded, no time to regenerate ---")
         return "useful"
     else:
         print("--- decision: generation is not grounded, regenerate ---")
-        trace.append("Check: not grounded → regenerate")
         return "not supported"
 
 
@@ -79,13 +97,28 @@ def route_question(state: GraphState) -> str:
     """
     print("--- route question ---")
     question = state["question"]
-    source: RouteQuery = question_router.invoke({"question": question})
+    deadline = get_deadline(state)
+    if deadline is not None and not deadline.allows("router", "generate"):
+        deadline.degrade("routing skipped: answered from the vector store")
+        print("--- route: no time to route, RAG ---")
+        return RETRIEVE
+    try:
+        with call_budget(deadline, "generate"):
+            source: RouteQuery = question_router.invoke({"question": question})
+    except DeadlineExceeded:
+        deadline.degrade("routing timed out: answered from the vector store")
+        print("--- route: routing timed out, RAG ---")
+        return RETRIEVE
 
     if source.datasource == WEBSEARCH:
         print("--- route: websearch ---")
         return WEBSEARCH
     elif source.datasource == "vectorstore":
         print("--- route: vectorstore (RAG) ---")
+        confidence = getattr(source, "confidence", 1.0)
+        if speculation_enabled(state) and confidence < SPECULATIVE_ROUTER_CONFIDENCE:
+            # Unsure the vector store has the answer: search the web meanwhile
+            start_speculative_search(state, f"router confidence {confidence:.2f}")
         return RETRIEVE
     else:
         # Fallback: default to RAG
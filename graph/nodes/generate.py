@@ -1,21 +1,31 @@
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from graph.chains.generation import generation_chain
+from graph.deadline import DeadlineExceeded, call_budget, get_deadline
+from graph.nodes.web_search import discard_speculative_search
 from graph.state import GraphState
 
 
 def generate(state: GraphState) -> Dict[str, Any]:
     print("--- generate ---")
 
-    trace = list(state.get("trace", []))
+    trace: List[str] = []
     question = state["question"]
     documents = state.get("documents", [])
 
+    # Grading kept the vector-store answer: a speculative web search is not needed
+    discarded = discard_speculative_search(state)
+    if discarded:
+        trace.append(discarded)
+
+    deadline = get_deadline(state)
     try:
-        generation = generation_chain.invoke(
-            {"context": documents, "question": question}
-        )
+        with call_budget(deadline):
+            generation = generation_chain.invoke({"context": documents, "question": question})
         trace.append("Generated answer")
+    except DeadlineExceeded as e:
+        generation = "[ERROR] No answer could be generated within the request deadline."
+        trace.append(deadline.degrade(f"generation timed out ({e})"))
     except Exception as e:
         generation = (
             "[ERROR] Generation failed in offline mode."
@@ -23,8 +33,6 @@ def generate(state: GraphState) -> Dict[str, Any]:
         trace.append(f"Generation error: {e}")
 
     return {
-        "documents": documents,
-        "question": question,
         "generation": generation,
         "trace": trace,
     }
\ No newline at end of file
@@ -1,17 +1,39 @@
-from typing import Any, Dict
+import os
+import warnings
+from typing import Any, Dict, List
+
+from langgraph.types import Overwrite
 
 from graph.chains.retrieval_grader import retrieval_grader, GradeDocuments
+from graph.deadline import DeadlineExceeded, call_budget, get_deadline
+from graph.nodes.web_search import start_speculative_search
 from graph.state import GraphState
 
+# What grading does once one irrelevant document has decided on web search:
+#   all                 grade every document (default)
+#   stop-on-irrelevant  skip the remaining grader calls; ungraded documents are dropped
+#   overlap             start the web search right away and keep grading meanwhile
+GRADE_POLICIES = ("all", "stop-on-irrelevant", "overlap")
+GRADE_POLICY = os.getenv("RAGBOT_GRADE_POLICY", "all")
+# Stop grading after this many relevant documents (0 = no limit); the rest are dropped
+GRADE_STOP_AFTER_RELEVANT = int(os.getenv("RAGBOT_GRADE_STOP_AFTER_RELEVANT", "0"))
+
+if GRADE_POLICY not in GRADE_POLICIES:
+    # A typo must not make the whole graph (CLI, server) fail to import
+    warnings.warn(f"Unknown RAGBOT_GRADE_POLICY {GRADE_POLICY!r}; expected one of {GRADE_POLICIES}. Using 'all'.")
+    GRADE_POLICY = "all"
+
 
 def grade_documents(state: GraphState) -> Dict[str, Any]:
     """
     Determine whether retrieved docs are relevant to the question.
     If all docs are irrelevant (or none exist), set a flag to run web search.
+    When the request deadline leaves no time to grade, the remaining
+    documents are kept ungraded.
     """
     print("--- grade_documents: check document relevance to question ---")
 
-    trace = list(state.get("trace", []))
+    trace: List[str] = []
     question = state["question"]
     documents = state.get("documents", []) or []
 
@@ -19,26 +41,41 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
     if not documents:
         trace.append("No documents retrieved -> enable web search")
         return {
-            "documents": [],
-            "question": question,
             "web_search": True,
             "trace": trace,
         }
 
     filtered_docs = []
     web_search = False
+    graded = 0
+    deadline = get_deadline(state)
+    ungraded: List[Any] = []
 
-    for doc in documents:
+    for i, doc in enumerate(documents):
+        if web_search and GRADE_POLICY == "stop-on-irrelevant":
+            break
+        if GRADE_STOP_AFTER_RELEVANT and len(filtered_docs) >= GRADE_STOP_AFTER_RELEVANT:
+            break
+        if deadline is not None and not deadline.allows("grade", "generate"):
+            ungraded = documents[i:]
+            break
+        graded += 1
         try:
-            score: GradeDocuments = retrieval_grader.invoke(
-                {"question": question, "document": doc.page_content}
-            )
+            with call_budget(deadline, "generate"):
+                score: GradeDocuments = retrieval_grader.invoke(
+                    {"question": question, "document": doc.page_content}
+                )
             grade = score.binary_score
+        except DeadlineExceeded:
+            graded -= 1  # gave up on this one
+            ungraded = documents[i:]
+            break
         except Exception as e:
             # In case of any grading failure, mark as irrelevant and enable web search
             print(f"--- grade_documents error: {e} ---")
             trace.append(f"Grader error -> treat doc as irrelevant, enable web search")
             web_search = True
+            _overlap_web_search(state, trace)
             continue
 
         if isinstance(grade, str):
@@ -54,10 +91,31 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
             print("--- grade: document not relevant ---")
             trace.append("Grader: irrelevant doc -> enable web search")
             web_search = True
+            _overlap_web_search(state, trace)
+
+    if ungraded:
+        # Out of time: better to answer from unchecked context than not at all
+        filtered_docs.extend(ungraded)
+        trace.append(deadline.degrade(f"grading stopped: {len(ungraded)} of {len(documents)} documents kept ungraded"))
 
-    return {
-        "documents": filtered_docs,
-        "question": question,
+    skipped = len(documents) - graded - len(ungraded)
+    if skipped:
+        trace.append(
+            f"Early exit ({GRADE_POLICY}, stop after {GRADE_STOP_AFTER_RELEVANT or '-'} relevant): "
+            f"{skipped} grader call(s) skipped, ungraded docs dropped"
+        )
+
+    update: Dict[str, Any] = {
         "web_search": web_search,
         "trace": trace,
-    }
\ No newline at end of file
+    }
+    if len(filtered_docs) != len(documents):
+        # Drop the irrelevant documents (bypasses the append reducer)
+        update["documents"] = Overwrite(filtered_docs)
+    return update
+
+
+def _overlap_web_search(state: GraphState, trace: List[str]) -> None:
+    """Under the overlap policy, run the web search while the remaining documents are graded."""
+    if GRADE_POLICY == "overlap" and start_speculative_search(state, "grader found an irrelevant doc"):
+        trace.append("Web search started while grading continues")
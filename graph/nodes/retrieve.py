@@ -1,13 +1,38 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
+import ingestion
+from graph.nodes.web_search import (
+    SPECULATIVE_MIN_SCORE,
+    speculation_enabled,
+    speculation_running,
+    start_speculative_search,
+)
 from graph.state import GraphState
-from ingestion import retriever
+from indexing.metadata import build_where
 
 
 def retrieve(state: GraphState) -> Dict[str, Any]:
     print("--- retrieve ---")
 
-    trace = list(state.get("trace", []))
+    trace: List[str] = []  # new lines only; the state reducer appends them
+    # Invalid filters fail the request (callers validate them up front); an
+    # empty result would silently send the question to web search
+    where = build_where(state.get("filters"))
+    tenant = state.get("tenant")
+    try:
+        # Tenant retrievers stay open (and are not evicted) until the block ends
+        with ingestion.tenant_retriever(tenant) as retriever:
+            return _retrieve(state, retriever, where, trace)
+    except (ValueError, FileNotFoundError) as e:
+        trace.append(f"Tenant {tenant!r} unavailable: {e}")
+        return {
+            "documents": [],
+            "trace": trace,
+            "from_vector": False,
+        }
+
+
+def _retrieve(state: GraphState, retriever: Any, where: Optional[Dict[str, Any]], trace: List[str]) -> Dict[str, Any]:
     question = state["question"]
 
     # Retriever not available (offline mode or no index)
@@ -15,17 +40,29 @@ def retrieve(state: GraphState) -> Dict[str, Any]:
         trace.append("Retriever not initialized. No documents found (offline / no index).")
         return {
             "documents": [],
-            "question": question,
             "trace": trace,
             "from_vector": False,
         }
 
     try:
-        trace.append("Retrieving relevant documents from vector store")
-        documents = retriever.invoke(question)
+        if state.get("tenant"):
+            trace.append(f"Retrieving relevant documents from vector store (tenant {state['tenant']})")
+        else:
+            trace.append("Retrieving relevant documents from vector store")
+        if where:
+            trace.append(f"Metadata filter: {where}")
+        if hasattr(retriever, "retrieve"):
+            # VectorRetriever also reports timings / post-processing stats
+            documents, info = retriever.retrieve(question, where=where)
+            trace.append("Retrieval stats: " + ", ".join(f"{k}={v}" for k, v in info.items()))
+        else:
+            if where:
+                trace.append("Retriever does not support filters; searching the whole collection")
+            documents, info = retriever.invoke(question), {}
+        if speculation_enabled(state):
+            _speculate(state, documents, info, trace)
         return {
             "documents": documents,
-            "question": question,
             "trace": trace,
             "from_vector": True,
         }
@@ -33,7 +70,23 @@ def retrieve(state: GraphState) -> Dict[str, Any]:
         trace.append(f"Error retrieving documents: {e}")
         return {
             "documents": [],
-            "question": question,
             "trace": trace,
             "from_vector": False,
-        }
\ No newline at end of file
+        }
+
+
+def _speculate(state: GraphState, documents: List[Any], info: Dict[str, Any], trace: List[str]) -> None:
+    """Start the web search now if the retrieval scores suggest grading will ask for it."""
+    reason = speculation_running(state)
+    if reason:
+        trace.append(f"Speculative web search running ({reason})")
+        return
+    top_score = info.get("top_score")
+    if not documents:
+        reason = "no documents retrieved"
+    elif top_score is not None and top_score < SPECULATIVE_MIN_SCORE:
+        reason = f"top retrieval score {top_score:.2f} < {SPECULATIVE_MIN_SCORE}"
+    else:
+        return
+    if start_speculative_search(state, reason):
+        trace.append(f"Speculative web search started ({reason})")
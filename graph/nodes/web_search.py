@@ -1,17 +1,29 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from langchain_core.documents import Document
 
+from graph.deadline import Deadline, DeadlineExceeded, get_deadline
+from graph.speculation import get_speculation, search_pool
 from graph.state import GraphState
 
 load_dotenv()
 
 TAVILY_AVAILABLE = bool(os.getenv("TAVILY_API_KEY"))
 
+# Speculative web search (opt-in, or per request via state["speculative_web"]):
+# when the router or the retrieval scores signal low confidence, the web
+# search starts alongside retrieval + grading instead of after them. Needs
+# the request's handle in state["speculation"] (see graph.speculation).
+SPECULATIVE_WEB_SEARCH = os.getenv("RAGBOT_SPECULATIVE_WEB", "0") == "1"
+SPECULATIVE_ROUTER_CONFIDENCE = float(os.getenv("RAGBOT_SPECULATIVE_ROUTER_CONFIDENCE", "0.7"))
+SPECULATIVE_MIN_SCORE = float(os.getenv("RAGBOT_SPECULATIVE_MIN_SCORE", "0.35"))
+
 
 class _OfflineWebSearch:
     """
@@ -40,36 +52,95 @@ else:
     web_search_tool = _OfflineWebSearch()
 
 
+def _search(question: str) -> Tuple[Document, str, float]:
+    """(result document, trace line, seconds the call took)."""
+    start = perf_counter()
+    if TAVILY_AVAILABLE:
+        docs = web_search_tool.invoke({"query": question})
+        contents = "\n".join(d.get("content", "") for d in docs)
+        result_doc = Document(page_content=contents)
+        line = "Web search executed (online)"
+    else:
+        result_doc = web_search_tool.invoke(question)[0]
+        line = "Web search simulated (offline)"
+    return result_doc, line, perf_counter() - start
+
+
+def _wait(future: Future, deadline: Deadline) -> Tuple[Document, str, float]:
+    """The search's result, waiting no longer than the deadline leaves after generation."""
+    timeout = deadline.timeout("generate")
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError as e:  # not the builtin TimeoutError before Python 3.11
+        if future.done():
+            raise  # raised by the search itself
+        future.cancel()
+        raise DeadlineExceeded(f"no result within {timeout:.2f} s") from e
+
+
+# -----------------------------
+# Speculative search
+# -----------------------------
+
+def speculation_enabled(state: GraphState) -> bool:
+    return get_speculation(state) is not None and bool(state.get("speculative_web", SPECULATIVE_WEB_SEARCH))
+
+
+def start_speculative_search(state: GraphState, reason: str) -> bool:
+    """Start this request's web search in the background; False if already running or no handle."""
+    speculation = get_speculation(state)
+    if speculation is None:
+        return False
+    return speculation.start(_search, state.get("question", ""), reason=reason)
+
+
+def speculation_running(state: GraphState) -> Optional[str]:
+    """Why this request's speculative search was started, or None."""
+    speculation = get_speculation(state)
+    return speculation.reason if speculation else None
+
+
+def discard_speculative_search(state: GraphState) -> Optional[str]:
+    """Drop this request's unneeded speculative search; returns a trace line, or None if there was none."""
+    speculation = get_speculation(state)
+    return speculation.discard() if speculation else None
+
+
 def web_search(state: GraphState) -> Dict[str, Any]:
     print("--- web_search ---")
 
     question = state.get("question", "")
-    documents = list(state.get("documents", []))
-    trace = list(state.get("trace", []))
+    trace: List[str] = []
+    handle = get_speculation(state)
+    speculation = handle.take() if handle else None
+    deadline = get_deadline(state)
 
     try:
-        if TAVILY_AVAILABLE:
-            docs = web_search_tool.invoke({"query": question})
-            contents = "\n".join(d.get("content", "") for d in docs)
-            result_doc = Document(page_content=contents)
-            trace.append("Web search executed (online)")
+        if speculation is not None:
+            waited = perf_counter()
+            result_doc, line, call_s = (
+                _wait(speculation.future, deadline) if deadline else speculation.future.result()
+            )
+            # The part of the call that overlapped retrieval + grading
+            saved_ms = min(call_s, waited - speculation.started) * 1000
+            trace.append(line)
+            trace.append(f"Speculative web search used ({speculation.reason}): saved {saved_ms:.0f} ms")
         else:
-            result_doc = web_search_tool.invoke(question)[0]
-            trace.append("Web search simulated (offline)")
+            # The search client takes no timeout: with a deadline, wait for it on the pool
+            result_doc, line, _ = _wait(search_pool.submit(_search, question), deadline) if deadline else _search(question)
+            trace.append(line)
+    except DeadlineExceeded:
+        trace.append(deadline.degrade("web search timed out: answered from the current context"))
+        return {"trace": trace}
     except Exception as e:
         trace.append(f"Web search error: {e}")
         return {
-            "documents": documents,
-            "question": question,
             "trace": trace,
             "from_vector": False,
         }
 
-    documents.append(result_doc)
-
     return {
-        "documents": documents,
-        "question": question,
+        "documents": [result_doc],
         "trace": trace,
         "from_vector": False,
-    }
\ No newline at end of file
+    }
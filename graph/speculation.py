@@ -0,0 +1,95 @@
+"""
+Per-request handle for the speculative web search.
+
+A request that may speculate carries a SpeculativeSearch in
+GraphState["speculation"]. It holds at most one background search, started
+by the router edge, the retrieve node or the overlap grading policy, and
+claimed by the web_search node or discarded by generate (see
+graph.nodes.web_search). Conditional edges cannot write graph state, so the
+search lives on this one mutable object, shared by reference by all nodes
+and edges of the request and by nothing else: concurrent requests for the
+same question never see each other's search.
+
+Whoever runs the request wraps it in speculation_scope(), which attaches a
+fresh handle and discards what is still running when the request ends,
+including when it fails. Requests without a handle do not speculate.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Web searches run here instead of on the node thread: speculative ones, and
+# ones web_search waits for with a deadline. A search abandoned at its
+# deadline finishes on this bounded pool rather than on a thread of its own.
+search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="web-search")
+
+
+@dataclass
+class Speculation:
+    future: Future
+    started: float
+    reason: str
+
+
+class SpeculativeSearch:
+    """The speculative web search of one request; see the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[Speculation] = None
+        self._closed = False
+
+    def start(self, search: Callable[..., Any], *args: Any, reason: str) -> bool:
+        """Run `search(*args)` in the background; False if one is already running (or the request ended)."""
+        with self._lock:
+            if self._current is not None or self._closed:
+                return False
+            self._current = Speculation(search_pool.submit(search, *args), perf_counter(), reason)
+        return True
+
+    @property
+    def reason(self) -> Optional[str]:
+        """Why the running search was started, or None."""
+        with self._lock:
+            return self._current.reason if self._current else None
+
+    def take(self) -> Optional[Speculation]:
+        """Claim the running search (its result is then the caller's)."""
+        with self._lock:
+            current, self._current = self._current, None
+        return current
+
+    def discard(self) -> Optional[str]:
+        """Drop an unneeded search; returns a trace line, or None if there was none."""
+        speculation = self.take()
+        if speculation is None:
+            return None
+        if speculation.future.cancel():
+            return f"Speculative web search cancelled before it ran ({speculation.reason})"
+        return f"Speculative web search discarded: 1 extra web call ({speculation.reason})"
+
+    def close(self) -> None:
+        """End of the request: discard what is left and refuse new searches."""
+        with self._lock:
+            self._closed = True
+        self.discard()
+
+
+def get_speculation(state: Any) -> Optional[SpeculativeSearch]:
+    return (state or {}).get("speculation")
+
+
+@contextmanager
+def speculation_scope(graph_input: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """`graph_input` with a fresh SpeculativeSearch, closed when the block exits."""
+    speculation = SpeculativeSearch()
+    try:
+        yield {**graph_input, "speculation": speculation}
+    finally:
+        speculation.close()
@@ -1,4 +1,50 @@
-from typing import List, TypedDict, Any
+import os
+from collections import deque
+from typing import Annotated, Any, Dict, Iterable, List, TypedDict
+
+from graph.deadline import Deadline
+from graph.speculation import SpeculativeSearch
+
+# Maximum number of trace lines kept per request; older lines are dropped
+# first. 0 keeps everything.
+TRACE_LIMIT = int(os.environ.get("RAGBOT_TRACE_LIMIT", "200"))
+
+
+class TraceBuffer(deque):
+    """Bounded trace log: a deque whose default maxlen is TRACE_LIMIT."""
+
+    def __init__(self, iterable: Iterable[str] = (), maxlen: int | None = None):
+        super().__init__(iterable, maxlen or TRACE_LIMIT or None)
+
+
+def append_trace(current: Any, update: Any) -> TraceBuffer:
+    """
+    Reducer for the `trace` channel: nodes return only their new lines.
+
+    Returns a new buffer rather than mutating `current` (LangGraph may apply
+    the same write to several channel copies sharing one value); the copy is
+    bounded by TRACE_LIMIT.
+    """
+    if not update:
+        return current if isinstance(current, TraceBuffer) else TraceBuffer(current or ())
+    merged = TraceBuffer(current or (), getattr(current, "maxlen", None))
+    if isinstance(update, str):
+        merged.append(update)
+    else:
+        merged.extend(update)
+    return merged
+
+
+def append_documents(current: Any, update: Any) -> List[Any]:
+    """
+    Reducer for the `documents` channel: nodes return only new documents.
+
+    To replace the list (e.g. after grading), return
+    `langgraph.types.Overwrite(new_list)`.
+    """
+    if not update:
+        return current or []
+    return [*(current or []), *update]
 
 
 class GraphState(TypedDict, total=False):
@@ -9,13 +55,29 @@ class GraphState(TypedDict, total=False):
         question: user question
         generation: generated answer
         web_search: whether to trigger web search
-        documents: list of retrieved documents
-        trace: internal log messages for UI / debugging
+        documents: list of retrieved documents (append-only, see append_documents)
+        trace: internal log messages for UI / debugging (bounded, see append_trace)
         from_vector: whether answer came only from vector store
+        filters: metadata filters for retrieval (source, source_type,
+            path_prefix, tag, ingested_after; see indexing.metadata)
+        speculative_web: start web search alongside retrieval when confidence
+            is low (defaults to RAGBOT_SPECULATIVE_WEB; see graph.nodes.web_search)
+        tenant: tenant ID selecting the index to retrieve from (its own
+            collection; see ingestion.tenant_retriever). Omitted: the shared index
+        deadline: time budget of the request; stages are skipped or cut short
+            to answer within it, and each degradation is recorded on it (see
+            graph.deadline). Omitted: no time limit
+        speculation: this request's speculative web search, attached by
+            graph.speculation.speculation_scope(). Omitted: no speculation
     """
     question: str
     generation: str
     web_search: bool
-    documents: List[Any]
-    trace: List[str]
-    from_vector: bool
\ No newline at end of file
+    documents: Annotated[List[Any], append_documents]
+    trace: Annotated[TraceBuffer, append_trace]
+    from_vector: bool
+    filters: Dict[str, Any]
+    speculative_web: bool
+    tenant: str
+    deadline: Deadline
+    speculation: SpeculativeSearch
@@ -0,0 +1,66 @@
+# Indexing module: vector storage and retrieval helpers used by ingestion.py
+from indexing.search import ChromaSearcher, ScoredChunk, VectorRetriever, hnsw_configuration
+from indexing.quantization import DimReducer, QuantizedIndex, STORAGE_MODES, dequantize, fit_reducer
+from indexing.mapped import MappedIndex
+from indexing.mmr import MMRStage, mmr_select
+from indexing.embedding_cache import CachedQueryEmbeddings
+from indexing.adaptive import AdaptiveKStage, choose_k
+from indexing.metadata import build_where, normalize_metadata, normalize_source
+from indexing.sharding import ShardedSearcher, partition, shard_for, shard_name
+from indexing.snapshot import SNAPSHOT_DTYPES, Snapshot, write_snapshot
+from indexing.jobs import IngestJob, read_active, write_active
+from indexing.profiling import StageProfiler
+from indexing.maintenance import CleanupPlan, format_report, index_stats, plan_cleanup, query_latency
+from indexing.parse_cache import ParsedDocumentCache, file_sha256
+from indexing.pdf import PdfExtractor, loader_version as pdf_loader_version
+from indexing.tenants import TenantPool, directory_bytes, validate_tenant
+from indexing.watch import FileChanges, make_watcher, scan as scan_files, static_prefix, watch_files
+
+__all__ = [
+    "ChromaSearcher",
+    "ScoredChunk",
+    "VectorRetriever",
+    "hnsw_configuration",
+    "MMRStage",
+    "mmr_select",
+    "CachedQueryEmbeddings",
+    "AdaptiveKStage",
+    "choose_k",
+    "build_where",
+    "normalize_metadata",
+    "normalize_source",
+    "ShardedSearcher",
+    "partition",
+    "shard_for",
+    "shard_name",
+    "SNAPSHOT_DTYPES",
+    "Snapshot",
+    "write_snapshot",
+    "IngestJob",
+    "read_active",
+    "write_active",
+    "StageProfiler",
+    "CleanupPlan",
+    "format_report",
+    "index_stats",
+    "plan_cleanup",
+    "query_latency",
+    "ParsedDocumentCache",
+    "file_sha256",
+    "PdfExtractor",
+    "pdf_loader_version",
+    "TenantPool",
+    "directory_bytes",
+    "validate_tenant",
+    "FileChanges",
+    "make_watcher",
+    "scan_files",
+    "static_prefix",
+    "watch_files",
+    "DimReducer",
+    "QuantizedIndex",
+    "STORAGE_MODES",
+    "dequantize",
+    "fit_reducer",
+    "MappedIndex",
+]
@@ -0,0 +1,60 @@
+"""
+Adaptive top-k: choose how many chunks to keep from the score distribution.
+
+Candidates arrive sorted by similarity. The list is cut at the first drop
+of at least `gap` between neighbouring scores, or at the first score below
+`relative * top_score`, but never shorter than `min_k` or longer than
+`max_k`. A question with one clearly matching chunk then costs one grader
+call; a question with many similar matches keeps up to `max_k`.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from indexing.search import ScoredChunk
+
+
+def choose_k(
+    scores: List[float],
+    min_k: int = 1,
+    max_k: int = 6,
+    gap: Optional[float] = 0.04,
+    relative: Optional[float] = 0.9,
+) -> Tuple[int, str]:
+    """Return (k, reason) for a descending list of similarity scores."""
+    n = len(scores)
+    if n <= min_k:
+        return n, "exhausted"
+    top = scores[0]
+    for i in range(max(min_k, 1), min(n, max_k)):
+        if gap is not None and scores[i - 1] - scores[i] >= gap:
+            return i, "score_gap"
+        if relative is not None and scores[i] < relative * top:
+            return i, "relative_threshold"
+    if n <= max_k:
+        return n, "exhausted"
+    return max_k, "max_k"
+
+
+class AdaptiveKStage:
+    """VectorRetriever stage that trims the candidate list with choose_k()."""
+
+    needs_embeddings = False
+
+    def __init__(self, min_k: int = 1, max_k: int = 6, gap: Optional[float] = 0.04, relative: Optional[float] = 0.9):
+        self.min_k = min_k
+        self.max_k = max_k
+        self.gap = gap
+        self.relative = relative
+
+    def __call__(self, hits: List[ScoredChunk], k: int) -> Tuple[List[ScoredChunk], Dict[str, Any]]:
+        hits = sorted(hits, key=lambda h: h.score, reverse=True)
+        chosen, reason = choose_k(
+            [h.score for h in hits],
+            self.min_k,
+            min(self.max_k, k),
+            self.gap,
+            self.relative,
+        )
+        return hits[:chosen], {"adaptive_k": chosen, "adaptive_reason": reason}
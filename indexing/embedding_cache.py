@@ -0,0 +1,159 @@
+"""
+LRU cache for query embeddings.
+
+Embedding a question is a network round trip; repeated or retried
+questions reuse the cached vector instead. Entries are keyed by embedding
+model and normalized query text. With a `path`, entries are also written
+to a small SQLite file so the cache survives restarts; `max_entries` bounds
+it too, least recently used entries going first.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class CachedQueryEmbeddings:
+    """
+    Wrap an Embeddings object and cache `embed_query` results.
+
+    `embed_documents` is passed through untouched (ingestion embeds each
+    chunk once). Each entry remembers how long the original call took, so a
+    hit can report the latency it saved.
+    """
+
+    def __init__(self, embeddings, model: str, max_entries: int = 1024, path: Optional[str] = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(model TEXT, query TEXT, vector BLOB, cost_ms REAL, last_used REAL, PRIMARY KEY (model, query))"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(query_embeddings)")}
+            if "last_used" not in columns:
+                # Written before entries were evicted
+                self._db.execute("ALTER TABLE query_embeddings ADD COLUMN last_used REAL DEFAULT 0")
+            self._db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)")
+            self._db.commit()
+
+    # -----------------------------
+    # Embeddings interface
+    # -----------------------------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_query_with_info(text)[0]
+
+    def embed_query_with_info(self, text: str) -> Tuple[List[float], Dict[str, Any]]:
+        key = (self.model, normalize_query(text))
+        cached = self._get(key)
+        if cached is not None:
+            vector, cost_ms = cached
+            with self._lock:
+                self.hits += 1
+                self.saved_ms += cost_ms
+            return vector, {"embed_cache": "hit", "embed_saved_ms": round(cost_ms, 2)}
+
+        start = perf_counter()
+        vector = self.embeddings.embed_query(text)
+        cost_ms = (perf_counter() - start) * 1000
+        self._put(key, vector, cost_ms)
+        with self._lock:
+            self.misses += 1
+        return vector, {"embed_cache": "miss"}
+
+    # -----------------------------
+    # Storage
+    # -----------------------------
+
+    def _get(self, key: Tuple[str, str]) -> Optional[Tuple[List[float], float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT vector, cost_ms FROM query_embeddings WHERE model = ? AND query = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND query = ?", (time.time(), *key)
+            )
+            self._db.commit()
+        entry = (np.frombuffer(row[0], dtype=np.float32).tolist(), row[1])
+        self._remember(key, entry)
+        return entry
+
+    def _put(self, key: Tuple[str, str], vector: List[float], cost_ms: float) -> None:
+        self._remember(key, (vector, cost_ms))
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, query, vector, cost_ms, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (*key, np.asarray(vector, dtype=np.float32).tobytes(), cost_ms, time.time()),
+                )
+                (count,) = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()
+                if count > self.max_entries:
+                    self._db.execute(
+                        "DELETE FROM query_embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM query_embeddings ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+                self._db.commit()
+
+    def _remember(self, key: Tuple[str, str], entry: Tuple[List[float], float]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "saved_ms": round(self.saved_ms, 1),
+            }
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM query_embeddings")
+                self._db.commit()
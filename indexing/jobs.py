@@ -0,0 +1,151 @@
+"""
+Checkpointed ingestion jobs and the active-index pointer.
+
+A job directory records everything needed to finish an interrupted
+ingestion run without redoing committed work:
+
+    job.json        parameters, target collection, batch size, committed batches
+    chunks.jsonl    the split chunks, in the order batches are cut from
+    vectors-N.npy   embedded vectors of batch N (quantized storage only; Chroma
+                    batches are committed straight into the target collection)
+
+job.json is only rewritten after a batch is durable, and always via a
+temporary file + os.replace, so a crash leaves either the old or the new
+checkpoint on disk.
+
+`active.json` in the persist directory names the collection queries read
+from. Rebuilds write into a fresh staging collection and flip this
+pointer when they finish, so readers never see a half-built index. The
+generation a flip replaced is recorded as "retired" and kept until the
+next flip, so readers that opened it before the flip can finish.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+ACTIVE_FILE = "active.json"
+
+
+def write_json_atomic(path: str | os.PathLike, data: Dict[str, Any]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_active(persist_dir: str | os.PathLike) -> Optional[Dict[str, Any]]:
+    """The active-index record ({"collection", "shards", "storage"}, maybe "retired"), or None."""
+    path = Path(persist_dir) / ACTIVE_FILE
+    if not path.is_file():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_active(
+    persist_dir: str | os.PathLike, collection: str, shards: int, storage: str, retired: Optional[Dict[str, Any]] = None
+) -> None:
+    record: Dict[str, Any] = {"collection": collection, "shards": shards, "storage": storage}
+    if retired:
+        record["retired"] = {key: retired[key] for key in ("collection", "shards", "storage")}
+    write_json_atomic(Path(persist_dir) / ACTIVE_FILE, record)
+
+
+class IngestJob:
+    """Progress of one ingestion run, persisted in `directory`."""
+
+    def __init__(self, directory: str | os.PathLike, state: Dict[str, Any]):
+        self.directory = Path(directory)
+        self.state = state
+
+    @classmethod
+    def create(
+        cls,
+        directory: str | os.PathLike,
+        chunks: List[Document],
+        batch_size: int,
+        **params: Any,
+    ) -> "IngestJob":
+        """Start a job: discard any previous job in `directory` and record the chunks."""
+        directory = Path(directory)
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+        with open(directory / "chunks.jsonl", "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps({"text": chunk.page_content, "metadata": chunk.metadata}) + "\n")
+        job = cls(
+            directory,
+            {
+                **params,
+                "chunks": len(chunks),
+                "batch_size": batch_size,
+                "committed": 0,
+            },
+        )
+        job._save()
+        return job
+
+    @classmethod
+    def load(cls, directory: str | os.PathLike) -> "IngestJob":
+        directory = Path(directory)
+        state = json.loads((directory / "job.json").read_text(encoding="utf-8"))
+        return cls(directory, state)
+
+    @staticmethod
+    def exists(directory: str | os.PathLike) -> bool:
+        return (Path(directory) / "job.json").is_file()
+
+    def _save(self) -> None:
+        write_json_atomic(self.directory / "job.json", self.state)
+
+    # -----------------------------
+    # Progress
+    # -----------------------------
+
+    @property
+    def batches(self) -> int:
+        return -(-self.state["chunks"] // self.state["batch_size"])
+
+    @property
+    def committed(self) -> int:
+        return self.state["committed"]
+
+    def chunks(self) -> List[Document]:
+        """All chunks, with ids that are stable across resumes (re-upserting a batch is idempotent)."""
+        docs = []
+        with open(self.directory / "chunks.jsonl", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                rec = json.loads(line)
+                docs.append(Document(page_content=rec["text"], metadata=rec["metadata"], id=f"{self.state['job_id']}-{i}"))
+        return docs
+
+    def pending(self, chunks: List[Document]) -> Iterator[tuple]:
+        """(batch number, chunks) for every batch not committed yet."""
+        size = self.state["batch_size"]
+        for batch in range(self.committed, self.batches):
+            yield batch, chunks[batch * size : (batch + 1) * size]
+
+    def commit(self, batch: int, vectors: Optional[Any] = None) -> None:
+        """Mark `batch` durable; `vectors` are kept in the job when the target is written at the end."""
+        if vectors is not None:
+            np.save(self.directory / f"vectors-{batch}.npy", np.asarray(vectors, dtype=np.float32))
+        self.state["committed"] = batch + 1
+        self._save()
+
+    def vectors(self) -> np.ndarray:
+        """Vectors saved by commit(), in chunk order."""
+        return np.concatenate([np.load(self.directory / f"vectors-{b}.npy") for b in range(self.batches)])
+
+    def finish(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,142 @@
+"""
+Index maintenance: statistics, stale-chunk detection and latency probes.
+
+Appending runs (build_index without --rebuild) leave three kinds of dead
+weight in a collection. plan_cleanup() finds them from the stored chunk
+metadata alone (no embedding calls):
+
+    superseded  chunks of a source from an older ingestion run than the
+                latest run that ingested that source (files are always
+                ingested whole, so the latest run has its current content)
+    duplicates  identical text from the same source, beyond the first copy
+    orphans     chunks of local files that no longer exist; web pages are
+                never treated as orphans
+
+Sources are stored as normalized relative paths (absolute paths lose their
+leading "/"), so files are looked up relative to the working directory,
+and as absolute paths. If *every* local source looks missing, the command
+was most likely run from the wrong directory, so no orphans are reported.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _source_exists(source: str) -> bool:
+    return os.path.exists(source) or os.path.exists("/" + source)
+
+
+@dataclass
+class CleanupPlan:
+    """Row indices to keep and to drop, by reason."""
+    keep: List[int] = field(default_factory=list)
+    superseded: List[int] = field(default_factory=list)
+    duplicates: List[int] = field(default_factory=list)
+    orphans: List[int] = field(default_factory=list)
+    missing_sources: List[str] = field(default_factory=list)
+    orphan_check_skipped: bool = False
+
+    @property
+    def removed(self) -> int:
+        return len(self.superseded) + len(self.duplicates) + len(self.orphans)
+
+
+def plan_cleanup(
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    exists: Callable[[str], bool] = _source_exists,
+) -> CleanupPlan:
+    """Classify every chunk; see the module docstring for the rules."""
+    plan = CleanupPlan()
+    latest: Dict[str, int] = defaultdict(int)
+    for metadata in metadatas:
+        source = str(metadata.get("source", ""))
+        latest[source] = max(latest[source], int(metadata.get("ingested_at") or 0))
+
+    local = {str(m.get("source", "")) for m in metadatas if m.get("source_type") != "web" and m.get("source")}
+    missing = {s for s in local if not exists(s)}
+    if missing and missing == local:
+        plan.orphan_check_skipped = True
+        missing = set()
+    plan.missing_sources = sorted(missing)
+
+    seen = set()
+    for row, (text, metadata) in enumerate(zip(texts, metadatas)):
+        source = str(metadata.get("source", ""))
+        if source in missing:
+            plan.orphans.append(row)
+        elif int(metadata.get("ingested_at") or 0) < latest[source]:
+            plan.superseded.append(row)
+        else:
+            key = hashlib.blake2b(f"{source}\0{text}".encode("utf-8"), digest_size=16).digest()
+            if key in seen:
+                plan.duplicates.append(row)
+            else:
+                seen.add(key)
+                plan.keep.append(row)
+    return plan
+
+
+def index_stats(texts: Sequence[str], metadatas: Sequence[Dict[str, Any]], top: int = 10) -> Dict[str, Any]:
+    """Chunk / source counts and the share of chunks whose text repeats an earlier chunk."""
+    per_source = Counter(str(m.get("source", "")) for m in metadatas)
+    distinct = len({hashlib.blake2b(t.encode("utf-8"), digest_size=16).digest() for t in texts})
+    chunks = len(texts)
+    return {
+        "chunks": chunks,
+        "sources": len(per_source),
+        "duplicate_ratio": round(1 - distinct / chunks, 4) if chunks else 0.0,
+        "top_sources": per_source.most_common(top),
+    }
+
+
+def query_latency(
+    search: Callable[[np.ndarray], Any], queries: np.ndarray, repeats: int = 3
+) -> Optional[Dict[str, float]]:
+    """p50 / p95 latency of `search` over stored vectors used as queries (first pass is warm-up)."""
+    if not len(queries):
+        return None
+    for q in queries:
+        search(q)
+    samples = []
+    for _ in range(repeats):
+        for q in queries:
+            start = perf_counter()
+            search(q)
+            samples.append(perf_counter() - start)
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3)}
+
+
+def format_report(stats: Dict[str, Any], plan: CleanupPlan, sizes: Dict[str, int], latency: Optional[Dict[str, float]]) -> str:
+    mb = 1024 * 1024
+    lines = [
+        f"chunks           {stats['chunks']}",
+        f"sources          {stats['sources']}",
+        f"duplicate ratio  {stats['duplicate_ratio']:.1%} (identical text)",
+        f"on disk          {sizes['disk_bytes'] / mb:.1f} MB",
+        f"vector index     {sizes['vector_bytes'] / mb:.1f} MB",
+    ]
+    if latency:
+        lines.append(f"query latency    p50 {latency['p50_ms']:.2f} ms, p95 {latency['p95_ms']:.2f} ms")
+    lines.append(
+        f"removable        {plan.removed} chunks: {len(plan.superseded)} superseded, "
+        f"{len(plan.duplicates)} duplicates, {len(plan.orphans)} orphans"
+    )
+    if plan.missing_sources:
+        shown = ", ".join(plan.missing_sources[:5]) + (" ..." if len(plan.missing_sources) > 5 else "")
+        lines.append(f"missing sources  {len(plan.missing_sources)}: {shown}")
+    if plan.orphan_check_skipped:
+        lines.append("orphan check     skipped: no local source exists here (run from the directory ingestion ran in)")
+    if stats["top_sources"]:
+        lines.append("largest sources:")
+        lines.extend(f"  {count:>8}  {source or '(none)'}" for source, count in stats["top_sources"])
+    return "\n".join(lines)
@@ -0,0 +1,119 @@
+"""
+Read-only searcher over a memory-mapped index snapshot.
+
+MappedIndex serves queries straight from a snapshot file (see
+indexing.snapshot): the vector block is memory-mapped and scored in place,
+and the id / text / metadata of a hit are decoded from the file only when
+it is returned. Nothing proportional to the corpus is copied into the
+process except one float per row (the inverse vector norm), so any number
+of processes can open the same file and share a single copy of it through
+the OS page cache. prefork.py uses it for its worker processes.
+
+Search is exact (brute-force cosine similarity, like QuantizedIndex with
+float32 codes). A `where` clause is evaluated on the snapshot's filter
+columns: once per distinct value of each key it tests, then looked up for
+every row through the mapped codes. Only clauses on other keys (or older
+snapshots without filter columns) decode every row's metadata.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from indexing.metadata import matches
+from indexing.search import ScoredChunk
+from indexing.snapshot import Snapshot
+
+# Rows scored per matmul; bounds the float32 temporary for float16 snapshots
+_SCORE_BLOCK = 16384
+
+
+class MappedIndex:
+    """Brute-force cosine searcher over a snapshot file; see the module docstring."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.snapshot = Snapshot(path)
+        self.model = self.snapshot.model
+        self.vectors = self.snapshot.vectors
+        norms = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), _SCORE_BLOCK):
+            block = np.asarray(self.vectors[start : start + _SCORE_BLOCK], dtype=np.float32)
+            norms[start : start + len(block)] = np.linalg.norm(block, axis=1)
+        norms[norms == 0] = 1.0
+        self._inverse_norms = 1.0 / norms
+        self._columns = self.snapshot.filter_columns or {}
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes this process holds privately; the mapped file is shared."""
+        return int(self._inverse_norms.nbytes)
+
+    def rows_matching(self, where: Dict[str, Any]) -> np.ndarray:
+        """Row indices whose metadata satisfies a Chroma-style `where` clause."""
+        mask = self._mask(where)
+        if mask is None:
+            return np.array([i for i, md in enumerate(self.snapshot.metadatas) if matches(md, where)], dtype=np.int64)
+        return np.flatnonzero(mask)
+
+    def _mask(self, where: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Rows matching `where` from the filter columns; None if it tests another key."""
+        masks = []
+        for key, cond in where.items():
+            if key in ("$and", "$or"):
+                parts = [self._mask(c) for c in cond]
+                if any(part is None for part in parts):
+                    return None
+                combine = np.logical_and if key == "$and" else np.logical_or
+                masks.append(combine.reduce(parts) if parts else np.full(len(self), key == "$and"))
+            elif key in self._columns:
+                # Same semantics as matches(); code 0 is a row without the key
+                values, codes = self._columns[key]
+                table = np.array([matches({}, {key: cond})] + [matches({key: v}, {key: cond}) for v in values])
+                masks.append(table[codes])
+            else:
+                return None
+        return np.logical_and.reduce(masks) if masks else np.ones(len(self), dtype=bool)
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of `query` to every row, or only to `rows`."""
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        if rows is not None:
+            return (np.asarray(self.vectors[rows], dtype=np.float32) @ q) * self._inverse_norms[rows]
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), _SCORE_BLOCK):
+            block = np.asarray(self.vectors[start : start + _SCORE_BLOCK], dtype=np.float32)
+            scores[start : start + len(block)] = block @ q
+        return scores * self._inverse_norms
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 4,
+        with_embeddings: bool = False,
+        where: Optional[Dict[str, Any]] = None,
+        **_: Any,
+    ) -> List[ScoredChunk]:
+        rows = self.rows_matching(where) if where else None
+        n = len(self) if rows is None else len(rows)
+        if n == 0 or k <= 0:
+            return []
+        scores = self.scores(np.asarray(query, dtype=np.float32), rows)
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for local, score in zip(top.tolist(), scores[top].tolist()):
+            i = local if rows is None else int(rows[local])
+            id_, text, metadata = self.snapshot.row(i)
+            embedding = np.asarray(self.vectors[i], dtype=np.float32) if with_embeddings else None
+            doc = Document(page_content=text, metadata=metadata, id=id_)
+            results.append(ScoredChunk(document=doc, score=float(score), embedding=embedding))
+        return results
@@ -0,0 +1,154 @@
+"""
+Normalized chunk metadata and query-time filters.
+
+Ingestion adds these keys to every document (on top of the loader's own
+`source` / `page`):
+
+    source        posix path or URL the chunk came from
+    source_type   "pdf", "md", "txt" or "web"
+    path_1..N     path prefixes: "docs", "docs/manuals", ... (URLs start at the host)
+    ingested_at   unix timestamp of the ingestion run
+    tag           optional user-defined collection tag
+
+Vector stores can only compare metadata values for equality / ranges, so a
+directory prefix filter becomes an equality test on `path_<depth>`.
+build_where() turns user filters into a Chroma `where` clause; matches()
+evaluates the same clause in Python for stores without native filtering.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+MAX_PATH_DEPTH = 8
+FILTER_KEYS = ("source", "source_type", "path_prefix", "tag", "ingested_after")
+# Metadata keys the clauses of build_where() test
+WHERE_KEYS = ("source", "source_type", "tag", "ingested_at") + tuple(f"path_{d}" for d in range(1, MAX_PATH_DEPTH + 1))
+
+
+def _split_source(source: str) -> List[str]:
+    parsed = urlparse(source)
+    if parsed.scheme in ("http", "https"):
+        return [parsed.netloc] + [p for p in parsed.path.split("/") if p]
+    path = source.replace("\\", "/")
+    return [p for p in PurePosixPath(path).parts if p not in (".", "/")]
+
+
+def _normalize_prefix(prefix: str) -> str:
+    return "/".join(_split_source(prefix.rstrip("/")))
+
+
+def normalize_source(source: str) -> str:
+    """The form `source` is stored in: posix path without leading "/" or "./", or the URL."""
+    if urlparse(source).scheme in ("http", "https"):
+        return source
+    return _normalize_prefix(source)
+
+
+def normalize_metadata(
+    metadata: Dict[str, Any],
+    source_type: str,
+    ingested_at: int,
+    tag: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Return a copy of loader metadata with the normalized keys added."""
+    out = {k: v for k, v in (metadata or {}).items() if v is not None}
+    source = str(out.get("source", ""))
+    parts = _split_source(source)
+    if source_type != "web":
+        out["source"] = "/".join(parts)
+        parts = parts[:-1]  # directories only; the file itself is `source`
+    out["source_type"] = source_type
+    for depth in range(1, min(len(parts), MAX_PATH_DEPTH) + 1):
+        out[f"path_{depth}"] = "/".join(parts[:depth])
+    out["ingested_at"] = int(ingested_at)
+    if tag:
+        out["tag"] = tag
+    return out
+
+
+def _one_or_in(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        return {key: values[0]} if len(values) == 1 else {key: {"$in": values}}
+    return {key: value}
+
+
+def _timestamp(value: Any) -> int:
+    if isinstance(value, (int, float)):
+        return int(value)
+    if str(value).strip().isdigit():
+        return int(str(value).strip())
+    return int(datetime.fromisoformat(str(value)).timestamp())
+
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Translate user filters into a Chroma `where` clause (None for no filter).
+
+    Supported keys: source, source_type, tag (value or list of values),
+    path_prefix (directory, or host/path for URLs) and ingested_after
+    (unix time or ISO date).
+    """
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter(s) {sorted(unknown)}; expected {FILTER_KEYS}")
+
+    clauses = []
+    if filters.get("source"):
+        sources = filters["source"]
+        if isinstance(sources, str):
+            sources = [sources]
+        clauses.append(_one_or_in("source", [normalize_source(s) for s in sources]))
+    for key in ("source_type", "tag"):
+        if filters.get(key):
+            clauses.append(_one_or_in(key, filters[key]))
+    if filters.get("path_prefix"):
+        prefix = _normalize_prefix(filters["path_prefix"])
+        depth = len(prefix.split("/"))
+        if depth > MAX_PATH_DEPTH:
+            raise ValueError(f"path_prefix deeper than {MAX_PATH_DEPTH} levels: {prefix}")
+        clauses.append({f"path_{depth}": prefix})
+    if filters.get("ingested_after") is not None:
+        clauses.append({"ingested_at": {"$gte": _timestamp(filters["ingested_after"])}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style `where` clause against one metadata dict."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            if not all(_OPS[op](value, arg) for op, arg in cond.items()):
+                return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
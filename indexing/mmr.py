@@ -0,0 +1,102 @@
+"""
+Maximal marginal relevance (MMR) diversification of retrieval candidates.
+
+Adjacent chunks of the same passage embed almost identically, so a plain
+top-k often returns the same content several times. MMR greedily picks the
+candidate maximizing
+
+    lambda * relevance - (1 - lambda) * max_similarity_to_already_picked
+
+using one candidate-by-candidate similarity matrix and vectorized updates.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from indexing.search import ScoredChunk
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    dedup_threshold: Optional[float] = None,
+) -> List[int]:
+    """
+    Return indices of up to k candidates in MMR order.
+
+    relevance: (n,) similarity of each candidate to the query.
+    embeddings: (n, d) candidate vectors (normalized internally).
+    dedup_threshold: candidates whose cosine similarity to an already picked
+        one is at or above this value are never picked, so fewer than k may
+        be returned when the pool has little diversity.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    similarity = vectors @ vectors.T
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    picked: List[int] = []
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    first = int(np.argmax(relevance))
+    while len(picked) < k:
+        if picked:
+            scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_sim
+            scores[~available] = -np.inf
+            choice = int(np.argmax(scores))
+            if not np.isfinite(scores[choice]):
+                break
+        else:
+            choice = first
+        picked.append(choice)
+        available[choice] = False
+        max_sim = np.maximum(max_sim, similarity[choice])
+        if dedup_threshold is not None:
+            available &= max_sim < dedup_threshold
+        if not available.any():
+            break
+    return picked
+
+
+class MMRStage:
+    """
+    Retrieval post-processing stage for VectorRetriever.
+
+    Receives the fetch_k candidate pool (with embeddings) and returns a
+    diverse top-k plus stats for the trace.
+    """
+
+    needs_embeddings = True
+
+    def __init__(self, lambda_mult: float = 0.5, dedup_threshold: Optional[float] = 0.97):
+        self.lambda_mult = lambda_mult
+        self.dedup_threshold = dedup_threshold
+
+    def __call__(self, hits: List[ScoredChunk], k: int) -> Tuple[List[ScoredChunk], Dict[str, Any]]:
+        if len(hits) <= 1 or any(h.embedding is None for h in hits):
+            return hits[:k], {}
+        order = mmr_select(
+            np.array([h.score for h in hits]),
+            np.stack([np.asarray(h.embedding, dtype=np.float32) for h in hits]),
+            k,
+            self.lambda_mult,
+            self.dedup_threshold,
+        )
+        selected = [hits[i] for i in order]
+        baseline = {id(h) for h in hits[:k]}
+        return selected, {
+            "mmr_pool": len(hits),
+            "mmr_reordered": sum(1 for h in selected if id(h) not in baseline),
+            "mmr_dropped_duplicates": max(0, min(k, len(hits)) - len(selected)),
+        }
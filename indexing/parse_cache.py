@@ -0,0 +1,87 @@
+"""
+On-disk cache of parsed (text-extracted) documents.
+
+Parsing PDFs is the slowest CPU stage of ingestion and gives the same
+result for the same bytes. ParsedDocumentCache stores the pages a loader
+produced for a file. Entries are keyed by the sha256 of the file content
+and the loader version (parser library versions plus our extraction code),
+so an edited file or an upgraded parser is parsed again, while a renamed or
+copied file is not. Each entry is one gzip-compressed JSON file under
+<directory>/<2 hex chars>/<key>.json.gz, written atomically.
+
+The cache holds no other state; the directory can be deleted at any time.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+
+def file_sha256(path: str | os.PathLike, block: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParsedDocumentCache:
+    """Compressed page cache keyed by file content hash and loader version; see the module docstring."""
+
+    def __init__(self, directory: str | os.PathLike, level: int = 6):
+        self.directory = Path(directory)
+        self.level = level
+        self.hits = self.misses = 0
+        self.saved_s = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, content_hash: str, loader: str) -> Path:
+        key = hashlib.sha256(f"{loader}\0{content_hash}".encode("utf-8")).hexdigest()
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def get(self, path: str | os.PathLike, content_hash: str, loader: str) -> Optional[List[Document]]:
+        """Cached pages for this content, with `source` pointing at `path`; None on a miss."""
+        entry = self._path(content_hash, loader)
+        try:
+            with gzip.open(entry, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, EOFError, ValueError):
+            # Missing, or truncated by a crash: parse again and overwrite
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.saved_s += data.get("parse_s", 0.0)
+        docs = []
+        for page in data["documents"]:
+            metadata = page["metadata"]
+            if "source" in metadata:
+                metadata["source"] = str(path)
+            docs.append(Document(page_content=page["page_content"], metadata=metadata))
+        return docs
+
+    def put(self, content_hash: str, loader: str, documents: List[Document], parse_s: float = 0.0) -> None:
+        entry = self._path(content_hash, loader)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        data: Dict[str, Any] = {
+            "loader": loader,
+            "parse_s": round(parse_s, 4),
+            "documents": [{"page_content": d.page_content, "metadata": d.metadata} for d in documents],
+        }
+        tmp = entry.with_name(f"{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=self.level) as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "saved_s": round(self.saved_s, 2)}
@@ -0,0 +1,98 @@
+"""
+PDF text extraction, page-parallel for large files.
+
+PyPDFLoader extracts pages one after another in the calling process, and
+pypdf's text extraction is pure Python (CPU-bound, holds the GIL).
+PdfExtractor gives PDFs with at least `min_pages` pages to a process pool:
+each worker opens the file and extracts a contiguous page range. Smaller
+files go through PyPDFLoader unchanged. The output matches PyPDFLoader
+(one Document per page, same text and metadata); the first page is
+extracted with PyPDFLoader itself to get the document-level metadata.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Bump when the extraction below changes what is produced (invalidates
+# parsed-document caches, see indexing.parse_cache)
+EXTRACTOR_VERSION = 1
+
+
+def loader_version() -> str:
+    """Identifies everything that determines the extracted text."""
+    import langchain_community
+    import pypdf
+
+    return f"pypdf-{pypdf.__version__}/langchain-community-{langchain_community.__version__}/{EXTRACTOR_VERSION}"
+
+
+def _extract_pages(path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process; same call PyPDFParser makes (mode "plain")
+    import pypdf
+
+    reader = pypdf.PdfReader(path)
+    return [reader.pages[i].extract_text(extraction_mode="plain").strip() for i in range(start, stop)]
+
+
+def _page_ranges(first: int, pages: int, parts: int) -> List[Tuple[int, int]]:
+    size = -(-(pages - first) // parts)
+    return [(start, min(start + size, pages)) for start in range(first, pages, size)]
+
+
+class PdfExtractor:
+    """Page-parallel PDF loader; see the module docstring. Use as a context manager."""
+
+    def __init__(self, workers: Optional[int] = None, min_pages: int = 16):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_pages = min_pages
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "PdfExtractor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def load(self, path: str | os.PathLike) -> List[Document]:
+        from langchain_community.document_loaders import PyPDFLoader
+
+        path = str(path)
+        loader = PyPDFLoader(path)
+        if self.workers <= 1:
+            return loader.load()
+
+        import pypdf
+
+        reader = pypdf.PdfReader(path)
+        pages = len(reader.pages)
+        if pages < max(self.min_pages, 2):
+            # The first page is loaded here; a single page leaves nothing to split
+            return loader.load()
+
+        first = next(loader.lazy_load())
+        labels = reader.page_labels
+        if self._pool is None:
+            # Started on the first large PDF and reused for the rest of the run.
+            # Spawned, not forked: this runs inside the server (/ingest, --watch),
+            # and a forked copy of its threads' locks can deadlock the child
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        ranges = _page_ranges(1, pages, self.workers)
+        futures = [self._pool.submit(_extract_pages, path, start, stop) for start, stop in ranges]
+        docs = [first]
+        page = 1
+        for future in futures:
+            for text in future.result():
+                docs.append(Document(page_content=text, metadata={**first.metadata, "page": page, "page_label": labels[page]}))
+                page += 1
+        return docs
@@ -0,0 +1,200 @@
+"""
+Per-stage profiling for ingestion runs.
+
+StageProfiler accumulates, for each named stage (discover, load, split,
+embed, write): wall time, process CPU time (all threads), items handled,
+peak Python heap allocated inside the stage (tracemalloc) and peak process
+RSS (sampled by a background thread from /proc, falling back to
+getrusage). A stage may be entered many times (e.g. once per embedding
+batch); times add up and peaks take the maximum.
+
+A disabled profiler measures nothing, so callers can use it
+unconditionally.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import platform
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size in bytes, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # Lifetime peak, not current; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == "Darwin" else peak * 1024
+    return None
+
+
+def current_pss() -> Optional[int]:
+    """
+    Proportional set size in bytes (pages shared with other processes count
+    as their share), or None where it cannot be read (Linux only).
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class _RssSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(daemon=True, name="rss-sampler")
+        self.interval = interval
+        self.peak = current_rss() or 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def reset(self) -> int:
+        """Return the peak since the last reset and start a new window."""
+        peak, self.peak = max(self.peak, current_rss() or 0), current_rss() or 0
+        return peak
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+class StageProfiler:
+    """Collect per-stage timings and memory peaks; see the module docstring."""
+
+    def __init__(self, enabled: bool = True, cprofile_path: Optional[str] = None, rss_interval: float = 0.05):
+        self.enabled = enabled
+        self.cprofile_path = cprofile_path if enabled else None
+        self.rss_interval = rss_interval
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._sampler: Optional[_RssSampler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        self._start = 0.0
+        self._cpu_start = 0.0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+
+    # -----------------------------
+    # Run / stage scopes
+    # -----------------------------
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._sampler = _RssSampler(self.rss_interval)
+        self._sampler.start()
+        if self.cprofile_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._start, self._cpu_start = time.perf_counter(), time.process_time()
+
+    def stop(self) -> None:
+        if not self.enabled or self._sampler is None:
+            return
+        self.wall_s = time.perf_counter() - self._start
+        self.cpu_s = time.process_time() - self._cpu_start
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+        self._sampler.stop()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        self._sampler = None
+
+    @contextmanager
+    def run(self) -> Iterator["StageProfiler"]:
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0) -> Iterator[None]:
+        if not self.enabled or self._sampler is None:
+            yield
+            return
+        stats = self.stages.setdefault(
+            name,
+            {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "items": 0, "peak_alloc_bytes": 0, "peak_rss_bytes": 0},
+        )
+        tracemalloc.reset_peak()
+        base_alloc = tracemalloc.get_traced_memory()[0]
+        self._sampler.reset()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            stats["calls"] += 1
+            stats["wall_s"] += time.perf_counter() - wall
+            stats["cpu_s"] += time.process_time() - cpu
+            stats["items"] += items
+            stats["peak_alloc_bytes"] = max(stats["peak_alloc_bytes"], tracemalloc.get_traced_memory()[1] - base_alloc)
+            stats["peak_rss_bytes"] = max(stats["peak_rss_bytes"], self._sampler.reset())
+
+    def add_items(self, name: str, items: int) -> None:
+        if name in self.stages:
+            self.stages[name]["items"] += items
+
+    # -----------------------------
+    # Reporting
+    # -----------------------------
+
+    def report(self) -> Dict[str, Any]:
+        stages = {}
+        for name, s in self.stages.items():
+            stages[name] = {
+                **s,
+                "wall_s": round(s["wall_s"], 4),
+                "cpu_s": round(s["cpu_s"], 4),
+                "items_per_s": round(s["items"] / s["wall_s"], 1) if s["wall_s"] and s["items"] else None,
+            }
+        return {
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(self.cpu_s, 4),
+            "stages": stages,
+            "cprofile": self.cprofile_path,
+        }
+
+    def write_json(self, path: str, **extra: Any) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**extra, **self.report()}, f, indent=2)
+
+    def format_table(self) -> str:
+        mb = 1024 * 1024
+        lines = [f"{'stage':<10}{'wall s':>9}{'cpu s':>9}{'wall %':>8}{'items':>9}{'items/s':>10}{'alloc MB':>10}{'rss MB':>9}"]
+        for name, s in self.report()["stages"].items():
+            share = 100 * s["wall_s"] / self.wall_s if self.wall_s else 0.0
+            rate = f"{s['items_per_s']:.1f}" if s["items_per_s"] else "-"
+            lines.append(
+                f"{name:<10}{s['wall_s']:>9.2f}{s['cpu_s']:>9.2f}{share:>7.1f}%{s['items']:>9}{rate:>10}"
+                f"{s['peak_alloc_bytes'] / mb:>10.1f}{s['peak_rss_bytes'] / mb:>9.1f}"
+            )
+        lines.append(f"{'total':<10}{self.wall_s:>9.2f}{self.cpu_s:>9.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,364 @@
+"""
+Compact vector storage for the chunk index.
+
+Keeps embeddings as float16 or int8 (with a per-vector scale), optionally
+reduced to a smaller dimension by prefix truncation or PCA. Candidates are
+scored against the compact codes; the top `rescore_k` are then re-ranked with
+the full-precision vectors, which stay on disk and are memory-mapped so they
+never become resident as a whole.
+
+On-disk layout of an index directory:
+    meta.json     storage mode, dimensions, reduction, embedding model tag
+    codes.npy     (n, dim) float16 / int8 / float32 codes
+    scales.npy    (n,) float32 per-vector scales (int8 only)
+    full.npy      (n, full_dim) float32 unit vectors for rescoring (optional)
+    pca.npz       PCA mean/components (reduction == "pca" only)
+    chunks.jsonl  one {"id", "text", "metadata"} record per row
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from indexing.metadata import matches
+from indexing.search import ScoredChunk
+
+STORAGE_MODES = ("float32", "float16", "int8")
+REDUCTIONS = ("prefix", "pca")
+
+# Rows scored per matmul; bounds the float32 temporary created when
+# upcasting compact codes at query time.
+_SCORE_BLOCK = 16384
+# Distinct `where` clauses whose matching rows are kept per index.
+_FILTER_CACHE_SIZE = 64
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors: np.ndarray, mode: str):
+    """
+    Quantize a (n, d) float matrix.
+
+    Returns (codes, scales); scales is None unless mode == "int8", where each
+    row is stored as round(x / scale) with scale = max|x| / 127.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == "float32":
+        return vectors, None
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown storage mode {mode!r}; expected one of {STORAGE_MODES}")
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    out = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        out = out * scales[:, None]
+    return out
+
+
+class DimReducer:
+    """
+    Project full-size embeddings down to `dim` components.
+
+    "prefix" keeps the leading coordinates (works well for Matryoshka-style
+    models such as text-embedding-3-*); "pca" fits a projection on the corpus.
+    Outputs are re-normalized so dot products stay cosine similarities.
+    """
+
+    def __init__(self, dim: Optional[int] = None, method: str = "prefix"):
+        if method not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction {method!r}; expected one of {REDUCTIONS}")
+        self.dim = dim
+        self.method = method
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    @property
+    def active(self) -> bool:
+        return self.dim is not None
+
+    def fit(self, vectors: np.ndarray) -> "DimReducer":
+        if self.active and self.method == "pca":
+            self.mean = vectors.mean(axis=0)
+            # Right singular vectors of the centered data are the principal axes.
+            _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+            self.components = vt[: self.dim].astype(np.float32)
+        return self
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.active:
+            return vectors
+        if self.method == "prefix":
+            reduced = vectors[..., : self.dim]
+        else:
+            if self.components is None:
+                raise RuntimeError("PCA reducer used before fit()")
+            reduced = (vectors - self.mean) @ self.components.T
+        return _normalize(reduced)
+
+
+def fit_reducer(embeddings: Sequence[Sequence[float]], dim: Optional[int] = None, reduction: str = "prefix") -> DimReducer:
+    """A reducer fitted on `embeddings` as build() fits one, for indexes that must share it."""
+    return DimReducer(dim, reduction).fit(_normalize(np.asarray(embeddings, dtype=np.float32)))
+
+
+class QuantizedIndex:
+    """
+    Brute-force cosine index over quantized chunk vectors.
+
+    search() returns ScoredChunk objects, so it can stand in for the Chroma
+    searcher behind a VectorRetriever.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scales: Optional[np.ndarray],
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        mode: str,
+        reducer: DimReducer,
+        full: Optional[np.ndarray] = None,
+        model: str = "",
+    ):
+        self.codes = codes
+        self.scales = scales
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.mode = mode
+        self.reducer = reducer
+        self.full = full
+        self.model = model
+        self._filter_rows: Dict[str, np.ndarray] = {}
+
+    # -----------------------------
+    # Construction / persistence
+    # -----------------------------
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: Sequence[Sequence[float]],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        mode: str = "int8",
+        dim: Optional[int] = None,
+        reduction: str = "prefix",
+        keep_full: bool = True,
+        model: str = "",
+        ids: Optional[List[str]] = None,
+        reducer: Optional[DimReducer] = None,
+    ) -> "QuantizedIndex":
+        """
+        Index `embeddings`. A fitted `reducer` (see fit_reducer()) replaces
+        `dim` / `reduction`: indexes whose reduced vectors are compared with
+        each other, such as the shards of one index, must share it.
+        """
+        full = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if reducer is None:
+            reducer = DimReducer(dim, reduction).fit(full)
+        codes, scales = quantize(reducer.transform(full), mode)
+        return cls(
+            codes=codes,
+            scales=scales,
+            ids=list(ids) if ids else [str(uuid.uuid4()) for _ in texts],
+            texts=list(texts),
+            metadatas=[dict(m or {}) for m in metadatas],
+            mode=mode,
+            reducer=reducer,
+            full=full if keep_full else None,
+            model=model,
+        )
+
+    def extend(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+    ) -> None:
+        """Append chunks, reusing the already-fitted reducer."""
+        full = _normalize(np.asarray(embeddings, dtype=np.float32))
+        codes, scales = quantize(self.reducer.transform(full), self.mode)
+        self.codes = np.concatenate([self.codes, codes])
+        if self.scales is not None:
+            self.scales = np.concatenate([self.scales, scales])
+        if self.full is not None:
+            self.full = np.concatenate([np.asarray(self.full), full])
+        self.ids.extend(ids or [str(uuid.uuid4()) for _ in texts])
+        self.texts.extend(texts)
+        self.metadatas.extend(dict(m or {}) for m in metadatas)
+        self._filter_rows.clear()
+
+    def save(self, directory: str | os.PathLike) -> None:
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "mode": self.mode,
+            "count": len(self.ids),
+            "dim": int(self.codes.shape[1]) if self.codes.ndim == 2 else 0,
+            "full_dim": int(self.full.shape[1]) if self.full is not None else None,
+            "reduction": self.reducer.method,
+            "reduced_dim": self.reducer.dim,
+            "model": self.model,
+        }
+        np.save(path / "codes.npy", self.codes)
+        if self.scales is not None:
+            np.save(path / "scales.npy", self.scales)
+        if self.full is not None:
+            # Copy first: self.full may be a memmap of the file being rewritten.
+            np.save(path / "full.npy", np.array(self.full, dtype=np.float32))
+        elif (path / "full.npy").exists():
+            (path / "full.npy").unlink()
+        if self.reducer.components is not None:
+            np.savez(path / "pca.npz", mean=self.reducer.mean, components=self.reducer.components)
+        with open(path / "chunks.jsonl", "w", encoding="utf-8") as f:
+            for id_, text, md in zip(self.ids, self.texts, self.metadatas):
+                f.write(json.dumps({"id": id_, "text": text, "metadata": md}) + "\n")
+        (path / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    @staticmethod
+    def load_reducer(directory: str | os.PathLike) -> DimReducer:
+        """The reducer of a saved index, without loading its vectors."""
+        path = Path(directory)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        reducer = DimReducer(meta.get("reduced_dim"), meta.get("reduction", "prefix"))
+        if (path / "pca.npz").exists():
+            pca = np.load(path / "pca.npz")
+            reducer.mean, reducer.components = pca["mean"], pca["components"]
+        return reducer
+
+    @classmethod
+    def load(cls, directory: str | os.PathLike) -> "QuantizedIndex":
+        path = Path(directory)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        reducer = cls.load_reducer(path)
+        scales = np.load(path / "scales.npy") if (path / "scales.npy").exists() else None
+        # Full-precision vectors are only touched for the rescored rows.
+        full = np.load(path / "full.npy", mmap_mode="r") if (path / "full.npy").exists() else None
+        ids, texts, metadatas = [], [], []
+        with open(path / "chunks.jsonl", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                ids.append(rec["id"])
+                texts.append(rec["text"])
+                metadatas.append(rec.get("metadata") or {})
+        return cls(
+            codes=np.load(path / "codes.npy"),
+            scales=scales,
+            ids=ids,
+            texts=texts,
+            metadatas=metadatas,
+            mode=meta["mode"],
+            reducer=reducer,
+            full=full,
+            model=meta.get("model", ""),
+        )
+
+    @staticmethod
+    def exists(directory: str | os.PathLike) -> bool:
+        return (Path(directory) / "meta.json").is_file()
+
+    # -----------------------------
+    # Query
+    # -----------------------------
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes of vector data kept in memory (codes + scales)."""
+        return int(self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def rows_matching(self, where: Dict[str, Any]) -> np.ndarray:
+        """Row indices whose metadata satisfies a Chroma-style `where` clause."""
+        key = json.dumps(where, sort_keys=True, default=str)
+        rows = self._filter_rows.get(key)
+        if rows is None:
+            rows = np.array([i for i, md in enumerate(self.metadatas) if matches(md, where)], dtype=np.int64)
+            if len(self._filter_rows) >= _FILTER_CACHE_SIZE:
+                self._filter_rows.pop(next(iter(self._filter_rows)))
+            self._filter_rows[key] = rows
+        return rows
+
+    def approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate cosine scores for all rows, or only for `rows`."""
+        q = self.reducer.transform(_normalize(np.asarray(query, dtype=np.float32)))
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _SCORE_BLOCK):
+            block = codes[start : start + _SCORE_BLOCK].astype(np.float32, copy=False)
+            scores[start : start + len(block)] = block @ q
+        if self.scales is not None:
+            # (codes @ q) * scale == dequantized @ q without materializing floats
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 4,
+        rescore_k: Optional[int] = None,
+        with_embeddings: bool = False,
+        where: Optional[Dict[str, Any]] = None,
+        **_: Any,
+    ) -> List[ScoredChunk]:
+        rows = self.rows_matching(where) if where else None
+        n = len(self.ids) if rows is None else len(rows)
+        if n == 0 or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        scores = self.approximate_scores(query, rows)
+
+        pool = min(n, max(k, rescore_k or 0))
+        local = np.argpartition(-scores, pool - 1)[:pool] if pool < n else np.arange(n)
+        # Work with global row ids from here on
+        top = local if rows is None else rows[local]
+        if rows is not None:
+            full_scores = np.full(len(self.ids), -np.inf, dtype=np.float32)
+            full_scores[rows] = scores
+            scores = full_scores
+
+        if self.full is not None and rescore_k:
+            # Re-rank the candidate pool with exact cosine similarity.
+            rows = np.sort(top)
+            exact = np.asarray(self.full[rows], dtype=np.float32) @ _normalize(query)
+            order = np.argsort(-exact)[:k]
+            picked, picked_scores = rows[order], exact[order]
+        else:
+            order = np.argsort(-scores[top])[:k]
+            picked, picked_scores = top[order], scores[top][order]
+
+        results = []
+        for i, score in zip(picked.tolist(), picked_scores.tolist()):
+            embedding = None
+            if with_embeddings:
+                embedding = (
+                    np.asarray(self.full[i], dtype=np.float32)
+                    if self.full is not None
+                    else dequantize(self.codes[i : i + 1], None if self.scales is None else self.scales[i : i + 1])[0]
+                )
+            doc = Document(page_content=self.texts[i], metadata=dict(self.metadatas[i]), id=self.ids[i])
+            results.append(ScoredChunk(document=doc, score=float(score), embedding=embedding))
+        return results
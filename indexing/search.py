@@ -0,0 +1,191 @@
+"""
+Shared search primitives for the runtime retriever.
+
+A "searcher" is anything with
+    search(query_embedding, k, with_embeddings=False, **kwargs) -> List[ScoredChunk]
+(ChromaSearcher, QuantizedIndex). VectorRetriever puts an embedding model in
+front of a searcher, runs optional post-processing stages over a larger
+candidate pool (e.g. MMRStage) and exposes the `.invoke(question)` interface
+the graph expects.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+
+@dataclass
+class ScoredChunk:
+    """A search hit: the chunk, its similarity (higher is better) and, optionally, its vector."""
+    document: Document
+    score: float
+    embedding: Optional[Any] = None
+
+
+def hnsw_configuration(
+    space: Optional[str] = None,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Chroma collection configuration for the given HNSW parameters (unset ones
+    keep Chroma's defaults), or None when nothing is set. Only applied when a
+    collection is created; ef_search can be changed later (ingestion.py
+    --hnsw-ef-search).
+    """
+    hnsw = {
+        key: value
+        for key, value in (
+            ("space", space),
+            ("max_neighbors", m),
+            ("ef_construction", ef_construction),
+            ("ef_search", ef_search),
+        )
+        if value is not None
+    }
+    return {"hnsw": hnsw} if hnsw else None
+
+
+def _distance_to_similarity(distance: float, space: str) -> float:
+    # Chroma returns distances; convert so that higher is better.
+    # For unit vectors l2 distance d (squared) relates to cosine by d = 2 - 2cos.
+    if space == "l2":
+        return 1.0 - distance / 2.0
+    return 1.0 - distance  # "cosine" and "ip" distances are 1 - similarity
+
+
+class ChromaSearcher:
+    """
+    Searcher over a langchain_chroma.Chroma store (queries the raw collection).
+    Read-only: the HNSW parameters, search ef included, are those stored
+    with the collection.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        config = getattr(store._collection, "configuration_json", None) or {}
+        hnsw = config.get("hnsw") or {}
+        self.space = hnsw.get("space") or "l2"
+
+    def __len__(self) -> int:
+        return self.store._collection.count()
+
+    def close(self) -> None:
+        # Drops this client's reference to the shared Chroma system (older chromadb has no close())
+        close = getattr(self.store._client, "close", None)
+        if close is not None:
+            close()
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 4,
+        with_embeddings: bool = False,
+        where: Optional[Dict[str, Any]] = None,
+        **_: Any,
+    ) -> List[ScoredChunk]:
+        include = ["documents", "metadatas", "distances"]
+        if with_embeddings:
+            include.append("embeddings")
+        result = self.store._collection.query(
+            query_embeddings=[list(map(float, query))],
+            n_results=k,
+            where=where or None,
+            include=include,
+        )
+        ids = result["ids"][0]
+        embeddings = result["embeddings"][0] if with_embeddings else [None] * len(ids)
+        return [
+            ScoredChunk(
+                document=Document(page_content=text or "", metadata=metadata or {}, id=id_),
+                score=_distance_to_similarity(distance, self.space),
+                embedding=embedding,
+            )
+            for id_, text, metadata, distance, embedding in zip(
+                ids,
+                result["documents"][0],
+                result["metadatas"][0],
+                result["distances"][0],
+                embeddings,
+            )
+        ]
+
+
+class VectorRetriever:
+    """
+    Embed the question, search the index, return the top-k Documents.
+
+    With post-processing stages, `fetch_k` candidates are retrieved first and
+    each stage narrows them down (stage(hits, k) -> (hits, info)).
+
+    Duck-types the LangChain retriever `.invoke(question)` method.
+    `retrieve()` additionally returns an info dict (timings, hit count,
+    stage stats) that the retrieve node puts into the trace.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        searcher,
+        k: int = 4,
+        fetch_k: Optional[int] = None,
+        stages: Optional[List[Callable]] = None,
+        search_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.embeddings = embeddings
+        self.searcher = searcher
+        self.k = k
+        self.fetch_k = fetch_k
+        self.stages = list(stages or [])
+        self.search_kwargs = dict(search_kwargs or {})
+
+    def close(self) -> None:
+        close = getattr(self.searcher, "close", None)
+        if close is not None:
+            close()
+
+    def retrieve(self, question: str, where: Optional[Dict[str, Any]] = None) -> Tuple[List[Document], Dict[str, Any]]:
+        """Top-k documents for `question`, optionally restricted by a metadata `where` clause."""
+        start = perf_counter()
+        if hasattr(self.embeddings, "embed_query_with_info"):
+            # CachedQueryEmbeddings reports hit/miss and the latency it saved
+            query_embedding, embed_info = self.embeddings.embed_query_with_info(question)
+        else:
+            query_embedding, embed_info = self.embeddings.embed_query(question), {}
+        embedded = perf_counter()
+
+        pool = max(self.k, self.fetch_k or 0) if self.stages else self.k
+        hits = self.searcher.search(
+            query_embedding,
+            k=pool,
+            with_embeddings=any(getattr(s, "needs_embeddings", False) for s in self.stages),
+            **({"where": where} if where else {}),
+            **self.search_kwargs,
+        )
+        searched = perf_counter()
+
+        info: Dict[str, Any] = {}
+        for stage in self.stages:
+            hits, stage_info = stage(hits, self.k)
+            info.update(stage_info)
+        hits = hits[: self.k]
+        done = perf_counter()
+
+        info = {
+            "k": len(hits),
+            "embed_ms": round((embedded - start) * 1000, 2),
+            **embed_info,
+            "search_ms": round((searched - embedded) * 1000, 2),
+            **({"top_score": round(hits[0].score, 4)} if hits else {}),
+            **({"rerank_ms": round((done - searched) * 1000, 2)} if self.stages else {}),
+            **info,
+        }
+        return [hit.document for hit in hits], info
+
+    def invoke(self, question: str, *args: Any, **kwargs: Any) -> List[Document]:
+        return self.retrieve(question)[0]
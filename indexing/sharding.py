@@ -0,0 +1,85 @@
+"""
+Hash-partitioned collections.
+
+Ingestion assigns every chunk to one of N shards by hashing its `source`,
+so all chunks of one document land in the same shard and re-ingesting a
+file always touches the same collection. Shards are written concurrently
+(embedding calls are the bottleneck and run in parallel per shard).
+
+ShardedSearcher queries every shard on a thread pool and merges the
+per-shard top-k lists with a heap. Vector math in numpy / Chroma releases
+the GIL, so shards are searched truly in parallel.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from indexing.search import ScoredChunk
+
+
+def shard_for(source: str, num_shards: int) -> int:
+    """Stable shard number for a source (independent of PYTHONHASHSEED)."""
+    if num_shards <= 1:
+        return 0
+    digest = hashlib.blake2b(source.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+def shard_name(base: str, shard: int, num_shards: int) -> str:
+    """Collection / directory name of one shard; a single shard keeps the base name."""
+    if num_shards <= 1:
+        return base
+    return f"{base}-shard{shard}of{num_shards}"
+
+
+def _source(doc: Any) -> str:
+    return doc.metadata.get("source", "")
+
+
+def partition(items: Sequence[Any], num_shards: int, key: Callable[[Any], str] = _source) -> List[List[Any]]:
+    """Split items (Documents by default) into `num_shards` lists by hashing their source."""
+    shards: List[List[Any]] = [[] for _ in range(max(num_shards, 1))]
+    for item in items:
+        shards[shard_for(str(key(item)), num_shards)].append(item)
+    return shards
+
+
+def merge_top_k(results: Sequence[List[ScoredChunk]], k: int) -> List[ScoredChunk]:
+    """Best `k` hits across per-shard result lists (bounded heap, O(n log k))."""
+    return heapq.nlargest(k, chain.from_iterable(results), key=lambda h: h.score)
+
+
+class ShardedSearcher:
+    """Searcher that fans a query out to several searchers and merges the hits."""
+
+    def __init__(self, searchers: Sequence[Any], max_workers: Optional[int] = None):
+        self.searchers = list(searchers)
+        self._pool = (
+            ThreadPoolExecutor(max_workers or len(self.searchers), thread_name_prefix="shard")
+            if len(self.searchers) > 1
+            else None
+        )
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self.searchers)
+
+    def search(self, query: Sequence[float], k: int = 4, **kwargs: Any) -> List[ScoredChunk]:
+        if self._pool is None:
+            return self.searchers[0].search(query, k=k, **kwargs)
+        futures = [self._pool.submit(s.search, query, k=k, **kwargs) for s in self.searchers]
+        return merge_top_k([f.result() for f in futures], k)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        for searcher in self.searchers:
+            if hasattr(searcher, "close"):
+                searcher.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"shards": len(self.searchers), "chunks": [len(s) for s in self.searchers]}
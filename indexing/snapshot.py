@@ -0,0 +1,212 @@
+"""
+Portable single-file index snapshots.
+
+A snapshot holds everything needed to rebuild an index without calling
+the embedding API: ids, chunk text, metadata and vectors, stored column
+by column so the vector block can be memory-mapped straight into numpy.
+
+File layout (all integers little-endian):
+    b"RAGSNAP1"          magic
+    uint64               header length
+    header               JSON: version, model, count, dim, dtype, section
+                         offsets (relative to the data start) and checksum
+    padding              to a 64-byte boundary (data start)
+    vectors              (count, dim) float32 or float16, row-major
+    <column>_offsets     (count + 1,) int64 byte offsets, for each of
+    <column>             ids, texts, metadata (JSON per row), utf-8
+    filter_values        JSON {key: [distinct values]} for the metadata keys
+                         filters test (indexing.metadata.WHERE_KEYS)
+    filter_codes         (keys, count) int32: 0 where a row lacks the key,
+                         else 1 + the index of its value
+
+The filter sections let readers evaluate a `where` clause without decoding
+any row's metadata; snapshots written before they existed lack them.
+
+The checksum is the sha256 of every byte after the header, so a truncated
+or corrupted copy is rejected before anything is loaded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from indexing.metadata import WHERE_KEYS
+
+MAGIC = b"RAGSNAP1"
+VERSION = 1
+SNAPSHOT_DTYPES = ("float32", "float16")
+_ALIGN = 64
+_HASH_BLOCK = 16 * 1024 * 1024
+_STRING_COLUMNS = ("ids", "texts", "metadata")
+
+
+def _pad(n: int) -> int:
+    return -n % _ALIGN
+
+
+def _encode_column(values: Sequence[str]):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def _encode_filter_columns(metadatas: Sequence[Dict[str, Any]]):
+    values: Dict[str, list] = {}
+    codes = np.zeros((len(WHERE_KEYS), len(metadatas)), dtype=np.int32)
+    for k, key in enumerate(WHERE_KEYS):
+        index: Dict[Any, int] = {}
+        for row, metadata in enumerate(metadatas):
+            value = (metadata or {}).get(key)
+            if value is not None:
+                codes[k, row] = index.setdefault(value, len(index) + 1)
+        values[key] = list(index)
+    return json.dumps(values, separators=(",", ":")).encode("utf-8"), codes.tobytes()
+
+
+def write_snapshot(
+    path: str | os.PathLike,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    vectors: Any,
+    model: str,
+    dtype: str = "float32",
+) -> Dict[str, Any]:
+    """Write a snapshot file (atomically, via a temporary file) and return its header."""
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"Unknown snapshot dtype {dtype!r}; expected one of {SNAPSHOT_DTYPES}")
+    vectors = np.ascontiguousarray(vectors, dtype=dtype)
+    count = len(ids)
+    if not (len(texts) == len(metadatas) == count == len(vectors)):
+        raise ValueError("ids, texts, metadatas and vectors must have the same length")
+
+    blocks = [("vectors", vectors.tobytes())]
+    columns = {
+        "ids": list(ids),
+        "texts": list(texts),
+        "metadata": [json.dumps(m or {}, separators=(",", ":")) for m in metadatas],
+    }
+    for name in _STRING_COLUMNS:
+        offsets, data = _encode_column(columns[name])
+        blocks += [(f"{name}_offsets", offsets), (name, data)]
+    filter_values, filter_codes = _encode_filter_columns(metadatas)
+    blocks += [("filter_values", filter_values), ("filter_codes", filter_codes)]
+
+    sections, digest, position = {}, hashlib.sha256(), 0
+    for name, data in blocks:
+        sections[name] = [position, len(data)]
+        position += len(data) + _pad(len(data))
+        digest.update(data + b"\0" * _pad(len(data)))
+
+    header = {
+        "version": VERSION,
+        "model": model,
+        "count": count,
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "dtype": dtype,
+        "sections": sections,
+        "checksum": "sha256:" + digest.hexdigest(),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * _pad(len(MAGIC) + 8 + len(header_bytes))
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        for _, data in blocks:
+            f.write(data + b"\0" * _pad(len(data)))
+    os.replace(tmp, path)
+    return header
+
+
+class Snapshot:
+    """Read-only view of a snapshot file; the vector block is memory-mapped."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not an index snapshot")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(header_len))
+        if self.header.get("version") != VERSION:
+            raise ValueError(f"Unsupported snapshot version {self.header.get('version')}")
+        self._data_start = len(MAGIC) + 8 + header_len
+        self._raw = np.memmap(self.path, dtype=np.uint8, mode="r")
+
+    @property
+    def model(self) -> str:
+        return self.header["model"]
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    def _section(self, name: str) -> np.ndarray:
+        offset, size = self.header["sections"][name]
+        start = self._data_start + offset
+        return self._raw[start : start + size]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """(count, dim) vectors backed by the file (no copy)."""
+        return self._section("vectors").view(self.header["dtype"]).reshape(len(self), self.header["dim"])
+
+    def _strings(self, name: str) -> List[str]:
+        offsets = self._section(f"{name}_offsets").view(np.int64)
+        blob = self._section(name).tobytes()
+        return [blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    def _string_at(self, name: str, row: int) -> str:
+        start, end = self._section(f"{name}_offsets").view(np.int64)[row : row + 2].tolist()
+        return self._section(name)[start:end].tobytes().decode("utf-8")
+
+    def row(self, i: int) -> Tuple[str, str, Dict[str, Any]]:
+        """(id, text, metadata) of one row, decoded from the file without loading the columns."""
+        return self._string_at("ids", i), self._string_at("texts", i), json.loads(self._string_at("metadata", i))
+
+    @property
+    def filter_columns(self) -> Optional[Dict[str, Tuple[list, np.ndarray]]]:
+        """{key: (distinct values, per-row codes backed by the file)}, or None for older snapshots."""
+        if "filter_codes" not in self.header["sections"]:
+            return None
+        values = json.loads(self._section("filter_values").tobytes())
+        codes = self._section("filter_codes").view(np.int32).reshape(len(values), len(self))
+        return {key: (values[key], codes[k]) for k, key in enumerate(values)}
+
+    @property
+    def ids(self) -> List[str]:
+        return self._strings("ids")
+
+    @property
+    def texts(self) -> List[str]:
+        return self._strings("texts")
+
+    @property
+    def metadatas(self) -> List[Dict[str, Any]]:
+        return [json.loads(m) for m in self._strings("metadata")]
+
+    def batches(self, size: int) -> Iterator[tuple]:
+        """(ids, texts, metadatas, vectors) slices of at most `size` rows."""
+        ids, texts, metadatas = self.ids, self.texts, self.metadatas
+        for start in range(0, len(self), size):
+            end = start + size
+            yield ids[start:end], texts[start:end], metadatas[start:end], self.vectors[start:end]
+
+    def verify(self) -> None:
+        """Raise ValueError unless the data matches the header checksum."""
+        digest = hashlib.sha256()
+        data = self._raw[self._data_start :]
+        for start in range(0, len(data), _HASH_BLOCK):
+            digest.update(data[start : start + _HASH_BLOCK])
+        expected = self.header["checksum"]
+        if "sha256:" + digest.hexdigest() != expected:
+            raise ValueError(f"Snapshot checksum mismatch for {self.path} (expected {expected})")
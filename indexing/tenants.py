@@ -0,0 +1,184 @@
+"""
+Per-tenant runtime retrievers, opened lazily and kept in an LRU.
+
+Each tenant's index lives in its own directory (see ingestion.py). A
+TenantPool opens a tenant's retriever on first use and keeps it open for
+the next requests. Memory is bounded: every open entry has an estimated
+resident size (by default the on-disk size of its index, since HNSW
+segments and quantized arrays are loaded whole). When the total exceeds
+`max_bytes`, or more than `max_open` tenants are open, the least recently
+used ones are closed. The most recently used tenant is always kept, even
+when it alone is over the budget.
+
+Requests borrow a retriever with `lease()`. An entry evicted while still
+leased is closed when its last lease ends, so a query never sees its store
+closed underneath it.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Generic, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Tenant IDs become directory names, so keep them to a portable alphabet
+_TENANT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,62}")
+
+
+def validate_tenant(tenant: Any) -> str:
+    """Return `tenant` if it is a valid tenant ID, else raise ValueError."""
+    if not isinstance(tenant, str) or not _TENANT_ID.fullmatch(tenant) or ".." in tenant:
+        raise ValueError(
+            f"Invalid tenant ID {tenant!r}; use 1-63 letters, digits, '_', '-' or '.', starting with a letter or digit"
+        )
+    return tenant
+
+
+def directory_bytes(path: str | os.PathLike) -> int:
+    """Total size of the files under `path` (0 if it does not exist)."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # removed by a concurrent swap
+    return total
+
+
+@dataclass
+class _Entry(Generic[T]):
+    value: T
+    size: int
+    leases: int = 0
+    evicted: bool = False
+
+
+class TenantPool(Generic[T]):
+    """LRU of open per-tenant values with a memory budget; see the module docstring."""
+
+    def __init__(
+        self,
+        open_fn: Callable[[str], T],
+        size_fn: Callable[[str, T], int],
+        close_fn: Optional[Callable[[T], None]] = None,
+        max_bytes: int = 1 << 30,
+        max_open: int = 32,
+    ):
+        self.open_fn = open_fn
+        self.size_fn = size_fn
+        self.close_fn = close_fn
+        self.max_bytes = max_bytes
+        self.max_open = max_open
+        self.hits = self.misses = self.evictions = 0
+        self._entries: "OrderedDict[str, _Entry[T]]" = OrderedDict()
+        self._opening: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(e.size for e in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, tenant: str) -> bool:
+        return tenant in self._entries
+
+    def _acquire(self, tenant: str) -> Optional[_Entry[T]]:
+        with self._lock:
+            entry = self._entries.get(tenant)
+            if entry is not None:
+                self._entries.move_to_end(tenant)
+                entry.leases += 1
+                self.hits += 1
+            return entry
+
+    def _open(self, tenant: str) -> _Entry[T]:
+        # One opener per tenant; concurrent first requests wait for it
+        with self._lock:
+            opening = self._opening.setdefault(tenant, threading.Lock())
+        with opening:
+            entry = self._acquire(tenant)
+            if entry is not None:
+                return entry
+            try:
+                value = self.open_fn(tenant)
+                entry = _Entry(value, max(0, int(self.size_fn(tenant, value))), leases=1)
+            except BaseException:
+                with self._lock:
+                    self._opening.pop(tenant, None)
+                raise
+            with self._lock:
+                self.misses += 1
+                self._entries[tenant] = entry
+                self._opening.pop(tenant, None)
+                victims = self._evict_locked()
+            self._close(victims)
+            return entry
+
+    def _evict_locked(self) -> list:
+        victims = []
+        total = sum(e.size for e in self._entries.values())
+        while len(self._entries) > 1 and (total > self.max_bytes or len(self._entries) > self.max_open):
+            _, entry = self._entries.popitem(last=False)
+            total -= entry.size
+            entry.evicted = True
+            self.evictions += 1
+            if entry.leases == 0:
+                victims.append(entry)
+        return victims
+
+    def _close(self, entries: list) -> None:
+        if self.close_fn is not None:
+            for entry in entries:
+                self.close_fn(entry.value)
+
+    def _release(self, entry: _Entry[T]) -> None:
+        with self._lock:
+            entry.leases -= 1
+            closing = entry.evicted and entry.leases == 0
+        if closing:
+            self._close([entry])
+
+    @contextmanager
+    def lease(self, tenant: str) -> Iterator[T]:
+        """The tenant's open value (opened now if needed), kept open until the block ends."""
+        entry = self._acquire(tenant) or self._open(tenant)
+        try:
+            yield entry.value
+        finally:
+            self._release(entry)
+
+    def invalidate(self, tenant: Optional[str] = None) -> None:
+        """Close one tenant (e.g. after re-ingestion), or all of them; reopened on next use."""
+        with self._lock:
+            tenants = [tenant] if tenant is not None else list(self._entries)
+            victims = []
+            for name in tenants:
+                entry = self._entries.pop(name, None)
+                if entry is not None:
+                    entry.evicted = True
+                    if entry.leases == 0:
+                        victims.append(entry)
+        self._close(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": len(self._entries),
+                "max_open": self.max_open,
+                "resident_bytes": sum(e.size for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "tenants": {name: e.size for name, e in reversed(self._entries.items())},
+            }
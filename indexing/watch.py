@@ -0,0 +1,266 @@
+"""
+Watch local paths and report batches of changed files.
+
+watch_files() keeps a snapshot of the watched files, i.e. (mtime, size)
+from one stat() per file. Whenever the snapshot may have changed, it
+rescans and diffs. A burst of changes (an editor saving several files, a
+git checkout) is debounced: the batch is handed to `apply` once nothing
+has changed for `debounce_s`, or at the latest `max_delay_s` after the
+first change. Once the watcher has seen a file's content, a change that
+leaves its sha256 as it was (touched, saved without edits) is not reported.
+
+What triggers a rescan:
+
+    InotifyWatcher  Linux inotify (via libc, no extra dependency) on every
+                    directory under the watched roots; idle costs nothing
+    PollingWatcher  a rescan every `poll_interval_s`; used where inotify is
+                    unavailable or out of watches (fs.inotify.max_user_watches)
+
+inotify events only wake the scanner; the diff itself always comes from the
+snapshot, so overflowed or coalesced events lose nothing.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import glob
+import os
+import select
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from indexing.parse_cache import file_sha256
+
+FileStates = Dict[str, Tuple[int, int]]  # path -> (mtime_ns, size)
+
+
+@dataclass
+class FileChanges:
+    """One batch: files to (re)index and files whose chunks are to be removed."""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.deleted)
+
+    @property
+    def changed(self) -> List[str]:
+        return self.added + self.modified
+
+
+def scan(files: Iterable[str]) -> FileStates:
+    snapshot: FileStates = {}
+    for path in files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue  # removed since it was listed
+        snapshot[str(path)] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+def diff(old: FileStates, new: FileStates) -> FileChanges:
+    return FileChanges(
+        added=sorted(p for p in new if p not in old),
+        modified=sorted(p for p in new if p in old and new[p] != old[p]),
+        deleted=sorted(p for p in old if p not in new),
+    )
+
+
+def static_prefix(pattern: str) -> str:
+    """The part of a path glob before its first wildcard ("docs/**/*.md" -> "docs")."""
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    if parts == [""]:
+        return os.sep
+    return os.sep.join(parts) or "."
+
+
+def watch_roots(patterns: Iterable[str]) -> List[str]:
+    """Existing directories that can contain matches of the path globs."""
+    roots = set()
+    for pattern in patterns:
+        root = static_prefix(pattern)
+        if os.path.isfile(root):
+            root = os.path.dirname(root) or "."
+        if os.path.isdir(root):
+            roots.add(os.path.abspath(root))
+    return sorted(roots)
+
+
+class PollingWatcher:
+    """Asks for a rescan every `interval_s`."""
+
+    def __init__(self, interval_s: float = 2.0):
+        self.interval_s = interval_s
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        time.sleep(self.interval_s if timeout is None else min(timeout, self.interval_s))
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+# <sys/inotify.h>
+_IN_MODIFY, _IN_ATTRIB, _IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+_IN_MOVED_FROM, _IN_MOVED_TO, _IN_CREATE, _IN_DELETE = 0x40, 0x80, 0x100, 0x200
+_IN_DELETE_SELF, _IN_MOVE_SELF, _IN_ISDIR = 0x400, 0x800, 0x40000000
+_IN_NONBLOCK, _IN_CLOEXEC = os.O_NONBLOCK, getattr(os, "O_CLOEXEC", 0o2000000)
+_MASK = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+    | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+)
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (then len bytes of name)
+
+
+class InotifyWatcher:
+    """Wakes up on inotify events anywhere under `roots`; raises OSError where unavailable."""
+
+    def __init__(self, roots: Iterable[str]):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, str] = {}
+        try:
+            for root in roots:
+                self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch({directory}): {os.strerror(errno)}")
+        self._dirs[wd] = directory
+
+    def _add_tree(self, root: str) -> None:
+        self._add(root)
+        for directory, subdirs, _ in os.walk(root):
+            for name in subdirs:
+                self._add(os.path.join(directory, name))
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return True
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, size = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size : offset + _EVENT.size + size].rstrip(b"\0")
+                offset += _EVENT.size + size
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and wd in self._dirs:
+                    # Files may land in the new directory before the watch exists;
+                    # the rescan this event triggers finds them anyway
+                    try:
+                        self._add_tree(os.path.join(self._dirs[wd], os.fsdecode(name)))
+                    except OSError:
+                        pass  # already gone again
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(patterns: Iterable[str], poll_interval_s: float = 2.0, inotify: bool = True):
+    """An InotifyWatcher on the roots of `patterns`, or a PollingWatcher if that fails."""
+    roots = watch_roots(patterns)
+    if inotify and roots:
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify unavailable ({e}); polling every {poll_interval_s:g} s")
+    return PollingWatcher(poll_interval_s)
+
+
+def watch_files(
+    list_files: Callable[[], Iterable[str]],
+    apply: Callable[[FileChanges], None],
+    watcher,
+    initial: Optional[FileStates] = None,
+    debounce_s: float = 1.0,
+    max_delay_s: float = 10.0,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Call `apply` with each debounced batch of changes until `stop` is set.
+
+    `initial` is the snapshot `apply` already reflects (default: the files
+    as they are now, i.e. only later changes are reported); a difference to
+    the files on disk is applied right away. If `apply` raises, the batch
+    is kept and retried `max_delay_s` later, together with any newer changes.
+    """
+    stop = stop or threading.Event()
+    current = scan(list_files())
+    applied = dict(current if initial is None else initial)
+    hashes: Dict[str, str] = {}
+    # Monotonic time of the first / latest change not applied yet
+    first = last = None if current == applied else time.monotonic() - debounce_s
+    try:
+        while not stop.is_set():
+            now = time.monotonic()
+            if first is None:
+                timeout = 1.0  # only to notice `stop`
+            else:
+                timeout = max(0.0, min(last + debounce_s, first + max_delay_s) - now)
+            if watcher.wait(timeout):
+                latest = scan(list_files())
+                if latest != current:
+                    current = latest
+                    last = time.monotonic()
+                    first = first or last
+            if first is None or stop.is_set():
+                continue
+            now = time.monotonic()
+            if now - last < debounce_s and now - first < max_delay_s:
+                continue
+
+            changes = diff(applied, current)
+            changes.modified = [p for p in changes.modified if not _same_content(p, hashes)]
+            for path in changes.added:
+                _same_content(path, hashes)
+            for path in changes.deleted:
+                hashes.pop(path, None)
+            if changes:
+                try:
+                    apply(changes)
+                except Exception as e:
+                    print(f"❌ Applying {len(changes.changed)} changed / {len(changes.deleted)} deleted file(s) failed: {e!r}")
+                    for path in changes.changed:
+                        hashes.pop(path, None)  # so the retry is not skipped as unchanged
+                    # Due again in max_delay_s
+                    first = last = time.monotonic() + max_delay_s - debounce_s
+                    continue
+            applied, first, last = dict(current), None, None
+    finally:
+        watcher.close()
+
+
+def _same_content(path: str, hashes: Dict[str, str]) -> bool:
+    """Whether `path` has the content it had when last seen (and remember its hash)."""
+    try:
+        digest = file_sha256(path)
+    except OSError:
+        return False
+    same = hashes.get(path) == digest
+    hashes[path] = digest
+    return same
@@ -10,7 +10,39 @@ Examples
 2) Only add URLs to existing index:
    python ingestion.py --urls https://example.com/faq
 
-3) Only (re)load retriever at runtime (imported by app):
+3) Compact storage: int8 vectors truncated to 512 dims (queries read the
+   active index the way it was built; nothing to set when querying):
+   python ingestion.py --paths docs --storage int8 --dim 512 --rebuild
+
+4) Tag a product manual so questions can be scoped to it
+   (cli.py --tag acme-manual):
+   python ingestion.py --paths manuals/acme --tag acme-manual
+
+5) Spread a large corpus over 4 shards:
+   python ingestion.py --paths docs --shards 4 --rebuild
+
+6) Continue a run that crashed or was interrupted (committed batches are kept):
+   python ingestion.py --resume
+
+7) Ship a built index to another machine without re-embedding:
+   python ingestion.py --export-snapshot index.snap
+   python ingestion.py --import-snapshot index.snap --rebuild
+
+8) Find out where ingestion time and memory go:
+   python ingestion.py --paths docs --profile --profile-json profile.json
+
+9) Report on an index that grew by appending, then drop stale chunks and compact it:
+   python ingestion.py --stats
+   python ingestion.py --compact
+
+10) Give a team its own index (queries select it with GraphState "tenant"):
+   python ingestion.py --tenant acme --paths acme-docs --rebuild
+
+11) Keep the index in sync with a folder: changed files are re-indexed,
+   deleted ones removed, as they happen (Ctrl-C to stop):
+   python ingestion.py --paths docs --watch
+
+12) Only (re)load retriever at runtime (imported by app):
    from ingestion import retriever
 """
 
@@ -18,10 +50,19 @@ from __future__ import annotations
 import argparse
 import glob
 import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, List
 
+import numpy as np
 from dotenv import load_dotenv
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import (
     WebBaseLoader,
@@ -31,6 +72,51 @@ from langchain_community.document_loaders import (
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
 
+from indexing import (
+    SNAPSHOT_DTYPES,
+    STORAGE_MODES,
+    AdaptiveKStage,
+    CachedQueryEmbeddings,
+    ChromaSearcher,
+    FileChanges,
+    MMRStage,
+    MappedIndex,
+    QuantizedIndex,
+    IngestJob,
+    ShardedSearcher,
+    Snapshot,
+    ParsedDocumentCache,
+    PdfExtractor,
+    StageProfiler,
+    TenantPool,
+    VectorRetriever,
+    build_where,
+    dequantize,
+    directory_bytes,
+    file_sha256,
+    fit_reducer,
+    format_report,
+    hnsw_configuration,
+    index_stats,
+    make_watcher,
+    normalize_metadata,
+    normalize_source,
+    pdf_loader_version,
+    plan_cleanup,
+    query_latency,
+    partition,
+    read_active,
+    scan_files,
+    shard_for,
+    shard_name,
+    static_prefix,
+    validate_tenant,
+    watch_files,
+    write_active,
+    write_snapshot,
+)
+from rate_limit import CLIENT_MAX_RETRIES, RateLimitedEmbeddings
+
 load_dotenv()
 
 # --------------------------------------------------
@@ -51,37 +137,156 @@ if not OPENAI_AVAILABLE:
 # -----------------------------
 PERSIST_DIR = os.environ.get("RAGBOT_CHROMA_DIR", "./.chroma")
 COLLECTION_NAME = os.environ.get("RAGBOT_COLLECTION", "ragbot-chroma")
+EMBEDDING_MODEL = os.environ.get("RAGBOT_EMBEDDING_MODEL", "text-embedding-ada-002")
+TOP_K = int(os.environ.get("RAGBOT_TOP_K", "4"))
+
+# Vector storage mode. "float32" keeps the Chroma collection; "float16" and
+# "int8" store a compact QuantizedIndex under PERSIST_DIR/quantized instead.
+VECTOR_STORAGE = os.environ.get("RAGBOT_VECTOR_STORAGE", "float32")
+VECTOR_DIM = int(os.environ["RAGBOT_VECTOR_DIM"]) if os.environ.get("RAGBOT_VECTOR_DIM") else None
+VECTOR_REDUCTION = os.environ.get("RAGBOT_VECTOR_REDUCTION", "prefix")
+# Candidates re-ranked with full-precision vectors; 0 disables rescoring
+# and skips writing the full-precision copy.
+RESCORE_K = int(os.environ.get("RAGBOT_RESCORE_K", "20"))
+QUANTIZED_DIR = os.path.join(PERSIST_DIR, "quantized", COLLECTION_NAME)
+
+# HNSW parameters of new Chroma collections: distance metric ("l2",
+# "cosine", "ip"), M (graph degree) and construction ef. Unset values keep
+# Chroma's defaults (l2, 16, 100). They are fixed when a collection is
+# created, so existing indexes need --rebuild to change them. Search ef is
+# also stored with new collections; change it on an existing index with
+# --hnsw-ef-search (retrievers never write it). See benchmarks/bench_hnsw.py
+# for the recall / latency trade-off.
+HNSW_SPACE = os.environ.get("RAGBOT_HNSW_SPACE") or None
+HNSW_M = int(os.environ["RAGBOT_HNSW_M"]) if os.environ.get("RAGBOT_HNSW_M") else None
+HNSW_EF_CONSTRUCTION = int(os.environ["RAGBOT_HNSW_EF_CONSTRUCTION"]) if os.environ.get("RAGBOT_HNSW_EF_CONSTRUCTION") else None
+HNSW_EF_SEARCH = int(os.environ["RAGBOT_HNSW_EF_SEARCH"]) if os.environ.get("RAGBOT_HNSW_EF_SEARCH") else None
+
+# Number of hash-partitioned shards (by source). Shards are written and
+# searched in parallel. After a build, queries use the shard count and
+# storage mode recorded in PERSIST_DIR/active.json.
+SHARDS = int(os.environ.get("RAGBOT_SHARDS", "1"))
+
+# Ingestion commits every INGEST_BATCH chunks; an interrupted run is
+# continued with --resume from the last committed batch.
+INGEST_BATCH = int(os.environ.get("RAGBOT_INGEST_BATCH", "256"))
+JOB_DIR = os.path.join(PERSIST_DIR, "ingest-job")
+
+# MMR diversification: fetch FETCH_K candidates, keep a diverse TOP_K.
+# Candidates nearly identical to an already chosen chunk (cosine >= MMR_DEDUP)
+# are dropped, so fewer chunks may reach grading.
+MMR_ENABLED = os.environ.get("RAGBOT_MMR", "0").lower() in ("1", "true", "yes")
+MMR_LAMBDA = float(os.environ.get("RAGBOT_MMR_LAMBDA", "0.5"))
+MMR_DEDUP = float(os.environ.get("RAGBOT_MMR_DEDUP", "0.97"))
+FETCH_K = int(os.environ.get("RAGBOT_FETCH_K", "20"))
+
+# Adaptive top-k: keep between MIN_K and MAX_K chunks, cutting the scored
+# candidates at a similarity drop >= SCORE_GAP or below SCORE_RATIO * top.
+ADAPTIVE_K = os.environ.get("RAGBOT_ADAPTIVE_K", "0").lower() in ("1", "true", "yes")
+MIN_K = int(os.environ.get("RAGBOT_MIN_K", "1"))
+MAX_K = int(os.environ.get("RAGBOT_MAX_K", "6"))
+SCORE_GAP = float(os.environ.get("RAGBOT_SCORE_GAP", "0.04"))
+SCORE_RATIO = float(os.environ.get("RAGBOT_SCORE_RATIO", "0.9"))
+
+# Query-embedding LRU cache (entries; 0 disables). Set a file path to keep
+# cached query vectors across restarts.
+EMBED_CACHE_SIZE = int(os.environ.get("RAGBOT_EMBED_CACHE_SIZE", "1024"))
+EMBED_CACHE_PATH = os.environ.get("RAGBOT_EMBED_CACHE_PATH") or None
+
+# Parsed-document cache: extracted PDF pages keyed by file content hash and
+# loader version, gzip-compressed, shared by all tenants. RAGBOT_PARSE_CACHE=0
+# disables it.
+PARSE_CACHE = os.environ.get("RAGBOT_PARSE_CACHE", "1") != "0"
+PARSE_CACHE_DIR = os.environ.get("RAGBOT_PARSE_CACHE_DIR") or os.path.join(PERSIST_DIR, "parse-cache")
+# PDFs with at least PDF_PARALLEL_PAGES pages are extracted page-parallel
+# by PDF_WORKERS processes (default: one per CPU; 1 disables).
+PDF_WORKERS = int(os.environ.get("RAGBOT_PDF_WORKERS", "0")) or os.cpu_count() or 1
+PDF_PARALLEL_PAGES = int(os.environ.get("RAGBOT_PDF_PARALLEL_PAGES", "16"))
+
+# Tenants: each has its own index under PERSIST_DIR/tenants/<tenant> (with
+# its own active.json and ingest job). Their retrievers are opened on first
+# query and kept in an LRU bounded by TENANT_CACHE_MB of estimated index
+# memory and TENANT_MAX_OPEN open tenants. Requests without a tenant use
+# the index in PERSIST_DIR itself.
+TENANT_CACHE_MB = float(os.environ.get("RAGBOT_TENANT_CACHE_MB", "1024"))
+TENANT_MAX_OPEN = int(os.environ.get("RAGBOT_TENANT_MAX_OPEN", "32"))
+
+# Watch mode (--watch): file changes are applied to the live collection in
+# batches, once none arrived for WATCH_DEBOUNCE_S (at the latest
+# WATCH_MAX_DELAY_S after the first). Changes are noticed with inotify where
+# available, else by a stat() poll every WATCH_POLL_S (RAGBOT_WATCH_INOTIFY=0
+# forces polling).
+WATCH_DEBOUNCE_S = float(os.environ.get("RAGBOT_WATCH_DEBOUNCE_S", "1.0"))
+WATCH_MAX_DELAY_S = float(os.environ.get("RAGBOT_WATCH_MAX_DELAY_S", "10"))
+WATCH_POLL_S = float(os.environ.get("RAGBOT_WATCH_POLL_S", "2.0"))
+WATCH_INOTIFY = os.environ.get("RAGBOT_WATCH_INOTIFY", "1") != "0"
+
+# Serving snapshot: when set, queries without a tenant read this snapshot
+# file (memory-mapped, see indexing.mapped) instead of opening the active
+# index. prefork.py exports one to SERVING_DIR and sets it for its workers.
+SERVING_SNAPSHOT = os.environ.get("RAGBOT_SERVING_SNAPSHOT") or None
+SERVING_DIR = os.environ.get("RAGBOT_SERVING_DIR") or os.path.join(PERSIST_DIR, "serving")
 
 # -----------------------------
 # Helpers
 # -----------------------------
 
-def _load_local_paths(paths: Iterable[str]) -> List:
-    documents = []
+def _embeddings() -> RateLimitedEmbeddings:
+    # Shares the process-wide limiter with the chains (see rate_limit.py)
+    return RateLimitedEmbeddings(
+        OpenAIEmbeddings(model=EMBEDDING_MODEL, max_retries=CLIENT_MAX_RETRIES), EMBEDDING_MODEL
+    )
+
+
+def _discover_local_paths(paths: Iterable[str]) -> List[Path]:
+    files = []
     for p in paths:
         for path_str in glob.glob(p, recursive=True):
             path = Path(path_str)
             if path.is_dir():
                 # load common file types in the directory
                 for ext in ("*.pdf", "*.md", "*.txt"):
-                    for f in path.rglob(ext):
-                        documents.extend(_load_single_file(f))
+                    files.extend(path.rglob(ext))
             elif path.is_file():
-                documents.extend(_load_single_file(path))
+                files.append(path)
+    return files
+
+
+def _load_local_paths(paths: Iterable[str]) -> List:
+    documents = []
+    for f in _discover_local_paths(paths):
+        documents.extend(_load_single_file(f))
     return documents
 
 
-def _load_single_file(path: Path) -> List:
+def _load_single_file(
+    path: Path, extractor: PdfExtractor | None = None, cache: ParsedDocumentCache | None = None
+) -> List:
     docs = []
     suffix = path.suffix.lower()
     if suffix == ".pdf":
-        docs.extend(PyPDFLoader(str(path)).load())
+        docs.extend(_load_pdf(path, extractor, cache))
     elif suffix in {".md", ".txt"}:
         docs.extend(TextLoader(str(path), encoding="utf-8").load())
     # silently skip unsupported extensions
     return docs
 
 
+def _load_pdf(path: Path, extractor: PdfExtractor | None, cache: ParsedDocumentCache | None) -> List:
+    def parse() -> List:
+        return extractor.load(path) if extractor else PyPDFLoader(str(path)).load()
+
+    if cache is None:
+        return parse()
+    content_hash, version = file_sha256(path), pdf_loader_version()
+    docs = cache.get(path, content_hash, version)
+    if docs is None:
+        start = time.perf_counter()
+        docs = parse()
+        cache.put(content_hash, version, docs, time.perf_counter() - start)
+    return docs
+
+
 def _load_urls(urls: Iterable[str]) -> List:
     documents = []
     for url in urls:
@@ -95,70 +300,987 @@ def _load_urls(urls: Iterable[str]) -> List:
     return documents
 
 
+def _attach_metadata(documents: List, ingested_at: int, tag: str | None = None) -> None:
+    # Normalized keys (source_type, path_N, ingested_at, tag) used by query filters
+    for doc in documents:
+        source = str(doc.metadata.get("source", ""))
+        if source.startswith(("http://", "https://")):
+            source_type = "web"
+        else:
+            source_type = Path(source).suffix.lower().lstrip(".") or "txt"
+        doc.metadata = normalize_metadata(doc.metadata, source_type, ingested_at, tag)
+
+
+def _tenant_dir(tenant: str | None = None) -> str:
+    """Persist directory of a tenant's index; PERSIST_DIR itself for the default (None) tenant."""
+    if tenant is None:
+        return PERSIST_DIR
+    return os.path.join(PERSIST_DIR, "tenants", validate_tenant(tenant))
+
+
+def _job_dir(tenant: str | None = None) -> str:
+    return os.path.join(_tenant_dir(tenant), "ingest-job")
+
+
+def _active_index(tenant: str | None = None) -> dict:
+    """Collection, shard count and storage mode queries should read."""
+    return read_active(_tenant_dir(tenant)) or {
+        "collection": COLLECTION_NAME,
+        "shards": SHARDS,
+        "storage": VECTOR_STORAGE,
+    }
+
+
+def _quantized_dir(shard: int, num_shards: int, collection: str | None = None, tenant: str | None = None) -> str:
+    collection = collection or _active_index(tenant)["collection"]
+    return os.path.join(_tenant_dir(tenant), "quantized", shard_name(collection, shard, num_shards))
+
+
+def _chroma(collection_name: str, tenant: str | None = None) -> Chroma:
+    return Chroma(
+        collection_name=collection_name,
+        persist_directory=_tenant_dir(tenant),
+        embedding_function=_embeddings(),
+        # Only used when the collection is created
+        collection_configuration=hnsw_configuration(HNSW_SPACE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH),
+    )
+
+
+def _chroma_shards(num_shards: int, collection: str | None = None, tenant: str | None = None) -> List[Chroma]:
+    # Opened up front: concurrent first use of a persist directory races
+    # inside Chroma's client cache.
+    collection = collection or _active_index(tenant)["collection"]
+    return [_chroma(shard_name(collection, i, num_shards), tenant) for i in range(num_shards)]
+
+
+def _drop_index(index: dict, tenant: str | None = None) -> None:
+    """Delete every shard of an index generation (see _active_index())."""
+    if index["storage"] == "float32":
+        for store in _chroma_shards(index["shards"], index["collection"], tenant):
+            store.delete_collection()
+    else:
+        for shard in range(index["shards"]):
+            shutil.rmtree(_quantized_dir(shard, index["shards"], index["collection"], tenant), ignore_errors=True)
+
+
+def _new_job_id() -> str:
+    # Prefixes chunk ids and staging collection names, so it must never repeat
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _activate(collection: str, shards: int, storage: str, replaces: dict | None = None, tenant: str | None = None) -> None:
+    """
+    Point queries at `collection` (atomic). The generation it replaces is
+    retired, not dropped: a running server reads it until reload_retriever()
+    and other processes (prefork workers, a second server) may read it for
+    longer, so it is only dropped by the next swap.
+    """
+    retired = (read_active(_tenant_dir(tenant)) or {}).get("retired")
+    if not replaces or replaces["collection"] == collection:
+        write_active(_tenant_dir(tenant), collection, shards, storage, retired=retired)
+        return
+    write_active(_tenant_dir(tenant), collection, shards, storage, retired=replaces)
+    if retired and retired["collection"] not in (collection, replaces["collection"]):
+        print(f"🗑️  Removing retired index '{retired['collection']}'")
+        _drop_index(retired, tenant)
+
+
+def _write_quantized_index(
+    chunks: List,
+    storage: str,
+    dim: int | None,
+    reduction: str,
+    directory: str = QUANTIZED_DIR,
+    vectors=None,
+    base: str | None = None,
+    reducer=None,
+) -> None:
+    """
+    Write one quantized shard to `directory`, which must belong to a
+    generation queries do not read yet (see _activate()). The shard starts
+    from what `directory` already holds (a resumed job) or else from `base`,
+    the same shard of the generation being appended to. A new shard uses
+    `reducer`, the generation's (see _shared_reducer()).
+    """
+    texts = [c.page_content for c in chunks]
+    metadatas = [c.metadata for c in chunks]
+    ids = [c.id for c in chunks] if all(c.id for c in chunks) else None
+    if vectors is None and texts:
+        vectors = _embeddings().embed_documents(texts)
+
+    source = directory if QuantizedIndex.exists(directory) else base if base and QuantizedIndex.exists(base) else None
+    if source is not None:
+        # Appending keeps the storage mode and reducer the index was built with.
+        index = QuantizedIndex.load(source)
+        if ids:
+            # Skip chunks a resumed job already wrote
+            known = set(index.ids)
+            keep = [i for i, id_ in enumerate(ids) if id_ not in known]
+            texts, metadatas, ids = [texts[i] for i in keep], [metadatas[i] for i in keep], [ids[i] for i in keep]
+            vectors = np.asarray(vectors, dtype=np.float32)[keep]
+        if texts:
+            index.extend(vectors, texts, metadatas, ids=ids)
+    elif not texts:
+        return
+    else:
+        index = QuantizedIndex.build(
+            vectors,
+            texts,
+            metadatas,
+            mode=storage,
+            dim=dim,
+            reduction=reduction,
+            keep_full=RESCORE_K > 0,
+            model=EMBEDDING_MODEL,
+            ids=ids,
+            reducer=reducer,
+        )
+    # Nobody reads `directory` yet, but a resumed job must not lose the
+    # shard it already wrote if it is interrupted again
+    staging = directory + ".staging"
+    index.save(staging)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    print(f"   {Path(directory).name}: {index.mode} vectors, {index.resident_bytes // max(len(index), 1)} bytes/chunk resident")
+
+
+def _shared_reducer(vectors, dim: int | None, reduction: str, directories: List[str]):
+    """
+    The dimension reducer of every quantized shard of a generation: the one
+    its shards (or those of the generation it appends to) already use, else
+    one fitted on all of its vectors. Merged hits and MMR compare reduced
+    vectors across shards, so they must share one basis.
+    """
+    for directory in directories:
+        if QuantizedIndex.exists(directory):
+            return QuantizedIndex.load_reducer(directory)
+    return fit_reducer(vectors, dim, reduction) if len(vectors) else None
+
+
 # -----------------------------
-# CLI build entrypoint
+# Snapshots (export / import without re-embedding)
 # -----------------------------
 
-def build_index(paths: List[str] | None, urls: List[str] | None, rebuild: bool = False):
-    # If no API key, do not even try to build embeddings
-    if not OPENAI_AVAILABLE:
-        print("⚠️  OPENAI_API_KEY is not set.")
-        print("    Ingestion (building the vector index) is disabled in offline mode.")
-        print("    Set OPENAI_API_KEY in a .env file to enable indexing.\n")
+def _read_chroma_shard(collection_name: str, page: int = 5000, tenant: str | None = None):
+    collection = _chroma(collection_name, tenant)._collection
+    ids, texts, metadatas, vectors = [], [], [], []
+    for offset in range(0, collection.count(), page):
+        batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+        ids += batch["ids"]
+        texts += [t or "" for t in batch["documents"]]
+        metadatas += [m or {} for m in batch["metadatas"]]
+        vectors.append(np.asarray(batch["embeddings"], dtype=np.float32))
+    return ids, texts, metadatas, vectors
+
+
+def _read_quantized_shard(directory: str, require_vectors: bool = True):
+    if not QuantizedIndex.exists(directory):
+        return [], [], [], []
+    index = QuantizedIndex.load(directory)
+    if index.full is not None:
+        vectors = np.asarray(index.full, dtype=np.float32)
+    elif not index.reducer.active:
+        vectors = dequantize(index.codes, index.scales)
+    elif require_vectors:
+        raise ValueError(
+            f"{directory} keeps only dimension-reduced vectors; rebuild it with "
+            "RAGBOT_RESCORE_K > 0 (keeps full-precision vectors) to export or compact it"
+        )
+    else:
+        vectors = None
+    return index.ids, index.texts, index.metadatas, [vectors]
+
+
+def _read_index(tenant: str | None = None, require_vectors: bool = True):
+    """
+    Every chunk of the active index (all shards): (ids, texts, metadatas,
+    vectors). Without `require_vectors`, vectors is None for a quantized
+    index that keeps only dimension-reduced vectors.
+    """
+    active = _active_index(tenant)
+    ids, texts, metadatas, vectors = [], [], [], []
+    for shard in range(active["shards"]):
+        if active["storage"] == "float32":
+            part = _read_chroma_shard(shard_name(active["collection"], shard, active["shards"]), tenant=tenant)
+        else:
+            part = _read_quantized_shard(
+                _quantized_dir(shard, active["shards"], active["collection"], tenant), require_vectors
+            )
+        ids += part[0]
+        texts += part[1]
+        metadatas += part[2]
+        vectors += part[3]
+    if any(v is None for v in vectors):
+        return ids, texts, metadatas, None
+    return ids, texts, metadatas, np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def _load_chunks(
+    target: str,
+    num_shards: int,
+    storage: str,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[dict],
+    vectors,
+    tenant: str | None = None,
+    dim: int | None = VECTOR_DIM,
+    reduction: str = VECTOR_REDUCTION,
+    base: str | None = None,
+) -> None:
+    """
+    Write chunks with their stored vectors into `target`, partitioned by
+    source; no embedding calls. Quantized shards start from generation `base`.
+    """
+    owner = np.array([shard_for(str(m.get("source", "")), num_shards) for m in metadatas])
+    stores = _chroma_shards(num_shards, target, tenant) if storage == "float32" else []
+    if storage != "float32":
+        directories = [_quantized_dir(s, num_shards, c, tenant) for c in (target, base) if c for s in range(num_shards)]
+        reducer = _shared_reducer(vectors, dim, reduction, directories)
+
+    def load_shard(shard: int) -> None:
+        rows = np.flatnonzero(owner == shard)
+        if not len(rows) and base is None:
+            return
+        if storage == "float32":
+            store = stores[shard]
+            batch = store._client.get_max_batch_size()
+            for start in range(0, len(rows), batch):
+                part = rows[start : start + batch].tolist()
+                store._collection.upsert(
+                    ids=[ids[i] for i in part],
+                    documents=[texts[i] for i in part],
+                    metadatas=[metadatas[i] or None for i in part],
+                    embeddings=np.asarray(vectors[part], dtype=np.float32),
+                )
+        else:
+            chunks = [Document(page_content=texts[i], metadata=metadatas[i], id=ids[i]) for i in rows.tolist()]
+            _write_quantized_index(
+                chunks,
+                storage,
+                dim,
+                reduction,
+                _quantized_dir(shard, num_shards, target, tenant),
+                vectors=np.asarray(vectors[rows], dtype=np.float32),
+                base=_quantized_dir(shard, num_shards, base, tenant) if base else None,
+                reducer=reducer,
+            )
+
+    with ThreadPoolExecutor(num_shards) as pool:
+        list(pool.map(load_shard, range(num_shards)))
+
+
+def export_snapshot(path: str, dtype: str = "float32", tenant: str | None = None) -> None:
+    """Write every chunk (all shards) with its stored vector to one snapshot file."""
+    ids, texts, metadatas, vectors = _read_index(tenant)
+    if not ids:
+        print("⚠️  Index is empty; nothing to export.")
         return
+    header = write_snapshot(path, ids, texts, metadatas, vectors, EMBEDDING_MODEL, dtype)
+    size_mb = os.path.getsize(path) / 1e6
+    print(f"✅ Exported {header['count']} chunks ({header['dim']} dims, {dtype}) to {path} [{size_mb:.1f} MB]")
+
+
+def export_serving_snapshot(dtype: str = "float32") -> str | None:
+    """
+    Export the default index to a new snapshot file in SERVING_DIR (see
+    SERVING_SNAPSHOT) and return its path; None when the index is empty.
+    """
+    os.makedirs(SERVING_DIR, exist_ok=True)
+    path = os.path.join(SERVING_DIR, f"{_active_index()['collection']}-{_new_job_id()}.snap")
+    export_snapshot(path, dtype)
+    return path if os.path.exists(path) else None
+
+
+def import_snapshot(
+    path: str, rebuild: bool = False, storage: str | None = None, shards: int | None = None, tenant: str | None = None
+) -> None:
+    """Bulk-load a snapshot into the configured store; no embedding calls are made."""
+    storage = storage or VECTOR_STORAGE
+    num_shards = shards or SHARDS
+    snapshot = Snapshot(path)
+    snapshot.verify()
+    if snapshot.model != EMBEDDING_MODEL:
+        raise ValueError(
+            f"Snapshot was embedded with {snapshot.model!r} but RAGBOT_EMBEDDING_MODEL is "
+            f"{EMBEDDING_MODEL!r}; query vectors would not be comparable"
+        )
+
+    previous = _active_index(tenant)
+    base = None
+    if rebuild:
+        # Load into a new collection; queries keep using the old one until the swap
+        target = f"{COLLECTION_NAME}-{_new_job_id()}"
+    else:
+        target, num_shards, storage = previous["collection"], previous["shards"], previous["storage"]
+        if storage != "float32":
+            # Quantized shards are rewritten whole, so appending also builds a new generation
+            base, target = target, f"{COLLECTION_NAME}-{_new_job_id()}"
+
+    _load_chunks(
+        target,
+        num_shards,
+        storage,
+        snapshot.ids,
+        snapshot.texts,
+        snapshot.metadatas,
+        snapshot.vectors,
+        tenant,
+        base=base,
+    )
+    _activate(target, num_shards, storage, replaces=previous if rebuild or base else None, tenant=tenant)
+    print(f"✅ Imported {len(snapshot)} chunks from {path} into collection '{target}'.")
+
 
+# -----------------------------
+# Maintenance (stats, cleanup, compaction)
+# -----------------------------
+
+def _segment_dirs(root: Path, collections: List[str]) -> List[Path]:
+    """Vector segment directories of the named Chroma collections."""
+    path = root / "chroma.sqlite3"
+    if not path.is_file():
+        return []
+    marks = ",".join("?" * len(collections))
+    with sqlite3.connect(path) as db:
+        rows = db.execute(
+            f"SELECT s.id FROM segments s JOIN collections c ON s.collection = c.id WHERE c.name IN ({marks})",
+            collections,
+        ).fetchall()
+    return [root / row[0] for row in rows if (root / row[0]).is_dir()]
+
+
+def _index_sizes(tenant: str | None = None) -> dict:
+    """On-disk bytes of the active index and bytes of its vector data."""
+    active = _active_index(tenant)
+    root = Path(_tenant_dir(tenant))
+    if active["storage"] == "float32":
+        # chroma.sqlite3 (chunks, metadata, WAL) plus one directory per vector segment;
+        # the sqlite file is shared with a retired generation, if any
+        names = [shard_name(active["collection"], i, active["shards"]) for i in range(active["shards"])]
+        segments = _segment_dirs(root, names)
+        vector_bytes = sum(directory_bytes(p) for p in segments)
+        sqlite_bytes = sum(p.stat().st_size for p in root.glob("chroma.sqlite3*"))
+        return {"disk_bytes": vector_bytes + sqlite_bytes, "vector_bytes": vector_bytes}
+    dirs = [_quantized_dir(i, active["shards"], active["collection"], tenant) for i in range(active["shards"])]
+    dirs = [d for d in dirs if QuantizedIndex.exists(d)]
+    return {
+        "disk_bytes": sum(directory_bytes(d) for d in dirs),
+        "vector_bytes": sum(QuantizedIndex.load(d).resident_bytes for d in dirs),
+    }
+
+
+def _search_latency(queries, tenant: str | None = None):
+    retriever = _build_retriever(tenant)
+    try:
+        return query_latency(lambda q: retriever.searcher.search(q, k=TOP_K, **retriever.search_kwargs), queries)
+    finally:
+        retriever.close()
+
+
+def set_hnsw_ef_search(ef_search: int, tenant: str | None = None) -> None:
+    """
+    Store a new query-time search ef on every shard of the active (float32)
+    index. Chroma reads it when it loads a collection, so running servers
+    use it after a restart.
+    """
+    active = _active_index(tenant)
+    if active["storage"] != "float32":
+        raise ValueError(f"Search ef applies to Chroma (float32) indexes; the active index is {active['storage']}")
+    for store in _chroma_shards(active["shards"], active["collection"], tenant):
+        store._collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    print(f"✅ Search ef of '{active['collection']}' set to {ef_search}; restart servers to apply it.")
+
+
+def _reclaim_chroma_space(tenant: str | None = None) -> None:
+    """
+    Dropped collections leave their vector segment directories and free
+    SQLite pages behind: remove segment directories no collection refers
+    to any more, then VACUUM.
+    """
+    root = _tenant_dir(tenant)
+    path = os.path.join(root, "chroma.sqlite3")
+    if not os.path.isfile(path):
+        return
     try:
-        print("📚 Loading documents...")
-        local_docs = _load_local_paths(paths or []) if paths else []
+        with sqlite3.connect(path) as db:
+            live = {row[0] for row in db.execute("SELECT id FROM segments")}
+        for entry in Path(root).iterdir():
+            try:
+                stale = entry.is_dir() and str(uuid.UUID(entry.name)) not in live
+            except ValueError:
+                continue  # not a segment directory
+            if stale and (entry / "header.bin").exists():
+                shutil.rmtree(entry, ignore_errors=True)
+        with sqlite3.connect(path) as db:
+            db.execute("VACUUM")
+    except sqlite3.Error as e:
+        print(f"   ⚠️  Could not reclaim space in {path}: {e}")
+
+
+def maintain_index(compact: bool = False, tenant: str | None = None, sample_queries: int = 50) -> dict:
+    """
+    Report chunk / source counts, duplicate ratio, sizes and query latency of
+    the active index, plus what cleanup would remove (see indexing.maintenance).
+    With `compact`, write the remaining chunks into a new generation (stored
+    vectors, no embedding calls), swap it in, drop the old one and report the
+    figures again.
+    """
+    if not OPENAI_AVAILABLE:
+        print("⚠️  OPENAI_API_KEY is not set; the index cannot be opened in offline mode.")
+        return {}
+    previous = _active_index(tenant)
+    # Compaction rewrites the stored vectors; the report needs them only for the latency probe
+    ids, texts, metadatas, vectors = _read_index(tenant, require_vectors=compact)
+    plan = plan_cleanup(texts, metadatas)
+    queries = None
+    if vectors is not None and plan.keep:
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(plan.keep, min(sample_queries, len(plan.keep)), replace=False)]
+
+    before = {
+        "stats": index_stats(texts, metadatas),
+        "sizes": _index_sizes(tenant),
+        "latency": _search_latency(queries, tenant) if queries is not None else None,
+    }
+    print(f"📊 Index '{previous['collection']}' ({previous['shards']} shard(s), {previous['storage']})")
+    print(format_report(before["stats"], plan, before["sizes"], before["latency"]))
+    if vectors is None:
+        print("   (no latency probe: the index keeps only dimension-reduced vectors)")
+    removed = {"superseded": len(plan.superseded), "duplicates": len(plan.duplicates), "orphans": len(plan.orphans)}
+    report = {"before": before, "removed": removed}
+    if not compact:
+        return report
+    if not plan.keep:
+        print("⚠️  Cleanup would remove every chunk; leaving the index as it is.")
+        return report
+
+    target = f"{COLLECTION_NAME}-{_new_job_id()}"
+    print(f"\n🧹 Compacting {len(plan.keep)} of {len(ids)} chunks into '{target}'...")
+    keep = np.asarray(plan.keep)
+    dim, reduction = VECTOR_DIM, VECTOR_REDUCTION
+    if previous["storage"] != "float32":
+        # Keep the dimension reduction the index was built with (every shard
+        # shares it); _load_chunks() fits it again on the kept chunks
+        reducer = QuantizedIndex.load_reducer(_quantized_dir(0, previous["shards"], previous["collection"], tenant))
+        dim, reduction = reducer.dim, reducer.method
+    _load_chunks(
+        target,
+        previous["shards"],
+        previous["storage"],
+        [ids[i] for i in keep],
+        [texts[i] for i in keep],
+        [metadatas[i] for i in keep],
+        vectors[keep],
+        tenant,
+        dim,
+        reduction,
+    )
+    _activate(target, previous["shards"], previous["storage"], replaces=previous, tenant=tenant)
+    if previous["storage"] == "float32":
+        _reclaim_chroma_space(tenant)
+
+    kept_texts, kept_metadatas = [texts[i] for i in keep], [metadatas[i] for i in keep]
+    after = {
+        "stats": index_stats(kept_texts, kept_metadatas),
+        "sizes": _index_sizes(tenant),
+        "latency": _search_latency(queries, tenant),
+    }
+    print("\n✅ After compaction")
+    print(format_report(after["stats"], plan_cleanup(kept_texts, kept_metadatas), after["sizes"], after["latency"]))
+    return {**report, "after": after}
+
+
+# -----------------------------
+# CLI build entrypoint
+# -----------------------------
+
+def _load_and_split(paths: List[str] | None, urls: List[str] | None, tag: str | None, profiler: StageProfiler) -> List:
+    print("📚 Loading documents...")
+    with profiler.stage("discover"):
+        files = _discover_local_paths(paths or [])
+    profiler.add_items("discover", len(files))
+    cache = ParsedDocumentCache(PARSE_CACHE_DIR) if PARSE_CACHE else None
+    with profiler.stage("load", items=len(files) + len(urls or [])):
+        with PdfExtractor(PDF_WORKERS, PDF_PARALLEL_PAGES) as extractor:
+            local_docs = [doc for f in files for doc in _load_single_file(f, extractor, cache)]
         web_docs = _load_urls(urls or []) if urls else []
-        all_docs = local_docs + web_docs
-        
-        if not all_docs:
-            print("⚠️  No documents found to index. Provide --paths and/or --urls.")
-            return
+    all_docs = local_docs + web_docs
+    if cache is not None and (cache.hits or cache.misses):
+        stats = cache.stats()
+        print(f"   Parse cache: {stats['hits']} PDF(s) reused, {stats['misses']} parsed (~{stats['saved_s']:.1f} s of parsing skipped)")
 
-        print(f"✅ Loaded {len(local_docs)} local documents and {len(web_docs)} web documents")
+    if not all_docs:
+        return []
 
-        if rebuild and os.path.isdir(PERSIST_DIR):
-            # clean persistence for a fresh build
-            import shutil
-            print(f"🗑️  Rebuilding index: removing existing directory {PERSIST_DIR}")
-            shutil.rmtree(PERSIST_DIR, ignore_errors=True)
+    print(f"✅ Loaded {len(local_docs)} local documents and {len(web_docs)} web documents")
+    _attach_metadata(all_docs, int(time.time()), tag)
 
-        print("🔨 Splitting documents into chunks...")
+    print("🔨 Splitting documents into chunks...")
+    with profiler.stage("split"):
         splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
             chunk_size=250, chunk_overlap=0
         )
         chunks = splitter.split_documents(all_docs)
-        print(f"✅ Created {len(chunks)} chunks from {len(all_docs)} documents")
-
-        print("💾 Creating/updating vector store...")
-        # Create or extend the vector store
-        _ = Chroma.from_documents(
-            documents=chunks,
-            collection_name=COLLECTION_NAME,
-            embedding=OpenAIEmbeddings(),
-            persist_directory=PERSIST_DIR,
+    profiler.add_items("split", len(chunks))
+    print(f"✅ Created {len(chunks)} chunks from {len(all_docs)} documents")
+    return chunks
+
+
+def _start_job(
+    chunks: List, rebuild: bool, storage: str, dim: int | None, reduction: str | None, shards: int, tenant: str | None = None
+) -> IngestJob:
+    previous = _active_index(tenant)
+    job_id = _new_job_id()
+    base = None
+    if rebuild:
+        # Build a new generation; the current index stays live until the swap
+        target = f"{COLLECTION_NAME}-{job_id}"
+    else:
+        target = previous["collection"]
+        if (shards, storage) != (previous["shards"], previous["storage"]):
+            print(
+                f"   Appending to '{target}' with its layout ({previous['shards']} shard(s), "
+                f"{previous['storage']}); use --rebuild to change it"
+            )
+        shards, storage = previous["shards"], previous["storage"]
+        if storage != "float32":
+            # Quantized shards are rewritten whole: append into a copy and swap
+            base, target = target, f"{COLLECTION_NAME}-{job_id}"
+    return IngestJob.create(
+        _job_dir(tenant),
+        chunks,
+        INGEST_BATCH,
+        job_id=job_id,
+        target=target,
+        rebuild=rebuild,
+        replaces=previous if rebuild or base else None,
+        base=base,
+        storage=storage,
+        dim=dim if dim is not None else VECTOR_DIM,
+        reduction=reduction or VECTOR_REDUCTION,
+        shards=shards,
+        tenant=tenant,
+    )
+
+
+def _upsert(store: Chroma, chunks: List, vectors) -> None:
+    """Write chunks with precomputed vectors, in batches Chroma accepts."""
+    batch = store._client.get_max_batch_size()
+    for start in range(0, len(chunks), batch):
+        part = chunks[start : start + batch]
+        store._collection.upsert(
+            ids=[c.id for c in part],
+            documents=[c.page_content for c in part],
+            metadatas=[c.metadata or None for c in part],
+            embeddings=np.asarray(vectors[start : start + batch], dtype=np.float32),
         )
-        print(f"✅ Indexed {len(all_docs)} source docs into collection '{COLLECTION_NAME}'.")
-        
-    except Exception as e:
-        print(f"❌ Error building index: {e}")
+
+
+def _embed_parallel(embeddings, texts: List[str], pool: ThreadPoolExecutor, workers: int) -> np.ndarray:
+    # Embedding is network-bound: split the batch into concurrent requests
+    size = -(-len(texts) // max(workers, 1))
+    parts = [texts[i : i + size] for i in range(0, len(texts), size)]
+    return np.concatenate([np.asarray(v, dtype=np.float32) for v in pool.map(embeddings.embed_documents, parts)])
+
+
+def _run_job(job: IngestJob, chunks: List, profiler: StageProfiler) -> None:
+    state = job.state
+    storage, num_shards, target = state["storage"], state["shards"], state["target"]
+    tenant = state.get("tenant")
+    stores = _chroma_shards(num_shards, target, tenant) if storage == "float32" else []
+    embeddings = _embeddings()
+
+    def write_chroma_shard(shard: int, part: List, vectors) -> None:
+        # Upserts with stable ids, so a batch replayed after a crash is not duplicated
+        if part:
+            _upsert(stores[shard], part, vectors)
+
+    def write_quantized_shard(shard: int, rows: List[int], vectors, reducer) -> None:
+        base = state.get("base")
+        if rows or base:
+            _write_quantized_index(
+                [chunks[i] for i in rows],
+                storage,
+                state["dim"],
+                state["reduction"],
+                _quantized_dir(shard, num_shards, target, tenant),
+                vectors=vectors[rows],
+                base=_quantized_dir(shard, num_shards, base, tenant) if base else None,
+                reducer=reducer,
+            )
+
+    print(
+        f"💾 Embedding {len(chunks)} chunks into '{target}' "
+        f"({job.batches} batches of {state['batch_size']}, {num_shards} shard(s))..."
+    )
+    with ThreadPoolExecutor(num_shards) as pool:
+        for batch, part in job.pending(chunks):
+            with profiler.stage("embed", items=len(part)):
+                vectors = _embed_parallel(embeddings, [c.page_content for c in part], pool, num_shards)
+            with profiler.stage("write", items=len(part)):
+                if storage == "float32":
+                    rows = partition(range(len(part)), num_shards, key=lambda i: part[i].metadata.get("source", ""))
+                    # list() re-raises the first shard failure
+                    list(pool.map(
+                        write_chroma_shard,
+                        range(num_shards),
+                        [[part[i] for i in r] for r in rows],
+                        [vectors[r] for r in rows],
+                    ))
+                    job.commit(batch)
+                else:
+                    job.commit(batch, vectors)
+            print(f"   batch {batch + 1}/{job.batches} committed")
+
+        with profiler.stage("write"):
+            if storage != "float32":
+                vectors = job.vectors()
+                rows = partition(range(len(chunks)), num_shards, key=lambda i: chunks[i].metadata.get("source", ""))
+                directories = [
+                    _quantized_dir(s, num_shards, c, tenant) for c in (target, state.get("base")) if c for s in range(num_shards)
+                ]
+                reducer = _shared_reducer(vectors, state["dim"], state["reduction"], directories)
+                list(pool.map(write_quantized_shard, range(num_shards), rows, [vectors] * num_shards, [reducer] * num_shards))
+            _activate(target, num_shards, storage, replaces=state.get("replaces"), tenant=tenant)
+    job.finish()
+
+
+def _discard_job(job: IngestJob) -> None:
+    state = job.state
+    print(f"⚠️  Discarding unfinished ingestion job {state['job_id']} (use --resume to continue it instead)")
+    if state["rebuild"] or state.get("base"):
+        # Its staging generation was never activated
+        _drop_index(
+            {"collection": state["target"], "shards": state["shards"], "storage": state["storage"]}, state.get("tenant")
+        )
+    job.finish()
+
+
+def build_index(
+    paths: List[str] | None,
+    urls: List[str] | None,
+    rebuild: bool = False,
+    storage: str | None = None,
+    dim: int | None = None,
+    reduction: str | None = None,
+    tag: str | None = None,
+    shards: int | None = None,
+    resume: bool = False,
+    profile: bool = False,
+    profile_json: str | None = None,
+    cprofile_path: str | None = None,
+    tenant: str | None = None,
+):
+    storage = storage or VECTOR_STORAGE
+    job_dir = _job_dir(tenant)
+    num_shards = shards or SHARDS
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode {storage!r}; expected one of {STORAGE_MODES}")
+
+    # If no API key, do not even try to build embeddings
+    if not OPENAI_AVAILABLE:
+        print("⚠️  OPENAI_API_KEY is not set.")
+        print("    Ingestion (building the vector index) is disabled in offline mode.")
+        print("    Set OPENAI_API_KEY in a .env file to enable indexing.\n")
+        return
+
+    job = None
+    profiler = StageProfiler(enabled=profile or bool(profile_json or cprofile_path), cprofile_path=cprofile_path)
+    profiler.start()
+    try:
+        if resume:
+            if not IngestJob.exists(job_dir):
+                print(f"⚠️  No unfinished ingestion job in {job_dir}; nothing to resume.")
+                return
+            job = IngestJob.load(job_dir)
+            print(f"♻️  Resuming job {job.state['job_id']}: {job.committed}/{job.batches} batches already committed")
+            chunks = job.chunks()
+        else:
+            if IngestJob.exists(job_dir):
+                _discard_job(IngestJob.load(job_dir))
+            chunks = _load_and_split(paths, urls, tag, profiler)
+            if not chunks:
+                print("⚠️  No documents found to index. Provide --paths and/or --urls.")
+                return
+            job = _start_job(chunks, rebuild, storage, dim, reduction, num_shards, tenant)
+            chunks = job.chunks()
+
+        _run_job(job, chunks, profiler)
+        print(f"✅ Indexed {len(chunks)} chunks into collection '{job.state['target']}'.")
+        profiler.stop()
+        if profiler.enabled:
+            _print_profile(profiler, job, profile_json)
+
+    except (Exception, KeyboardInterrupt) as e:
+        print(f"❌ Error building index: {e!r}")
+        if job is not None and IngestJob.exists(job_dir):
+            print(
+                f"   {job.committed}/{job.batches} batches are committed and the previous index is untouched; "
+                "continue with: python ingestion.py --resume"
+            )
         import traceback
         traceback.print_exc()
         raise
+    finally:
+        profiler.stop()
+
+
+def _print_profile(profiler: StageProfiler, job: IngestJob, path: str | None) -> None:
+    print("\n⏱️  Ingestion profile")
+    print(profiler.format_table())
+    if profiler.cprofile_path:
+        print(f"   cProfile stats written to {profiler.cprofile_path} (python -m pstats {profiler.cprofile_path})")
+    if path:
+        state = job.state
+        profiler.write_json(
+            path,
+            chunks=state["chunks"],
+            batch_size=state["batch_size"],
+            storage=state["storage"],
+            shards=state["shards"],
+            embedding_model=EMBEDDING_MODEL,
+        )
+        print(f"   JSON report written to {path}")
+
+
+# -----------------------------
+# Watch mode (incremental updates)
+# -----------------------------
+
+# Held by whoever writes the index in this process: server /ingest and each
+# watch batch, so a rebuild cannot swap generations in the middle of a batch.
+ingest_lock = threading.Lock()
+# Times a watch batch is applied when generations keep being swapped under it
+_SWAP_ATTEMPTS = 3
+
+
+def _indexed_sources(tenant: str | None = None) -> Dict[str, int]:
+    """Latest ingested_at of every local source in the active index."""
+    active = _active_index(tenant)
+    latest: Dict[str, int] = {}
+    for store in _chroma_shards(active["shards"], active["collection"], tenant):
+        collection = store._collection
+        for offset in range(0, collection.count(), 5000):
+            for metadata in collection.get(include=["metadatas"], limit=5000, offset=offset)["metadatas"]:
+                metadata = metadata or {}
+                source = metadata.get("source")
+                if source and metadata.get("source_type") != "web":
+                    latest[source] = max(latest.get(source, 0), int(metadata.get("ingested_at") or 0))
+    return latest
+
+
+def _watch_baseline(paths: List[str], files: List[str], tenant: str | None = None) -> Dict[str, tuple]:
+    """
+    File states the index already reflects, so watching starts by catching
+    up: files changed since they were ingested are re-indexed and indexed
+    files that no longer exist under the watched paths are removed.
+    """
+    indexed = _indexed_sources(tenant)
+    baseline = {}
+    for path, (mtime_ns, size) in scan_files(files).items():
+        ingested_at = indexed.pop(normalize_source(path), None)
+        if ingested_at is not None:
+            # Unchanged since ingestion, or reported as modified
+            baseline[path] = (mtime_ns, size) if mtime_ns // 1_000_000_000 < ingested_at else (0, 0)
+    prefixes = [normalize_source(static_prefix(p)) for p in paths]
+    for source in indexed:
+        watched = any(not prefix or source == prefix or source.startswith(prefix + "/") for prefix in prefixes)
+        if watched and not (os.path.exists(source) or os.path.exists("/" + source)):
+            baseline[source] = (0, 0)  # reported as deleted
+    return baseline
+
+
+def apply_file_changes(
+    changed: List[str], deleted: List[str], tag: str | None = None, tenant: str | None = None
+) -> dict:
+    """
+    Re-index `changed` files and drop the chunks of `deleted` ones, in place
+    in the active (float32) collection. The new chunks are embedded first
+    and written in small batches; the chunks they replace are deleted only
+    afterwards, so concurrent queries never find a changed file missing.
+    Runs under `ingest_lock`; if another process swapped generations
+    meanwhile, the batch is applied again to the new one, up to
+    _SWAP_ATTEMPTS times in all (then RuntimeError; the watcher retries the
+    batch later).
+    """
+    written = []
+    for _ in range(_SWAP_ATTEMPTS):
+        with ingest_lock:
+            stats = _apply_file_changes(changed, deleted, tag, tenant)
+        active = _active_index(tenant)["collection"]
+        if stats["collection"] == active:
+            return stats
+        written.append(stats["collection"])
+        print(f"   '{stats['collection']}' was replaced by '{active}' while the batch was written")
+    raise RuntimeError(
+        f"The active index was swapped during each of {_SWAP_ATTEMPTS} attempts to apply the batch "
+        f"(written to {', '.join(repr(c) for c in written)}; now '{active}')"
+    )
+
+
+def _apply_file_changes(changed: List[str], deleted: List[str], tag: str | None, tenant: str | None) -> dict:
+    active = _active_index(tenant)
+    if active["storage"] != "float32":
+        raise ValueError(
+            f"Incremental updates need float32 (Chroma) storage, the active index is {active['storage']}; "
+            "re-run ingestion with --rebuild instead"
+        )
+    start = time.perf_counter()
+    chunks = _load_and_split([glob.escape(p) for p in changed], None, tag, StageProfiler(enabled=False)) if changed else []
+    batch_id = _new_job_id()
+    for i, chunk in enumerate(chunks):
+        chunk.id = f"{batch_id}-{i}"
+
+    stores = _chroma_shards(active["shards"], active["collection"], tenant)
+    where = build_where({"source": changed + deleted}) if changed or deleted else None
+    replaced = [store._collection.get(where=where, include=[])["ids"] if where else [] for store in stores]
+
+    if chunks:
+        embeddings = _embeddings()
+        texts = [c.page_content for c in chunks]
+        vectors = np.concatenate([
+            np.asarray(embeddings.embed_documents(texts[i : i + INGEST_BATCH]), dtype=np.float32)
+            for i in range(0, len(texts), INGEST_BATCH)
+        ])
+        for shard, rows in enumerate(partition(range(len(chunks)), active["shards"], key=lambda i: chunks[i].metadata.get("source", ""))):
+            if rows:
+                _upsert(stores[shard], [chunks[i] for i in rows], vectors[rows])
+    for store, ids in zip(stores, replaced):
+        batch = store._client.get_max_batch_size()
+        for i in range(0, len(ids), batch):
+            store._collection.delete(ids=ids[i : i + batch])
+    if chunks and read_active(_tenant_dir(tenant)) is None:
+        write_active(_tenant_dir(tenant), active["collection"], active["shards"], active["storage"])
+    return {
+        "collection": active["collection"],
+        "files": len(changed),
+        "deleted": len(deleted),
+        "chunks_added": len(chunks),
+        "chunks_removed": sum(len(ids) for ids in replaced),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def watch_index(
+    paths: List[str], tag: str | None = None, tenant: str | None = None, stop: threading.Event | None = None
+) -> None:
+    """
+    Keep the active index in sync with `paths` until `stop` is set (or
+    Ctrl-C): catch up with changes made since the files were ingested, then
+    apply each debounced batch of additions, updates and deletions with
+    apply_file_changes(). Run in the server process (server.py --watch),
+    queries see every batch as soon as it is written.
+    """
+    if not OPENAI_AVAILABLE:
+        print("⚠️  OPENAI_API_KEY is not set; watch mode (incremental indexing) is disabled in offline mode.")
+        return
+    if _active_index(tenant)["storage"] != "float32":
+        raise ValueError("Watch mode needs float32 (Chroma) storage; quantized indexes are rebuilt with --rebuild")
+
+    def list_files() -> List[str]:
+        return [str(p) for p in _discover_local_paths(paths)]
+
+    def apply(changes: FileChanges) -> None:
+        print(
+            f"🔄 {len(changes.added)} added, {len(changes.modified)} modified, "
+            f"{len(changes.deleted)} deleted file(s)"
+        )
+        stats = apply_file_changes(changes.changed, changes.deleted, tag, tenant)
+        print(
+            f"✅ +{stats['chunks_added']} / -{stats['chunks_removed']} chunks in {stats['seconds']:.2f} s"
+        )
+
+    watcher = make_watcher(paths, WATCH_POLL_S, WATCH_INOTIFY)
+    print(f"👀 Watching {', '.join(paths)} ({type(watcher).__name__}); Ctrl-C to stop")
+    try:
+        watch_files(
+            list_files,
+            apply,
+            watcher,
+            initial=_watch_baseline(paths, list_files(), tenant),
+            debounce_s=WATCH_DEBOUNCE_S,
+            max_delay_s=WATCH_MAX_DELAY_S,
+            stop=stop,
+        )
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
 
 
 # -----------------------------
 # Runtime retriever (imported by the app)
 # -----------------------------
+
+# Shared by every runtime retriever; stats are reported by the server.
+query_embedding_cache: CachedQueryEmbeddings | None = None
+
+
+def _query_embeddings():
+    global query_embedding_cache
+    if EMBED_CACHE_SIZE <= 0:
+        return _embeddings()
+    if query_embedding_cache is None:
+        query_embedding_cache = CachedQueryEmbeddings(
+            _embeddings(), EMBEDDING_MODEL, max_entries=EMBED_CACHE_SIZE, path=EMBED_CACHE_PATH
+        )
+    return query_embedding_cache
+
+
+def _build_retriever(tenant: str | None = None):
+    stages = []
+    if ADAPTIVE_K:
+        # Relevance cut first; MMR then only reorders / dedups what is left
+        stages.append(AdaptiveKStage(MIN_K, MAX_K, SCORE_GAP, SCORE_RATIO))
+    if MMR_ENABLED:
+        stages.append(MMRStage(MMR_LAMBDA, MMR_DEDUP))
+
+    if tenant is None and SERVING_SNAPSHOT:
+        searcher = MappedIndex(SERVING_SNAPSHOT)
+        if searcher.model != EMBEDDING_MODEL:
+            raise ValueError(
+                f"Serving snapshot {SERVING_SNAPSHOT} was embedded with {searcher.model!r} but "
+                f"RAGBOT_EMBEDDING_MODEL is {EMBEDDING_MODEL!r}"
+            )
+        return VectorRetriever(
+            _query_embeddings(),
+            searcher,
+            k=MAX_K if ADAPTIVE_K else TOP_K,
+            fetch_k=FETCH_K,
+            stages=stages,
+        )
+
+    if tenant is not None and read_active(_tenant_dir(tenant)) is None:
+        # Opening Chroma would create an empty index for any tenant ID asked for
+        raise FileNotFoundError(f"No index for tenant {tenant!r}; ingest with --tenant {tenant} first")
+    active = _active_index(tenant)
+    if active["storage"] != "float32":
+        # Shards that received no chunks were never written
+        dirs = [_quantized_dir(i, active["shards"], active["collection"], tenant) for i in range(active["shards"])]
+        searchers = [QuantizedIndex.load(d) for d in dirs if QuantizedIndex.exists(d)]
+        if not searchers:
+            raise FileNotFoundError(f"No quantized index at {dirs[0]}")
+        search_kwargs = {"rescore_k": RESCORE_K}
+    else:
+        searchers = [
+            ChromaSearcher(store)
+            for store in _chroma_shards(active["shards"], active["collection"], tenant)
+        ]
+        search_kwargs = {}
+    searcher = searchers[0] if len(searchers) == 1 else ShardedSearcher(searchers)
+
+    return VectorRetriever(
+        _query_embeddings(),
+        searcher,
+        k=MAX_K if ADAPTIVE_K else TOP_K,
+        fetch_k=FETCH_K,
+        stages=stages,
+        search_kwargs=search_kwargs,
+    )
+
+
 if OPENAI_AVAILABLE:
     try:
-        retriever = Chroma(
-            collection_name=COLLECTION_NAME,
-            persist_directory=PERSIST_DIR,
-            embedding_function=OpenAIEmbeddings(),
-        ).as_retriever()
+        retriever = _build_retriever()
     except Exception as e:
         import warnings
         warnings.warn(
@@ -175,11 +1297,115 @@ else:
     retriever = None
 
 
+def _tenant_index_bytes(tenant: str, _retriever) -> int:
+    # Estimated resident size: the index files are loaded whole (the job
+    # directory only exists during ingestion)
+    return directory_bytes(_tenant_dir(tenant)) - directory_bytes(_job_dir(tenant))
+
+
+# Open per-tenant retrievers (see TENANT_CACHE_MB); stats are reported by the server.
+tenant_retrievers = TenantPool(
+    _build_retriever,
+    _tenant_index_bytes,
+    close_fn=lambda r: r.close(),
+    max_bytes=int(TENANT_CACHE_MB * 1024 * 1024),
+    max_open=TENANT_MAX_OPEN,
+)
+
+
+@contextmanager
+def tenant_retriever(tenant: str | None):
+    """
+    The retriever for `tenant`, held open for the duration of the block.
+    The default tenant (None) uses the module-level `retriever`. Raises
+    ValueError for a malformed tenant ID and FileNotFoundError when the
+    tenant has no index.
+    """
+    if tenant is None or not OPENAI_AVAILABLE:
+        # Read at call time: long-running servers may reload it after ingestion
+        yield retriever
+        return
+    validate_tenant(tenant)
+    with tenant_retrievers.lease(tenant) as opened:
+        yield opened
+
+
+def reload_retriever(tenant: str | None = None):
+    """
+    Rebuild the module-level `retriever` so a long-running process picks up
+    a freshly built index. Callers must read it as `ingestion.retriever`.
+    For a tenant, its open retriever is closed and reopened on next use.
+    """
+    global retriever
+    if tenant is not None:
+        tenant_retrievers.invalidate(validate_tenant(tenant))
+        return None
+    if OPENAI_AVAILABLE:
+        retriever = _build_retriever()
+    return retriever
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Index local files and/or URLs into Chroma.")
     parser.add_argument("--paths", nargs="*", help="File or directory globs (e.g., docs, docs/*.pdf)")
     parser.add_argument("--urls", nargs="*", help="One or more web URLs to index")
-    parser.add_argument("--rebuild", action="store_true", help="Delete existing index before building")
+    parser.add_argument("--rebuild", action="store_true", help="Build a fresh index and replace the existing one when done")
+    parser.add_argument("--resume", action="store_true", help="Continue the last interrupted ingestion run")
+    parser.add_argument("--storage", choices=STORAGE_MODES, help="Vector storage mode (default: RAGBOT_VECTOR_STORAGE or float32)")
+    parser.add_argument("--dim", type=int, help="Reduce quantized vectors to this many dimensions")
+    parser.add_argument("--reduction", choices=("prefix", "pca"), help="Dimension reduction method (default: prefix)")
+    parser.add_argument("--tag", help="Collection tag stored on every chunk (filter with cli.py --tag)")
+    parser.add_argument("--profile", action="store_true", help="Report wall/CPU time, throughput and peak memory per stage")
+    parser.add_argument("--profile-json", metavar="FILE", help="Also write the profile as JSON (implies --profile)")
+    parser.add_argument("--cprofile", metavar="FILE", help="Dump cProfile stats of the run (implies --profile)")
+    parser.add_argument("--export-snapshot", metavar="FILE", help="Write the current index (text, metadata, vectors) to a snapshot file")
+    parser.add_argument("--import-snapshot", metavar="FILE", help="Load a snapshot file into the index without re-embedding")
+    parser.add_argument("--snapshot-dtype", choices=SNAPSHOT_DTYPES, default="float32", help="Vector precision in exported snapshots")
+    parser.add_argument("--shards", type=int, help="Partition chunks across N shards by source (default: RAGBOT_SHARDS or 1)")
+    parser.add_argument("--tenant", help="Build / export / import this tenant's own index (default: the shared one)")
+    parser.add_argument("--stats", action="store_true", help="Report chunk counts, duplicates, orphans, sizes and query latency")
+    parser.add_argument("--compact", action="store_true", help="Remove superseded, duplicate and orphaned chunks and rewrite the index")
+    parser.add_argument("--hnsw-ef-search", type=int, metavar="N", help="Set the HNSW search ef stored with the active index (Chroma)")
+    parser.add_argument("--watch", action="store_true", help="Keep the index in sync with --paths: index what changed since it was built, then every change (Ctrl-C to stop)")
     args = parser.parse_args()
 
-    build_index(paths=args.paths, urls=args.urls, rebuild=args.rebuild)
\ No newline at end of file
+    if args.stats or args.compact:
+        maintain_index(compact=args.compact, tenant=args.tenant)
+        raise SystemExit(0)
+    if args.hnsw_ef_search:
+        set_hnsw_ef_search(args.hnsw_ef_search, tenant=args.tenant)
+        raise SystemExit(0)
+
+    if args.export_snapshot:
+        export_snapshot(args.export_snapshot, args.snapshot_dtype, tenant=args.tenant)
+        raise SystemExit(0)
+    if args.import_snapshot:
+        import_snapshot(
+            args.import_snapshot, rebuild=args.rebuild, storage=args.storage, shards=args.shards, tenant=args.tenant
+        )
+        raise SystemExit(0)
+
+    if args.watch and not args.paths:
+        parser.error("--watch needs --paths")
+    if args.watch and not (args.rebuild or args.urls or args.resume):
+        # The watcher catches up incrementally; no full run needed
+        watch_index(args.paths, tag=args.tag, tenant=args.tenant)
+        raise SystemExit(0)
+
+    build_index(
+        paths=args.paths,
+        urls=args.urls,
+        rebuild=args.rebuild,
+        storage=args.storage,
+        dim=args.dim,
+        reduction=args.reduction,
+        tag=args.tag,
+        shards=args.shards,
+        resume=args.resume,
+        profile=args.profile,
+        profile_json=args.profile_json,
+        cprofile_path=args.cprofile,
+        tenant=args.tenant,
+    )
+    if args.watch:
+        watch_index(args.paths, tag=args.tag, tenant=args.tenant)
\ No newline at end of file
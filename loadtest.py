@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+loadtest.py - Concurrent end-to-end load generator for the RAG graph
+
+Replays a question set against the compiled `app` in-process, or against a
+running server.py, and reports throughput plus p50/p95/p99 latency end to
+end and per node. With --sweep it repeats the run at several concurrency
+levels and prints the concurrency-versus-throughput curve.
+
+By default the LLM chains, the retriever (embedding + vector search) and
+web search are replaced by stubs that sleep for a log-normal latency
+(given as MEDIAN:P95 in ms), so runs are offline, free and repeatable.
+--providers real keeps whatever the environment configures.
+
+Per-node times in-process come from LangGraph task events: "route" is the
+entry router, and each node includes the conditional edge after it (the
+hallucination check runs inside "generate"). Against a server they are the
+gaps between streamed events as seen by the client.
+
+Examples:
+  python loadtest.py --concurrency 8 --requests 200
+  python loadtest.py --sweep 1,2,4,8,16,32 --requests 100 --time-scale 0.1
+  python loadtest.py --rate 5 --duration 60 --concurrency 32
+  python loadtest.py --url http://127.0.0.1:8000 --sweep 1,4,16
+
+  # Speculative web search on low-confidence routes, against a baseline run
+  python loadtest.py --irrelevant 0.3 --low-confidence 0.5
+  RAGBOT_SPECULATIVE_WEB=1 python loadtest.py --irrelevant 0.3 --low-confidence 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import math
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from token_usage import UsageRecorder, format_usage, record_estimate, track_usage
+
+DEFAULT_QUESTIONS = [
+    "what is agent memory?",
+    "how does task decomposition work in LLM agents?",
+    "what are common prompt engineering techniques?",
+    "explain chain of thought prompting",
+    "what are adversarial attacks on LLMs?",
+    "how do agents use external tools?",
+    "what is the weather in Paris today?",
+    "who won the last football world cup?",
+]
+
+
+# -----------------------------
+# Stub providers
+# -----------------------------
+
+class Latency:
+    """Log-normal latency from a median and a 95th percentile (ms)."""
+
+    def __init__(self, median_ms: float, p95_ms: float):
+        self.median_ms = median_ms
+        self.sigma = math.log(max(p95_ms, median_ms) / median_ms) / 1.645 if median_ms > 0 else 0.0
+
+    @classmethod
+    def parse(cls, text: str) -> "Latency":
+        median, _, p95 = text.partition(":")
+        return cls(float(median), float(p95 or median))
+
+    def sleep(self, rng: random.Random, scale: float) -> None:
+        if self.median_ms > 0 and scale > 0:
+            time.sleep(self.median_ms * math.exp(self.sigma * rng.gauss(0, 1)) * scale / 1000)
+
+
+@dataclass
+class StubProfile:
+    router: Latency = field(default_factory=lambda: Latency(350, 900))
+    grader: Latency = field(default_factory=lambda: Latency(300, 800))
+    generate: Latency = field(default_factory=lambda: Latency(1200, 3000))
+    hallucination: Latency = field(default_factory=lambda: Latency(350, 900))
+    embed: Latency = field(default_factory=lambda: Latency(60, 180))
+    search: Latency = field(default_factory=lambda: Latency(5, 20))
+    web: Latency = field(default_factory=lambda: Latency(700, 2000))
+    time_scale: float = 1.0
+    web_fraction: float = 0.2  # questions routed straight to web search
+    irrelevant: float = 0.15  # chance a retrieved chunk is graded irrelevant
+    low_confidence: float = 0.0  # chance a vectorstore route comes with low router confidence
+    regenerate: float = 0.05  # chance an answer is judged not grounded
+    k: int = 4
+    seed: int = 0
+
+
+# Token estimates for stub calls are priced as this model
+STUB_LLM_MODEL = "gpt-4"
+
+
+class _Stub:
+    def __init__(self, profile: StubProfile, latency: Latency):
+        self.profile = profile
+        self.latency = latency
+        self.rng = random.Random(f"{profile.seed}-{type(self).__name__}")
+
+    def _wait(self) -> None:
+        self.latency.sleep(self.rng, self.profile.time_scale)
+
+
+class _StubRouter(_Stub):
+    def invoke(self, inputs: dict):
+        from graph.chains.router import RouteQuery
+
+        self._wait()
+        web = self.rng.random() < self.profile.web_fraction
+        confidence = 0.3 if self.rng.random() < self.profile.low_confidence else 0.95
+        route = RouteQuery(datasource="websearch" if web else "vectorstore", confidence=confidence)
+        record_estimate("question_router", STUB_LLM_MODEL, inputs, route)
+        return route
+
+
+class _StubGrader(_Stub):
+    def invoke(self, inputs: dict):
+        from graph.chains.retrieval_grader import GradeDocuments
+
+        self._wait()
+        score = GradeDocuments(binary_score="no" if self.rng.random() < self.profile.irrelevant else "yes")
+        record_estimate("retrieval_grader", STUB_LLM_MODEL, inputs, score)
+        return score
+
+
+class _StubHallucinationGrader(_Stub):
+    def invoke(self, inputs: dict):
+        from graph.chains.hallucination_grader import GradeHallucination
+
+        self._wait()
+        score = GradeHallucination(binary_score=self.rng.random() >= self.profile.regenerate)
+        record_estimate("hallucination_grader", STUB_LLM_MODEL, inputs, score)
+        return score
+
+
+class _StubGeneration(_Stub):
+    def invoke(self, inputs: dict) -> str:
+        self._wait()
+        answer = f"Stub answer to: {inputs.get('question', '')}"
+        record_estimate("generation", STUB_LLM_MODEL, inputs, answer)
+        return answer
+
+
+class _StubWebSearch(_Stub):
+    def invoke(self, query) -> List[Document]:
+        self._wait()
+        return [Document(page_content=f"Stub web result for: {query}")]
+
+
+class _StubRetriever(_Stub):
+    """VectorRetriever stand-in: embedding call + vector search."""
+
+    def __init__(self, profile: StubProfile):
+        super().__init__(profile, profile.embed)
+
+    def retrieve(self, question: str, where=None):
+        from ingestion import EMBEDDING_MODEL
+
+        record_estimate("query_embedding", EMBEDDING_MODEL, question, "")
+        start = time.perf_counter()
+        self.profile.embed.sleep(self.rng, self.profile.time_scale)
+        embedded = time.perf_counter()
+        self.profile.search.sleep(self.rng, self.profile.time_scale)
+        docs = [Document(page_content=f"Stub chunk {i} for: {question}") for i in range(self.profile.k)]
+        info = {
+            "k": len(docs),
+            "embed_ms": round((embedded - start) * 1000, 2),
+            "search_ms": round((time.perf_counter() - embedded) * 1000, 2),
+        }
+        return docs, info
+
+    def invoke(self, question: str, *args, **kwargs) -> List[Document]:
+        return self.retrieve(question)[0]
+
+
+@contextlib.contextmanager
+def stub_providers(profile: StubProfile) -> Iterator[None]:
+    """Swap every external provider the graph calls for a stub; restored on exit."""
+    import ingestion
+
+    graph_module = importlib.import_module("graph.graph")
+    grade_module = importlib.import_module("graph.nodes.grade_documents")
+    generate_module = importlib.import_module("graph.nodes.generate")
+    web_module = importlib.import_module("graph.nodes.web_search")
+    patches = [
+        (graph_module, "question_router", _StubRouter(profile, profile.router)),
+        (graph_module, "hallucination_grader", _StubHallucinationGrader(profile, profile.hallucination)),
+        (grade_module, "retrieval_grader", _StubGrader(profile, profile.grader)),
+        (generate_module, "generation_chain", _StubGeneration(profile, profile.generate)),
+        (web_module, "web_search_tool", _StubWebSearch(profile, profile.web)),
+        (web_module, "TAVILY_AVAILABLE", False),
+        (ingestion, "retriever", _StubRetriever(profile)),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+# -----------------------------
+# Request drivers
+# -----------------------------
+
+@dataclass
+class Sample:
+    latency: float
+    nodes: Dict[str, float]
+    error: Optional[str] = None
+
+
+def _in_process_request(app, question: str, usage: Optional[UsageRecorder] = None) -> Dict[str, float]:
+    """Run one question; per-node seconds from LangGraph debug task events, tokens into `usage`."""
+    from graph.speculation import speculation_scope
+
+    nodes: Dict[str, float] = {}
+    started: Dict[str, datetime] = {}
+    first_task = None
+    t0 = datetime.now().astimezone()
+    with track_usage(usage), speculation_scope({"question": question}) as graph_input:
+        for event in app.stream(graph_input, stream_mode="debug"):
+            stamp = datetime.fromisoformat(event["timestamp"])
+            name = event["payload"].get("name")
+            if event["type"] == "task":
+                first_task = first_task or stamp
+                started[event["payload"]["id"]] = stamp
+            elif event["type"] == "task_result":
+                begin = started.pop(event["payload"]["id"], stamp)
+                nodes[name] = nodes.get(name, 0.0) + (stamp - begin).total_seconds()
+    if first_task is not None:
+        nodes["route"] = (first_task - t0).total_seconds()
+    return nodes
+
+
+def _server_request(url: str, question: str, usage: Optional[UsageRecorder] = None) -> Dict[str, float]:
+    """POST /query/stream; per-node seconds are gaps between received events, tokens into `usage`."""
+    body = json.dumps({"question": question}).encode()
+    request = urllib.request.Request(url.rstrip("/") + "/query/stream", data=body, method="POST")
+    nodes: Dict[str, float] = {}
+    last = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=300) as response:
+        for line in response:
+            event = json.loads(line)
+            now = time.perf_counter()
+            if event.get("event") == "error":
+                raise RuntimeError(event.get("error"))
+            if event.get("node"):
+                nodes[event["node"]] = nodes.get(event["node"], 0.0) + now - last
+            if usage is not None and event.get("usage"):
+                usage.merge(event["usage"])
+            last = now
+    return nodes
+
+
+def run_load(
+    send,
+    questions: List[str],
+    concurrency: int,
+    requests: int = 0,
+    rate: Optional[float] = None,
+    duration: Optional[float] = None,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Send questions with at most `concurrency` in flight.
+
+    Closed loop by default (`requests` in total, each worker sends the next
+    as soon as one finishes). With `rate`, arrivals are open-loop Poisson at
+    `rate` per second for `duration` seconds (or `requests` arrivals), and
+    latency is measured from the scheduled arrival, so queueing counts.
+    """
+    rng = random.Random(seed)
+    if rate:
+        arrivals, t = [], 0.0
+        while (duration and t < duration) or (not duration and len(arrivals) < requests):
+            arrivals.append(t)
+            t += rng.expovariate(rate)
+    else:
+        arrivals = [0.0] * requests
+
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def one(i: int) -> None:
+        scheduled = start + arrivals[i]
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        begin = scheduled if rate else time.perf_counter()
+        try:
+            nodes, error = send(questions[i % len(questions)]), None
+        except Exception as e:
+            nodes, error = {}, f"{type(e).__name__}: {e}"
+        sample = Sample(time.perf_counter() - begin, nodes, error)
+        with lock:
+            samples.append(sample)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(len(arrivals))))
+    return summarize(samples, time.perf_counter() - start, concurrency)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ms = np.asarray(values) * 1000
+    return {f"p{p}": round(float(np.percentile(ms, p)), 1) for p in (50, 95, 99)}
+
+
+def summarize(samples: List[Sample], elapsed: float, concurrency: int) -> Dict[str, Any]:
+    ok = [s for s in samples if s.error is None]
+    per_node: Dict[str, List[float]] = {}
+    for s in ok:
+        for node, seconds in s.nodes.items():
+            per_node.setdefault(node, []).append(seconds)
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "error_examples": sorted({s.error for s in samples if s.error})[:3],
+        "elapsed_s": round(elapsed, 2),
+        "throughput_qps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": _percentiles([s.latency for s in ok]),
+        "nodes_ms": {node: {"count": len(v), **_percentiles(v)} for node, v in sorted(per_node.items())},
+    }
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+
+def print_curve(results: List[Dict[str, Any]]) -> None:
+    print(f"{'conc':>5}{'reqs':>7}{'errs':>6}{'qps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        lat = r["latency_ms"]
+        print(
+            f"{r['concurrency']:>5}{r['requests']:>7}{r['errors']:>6}{r['throughput_qps']:>9.2f}"
+            f"{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['p99']:>10.1f}"
+        )
+
+
+def print_nodes(result: Dict[str, Any]) -> None:
+    print(f"\nPer node at concurrency {result['concurrency']}:")
+    print(f"{'node':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for node, stats in result["nodes_ms"].items():
+        print(f"{node:<18}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    for example in result["error_examples"]:
+        print(f"  error: {example}")
+
+
+def print_usage(result: Dict[str, Any]) -> None:
+    completed = result["requests"] - result["errors"]
+    if not result["usage"]["calls"] or not completed:
+        return
+    print(f"\nTokens at concurrency {result['concurrency']}:")
+    print(format_usage(result["usage"], requests=completed))
+    print(f"total over {completed} requests: {result['usage']['total_tokens']:,} tokens, ${result['usage']['cost_usd']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load a running server.py instead of the in-process app")
+    parser.add_argument("--questions", help="Question file, one per line (default: built-in set)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max requests in flight")
+    parser.add_argument("--sweep", help="Comma-separated concurrency levels, e.g. 1,2,4,8,16")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per run (closed loop)")
+    parser.add_argument("--rate", type=float, help="Open-loop Poisson arrival rate (requests/s)")
+    parser.add_argument("--duration", type=float, help="Seconds of arrivals with --rate")
+    parser.add_argument("--providers", choices=("stub", "real"), default="stub", help="In-process providers")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply every stub latency")
+    parser.add_argument("--llm-ms", default="1200:3000", help="Stub generation latency MEDIAN:P95")
+    parser.add_argument("--grader-ms", default="300:800", help="Stub router / grader latency MEDIAN:P95")
+    parser.add_argument("--embed-ms", default="60:180", help="Stub query embedding latency MEDIAN:P95")
+    parser.add_argument("--search-ms", default="5:20", help="Stub vector search latency MEDIAN:P95")
+    parser.add_argument("--web-ms", default="700:2000", help="Stub web search latency MEDIAN:P95")
+    parser.add_argument("--web-fraction", type=float, default=0.2, help="Share of questions routed to web search")
+    parser.add_argument("--irrelevant", type=float, default=0.15, help="Chance a chunk is graded irrelevant")
+    parser.add_argument("--regenerate", type=float, default=0.05, help="Chance an answer is regenerated")
+    parser.add_argument("--low-confidence", type=float, default=0.0, help="Chance a vectorstore route has low router confidence")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="FILE", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    levels = [int(c) for c in args.sweep.split(",")] if args.sweep else [args.concurrency]
+
+    grader = Latency.parse(args.grader_ms)
+    profile = StubProfile(
+        router=grader,
+        grader=grader,
+        generate=Latency.parse(args.llm_ms),
+        hallucination=grader,
+        embed=Latency.parse(args.embed_ms),
+        search=Latency.parse(args.search_ms),
+        web=Latency.parse(args.web_ms),
+        time_scale=args.time_scale,
+        web_fraction=args.web_fraction,
+        irrelevant=args.irrelevant,
+        regenerate=args.regenerate,
+        low_confidence=args.low_confidence,
+        seed=args.seed,
+    )
+
+    if args.url:
+        target = f"server {args.url}"
+        send = lambda q, usage: _server_request(args.url, q, usage)
+        providers = contextlib.nullcontext()
+    else:
+        from graph.graph import app
+
+        target = f"in-process app, {args.providers} providers"
+        send = lambda q, usage: _in_process_request(app, q, usage)
+        providers = stub_providers(profile) if args.providers == "stub" else contextlib.nullcontext()
+
+    mode = f"open loop {args.rate}/s" if args.rate else f"closed loop, {args.requests} requests"
+    print(f"Load test: {target}; {mode}; time scale {args.time_scale}")
+    results = []
+    # Nodes print progress lines; keep them out of the report
+    with providers, contextlib.redirect_stdout(io.StringIO()):
+        for level in levels:
+            usage = UsageRecorder()
+            result = run_load(lambda q: send(q, usage), questions, level, args.requests, args.rate, args.duration, args.seed)
+            results.append({**result, "usage": usage.report()})
+    print_curve(results)
+    print_nodes(results[-1])
+    print_usage(results[-1])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"target": target, "mode": mode, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+prefork.py - Pre-fork multi-process server over one shared, memory-mapped index
+
+server.py runs every request on threads of one process, so retrieval
+post-processing, context building and graph orchestration share one core.
+prefork.py serves the same HTTP API (see server.py) from N worker processes:
+
+  1. The active index is exported to a snapshot file in RAGBOT_SERVING_DIR
+     (default <RAGBOT_CHROMA_DIR>/serving) by a short-lived helper process,
+     so Chroma is never opened in the parent (or, therefore, the workers).
+  2. The parent imports server.py with RAGBOT_SERVING_SNAPSHOT pointing at
+     that file: the compiled `app`, the LLM clients and a MappedIndex
+     retriever (indexing.mapped). Then it binds the listening socket and
+     forks the workers, which share all of that copy-on-write. The vectors
+     and chunk texts stay in the file and are shared through the page
+     cache, so each worker adds its own heap, not another copy of the index.
+  3. Every worker accepts connections from the inherited socket, i.e. the
+     kernel dispatches them. A worker whose graph slots are all busy waits
+     briefly before accepting, so idle workers take new connections first
+     (see server.SharedSocketServer).
+
+The parent supervises the pool through a small shared-memory board that
+each worker updates every HEARTBEAT_S (pid, heartbeat, in-flight, queued,
+completed, memory). It restarts workers that exit, stop sending heartbeats
+(--heartbeat-timeout) or make no progress with requests in flight
+(--worker-timeout); workers that keep crashing are restarted with backoff.
+
+Signals to the parent:
+  SIGHUP          export the index again and replace the workers (a new
+                  generation starts first, then the old one drains)
+  SIGTERM/Ctrl-C  stop accepting, let requests in progress finish
+                  (--graceful-timeout), exit
+
+Per process: --max-concurrency, --max-queue and --queue-timeout apply to
+each worker, and provider rate limits (RAGBOT_RATE_LIMITS) are split evenly
+between the workers. POST /ingest answers 409: run ingestion.py, then send
+SIGHUP. Tenant requests open that tenant's own index in each worker.
+GET /health adds "worker" (this process) and "pool" (every worker).
+
+Examples:
+  python prefork.py --workers 4 --port 8000
+  python prefork.py --workers 8 --snapshot-dtype float16   # half the index size
+  python ingestion.py --paths docs && kill -HUP <prefork pid>
+"""
+from __future__ import annotations
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
+
+# Seconds between a worker's board updates
+HEARTBEAT_S = 1.0
+# Restart delay after a worker died within MIN_UPTIME_S of starting; doubles
+# with every further such failure, up to MAX_BACKOFF_S
+MIN_UPTIME_S = 10.0
+MAX_BACKOFF_S = 30.0
+
+
+class WorkerBoard:
+    """
+    One row of float64 fields per worker slot in anonymous shared memory.
+    Created before forking, so parent and workers see the same pages; a
+    worker writes only its own row.
+    """
+
+    FIELDS = (
+        "pid", "generation", "started", "heartbeat", "restarts",
+        "in_flight", "queued", "completed", "rejected", "rss_mb", "pss_mb",
+    )
+
+    def __init__(self, slots: int):
+        self._memory = mmap.mmap(-1, slots * len(self.FIELDS) * 8)
+        self.rows = np.frombuffer(self._memory, dtype=np.float64).reshape(slots, len(self.FIELDS))
+        self._column = {name: i for i, name in enumerate(self.FIELDS)}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, slot: int, field: str) -> float:
+        return float(self.rows[slot, self._column[field]])
+
+    def set(self, slot: int, **values: float) -> None:
+        for field, value in values.items():
+            self.rows[slot, self._column[field]] = value
+
+    def clear(self, slot: int) -> None:
+        restarts = self.get(slot, "restarts")
+        self.rows[slot] = 0
+        self.set(slot, restarts=restarts)
+
+    def free_slot(self) -> Optional[int]:
+        return next((slot for slot in range(len(self)) if not self.get(slot, "pid")), None)
+
+    def workers(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [
+            {
+                "slot": slot,
+                "pid": int(row[0]),
+                "generation": int(row[1]),
+                "uptime_s": round(now - row[2], 1),
+                "heartbeat_age_s": round(now - row[3], 1) if row[3] else None,
+                **{field: int(value) for field, value in zip(self.FIELDS[4:9], row[4:9])},
+                "rss_mb": round(float(row[9]), 1),
+                "pss_mb": round(float(row[10]), 1),
+            }
+            for slot, row in enumerate(self.rows.tolist())
+            if row[0]
+        ]
+
+
+# -----------------------------
+# Snapshot export (helper process)
+# -----------------------------
+
+def _export(dtype: str) -> Optional[str]:
+    import ingestion
+
+    return ingestion.export_serving_snapshot(dtype)
+
+
+def export_serving_snapshot(dtype: str = "float32") -> Optional[str]:
+    """Export the index in a fresh interpreter; Chroma (sqlite, its threads) stays out of this process."""
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_export, dtype).result()
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+
+def _worker_main(slot: int, generation: int, sock: socket.socket, board: WorkerBoard, args) -> None:
+    """Body of a forked worker; never returns."""
+    code = 1
+    try:
+        # The parent handles Ctrl-C / SIGHUP for the pool and stops workers
+        # with SIGTERM (fatal until the worker serves, then graceful)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        _serve(slot, generation, sock, board, args)
+        code = 0
+    except BaseException as e:
+        print(f"❌ Worker {os.getpid()} failed: {e!r}", flush=True)
+    finally:
+        os._exit(code)
+
+
+def _serve(slot: int, generation: int, sock: socket.socket, board: WorkerBoard, args) -> None:
+    import ingestion
+    import server
+    from indexing.profiling import current_pss, current_rss
+    from rate_limit import limiter
+
+    # Reopen what may hold a file handle (the embedding cache's sqlite
+    # connection) instead of sharing the parent's; the index is mapped again
+    ingestion.query_embedding_cache = None
+    ingestion.reload_retriever()
+    limiter.limits = {
+        model: tuple(limit / args.workers if limit else limit for limit in limits)
+        for model, limits in limiter.limits.items()
+    }
+
+    def status() -> Dict[str, Any]:
+        return {
+            "worker": {"pid": os.getpid(), "slot": slot, "generation": generation},
+            "pool": {"parent": os.getppid(), "workers": board.workers()},
+        }
+
+    service = server.QueryService(
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        queue_timeout=args.queue_timeout,
+        allow_ingest=False,
+        status=status,
+    )
+    httpd = server.SharedSocketServer(sock, service)
+    stopping = threading.Event()
+
+    def beat() -> None:
+        admission = service.admission
+        board.set(
+            slot,
+            heartbeat=time.time(),
+            in_flight=admission.active,
+            queued=admission.waiting,
+            completed=admission.admitted - admission.active,
+            rejected=admission.rejected,
+            rss_mb=(current_rss() or 0) / 2**20,
+            pss_mb=(current_pss() or 0) / 2**20,
+        )
+
+    def heartbeat() -> None:
+        while not stopping.wait(HEARTBEAT_S):
+            beat()
+
+    def stop(*_: Any) -> None:
+        # shutdown() waits for serve_forever() to return, so not on this (main) thread
+        stopping.set()
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    beat()
+    threading.Thread(target=heartbeat, name="heartbeat", daemon=True).start()
+    try:
+        httpd.serve_forever()
+    finally:
+        stopping.set()
+        httpd.server_close()  # waits for the requests in progress
+
+
+# -----------------------------
+# Parent
+# -----------------------------
+
+class Supervisor:
+    """Forks the workers and keeps the pool healthy; see the module docstring."""
+
+    def __init__(self, sock: socket.socket, args, snapshot: Optional[str], exported: bool):
+        self.sock = sock
+        self.args = args
+        self.board = WorkerBoard(2 * args.workers)  # room for two generations during a reload
+        self.snapshot = snapshot
+        self.exported = exported  # remove the file once no worker uses it
+        self.generation = 0
+        self.workers: Dict[int, int] = {}  # pid -> slot
+        self.retiring: Dict[int, float] = {}  # pid -> when it was asked to stop
+        self.previous: List[int] = []  # old generation, stopped once the new one is up
+        self.previous_snapshot: Optional[str] = None
+        self.progress: Dict[int, tuple] = {}  # pid -> (completed, since)
+        self.due: List[float] = []  # times at which a replacement worker is started
+        self.failures = 0
+        self.stopping = False
+        self._signals: List[int] = []
+
+    def _on_signal(self, signum: int, _frame) -> None:
+        self._signals.append(signum)
+
+    def spawn(self) -> Optional[int]:
+        slot = self.board.free_slot()
+        if slot is None:
+            # Both generations of a reload still running; try again shortly
+            self._schedule(1.0)
+            return None
+        self.board.clear(slot)
+        sys.stdout.flush()  # or the child prints the parent's buffered output again
+        pid = os.fork()
+        if pid == 0:
+            _worker_main(slot, self.generation, self.sock, self.board, self.args)
+        self.board.set(slot, pid=pid, generation=self.generation, started=time.time())
+        self.workers[pid] = slot
+        return pid
+
+    def run(self) -> None:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self._on_signal)
+        for _ in range(self.args.workers):
+            self.spawn()
+        while self.workers or not self.stopping:
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum == signal.SIGHUP and not self.stopping:
+                    self.reload()
+                elif signum != signal.SIGHUP:
+                    self.stop()
+            self._reap()
+            now = time.monotonic()
+            while self.due and self.due[0] <= now and not self.stopping:
+                self.due.pop(0)
+                self.spawn()
+            self._check()
+            time.sleep(0.2)
+        self._remove_previous_snapshot()
+        if self.exported and self.snapshot:
+            os.remove(self.snapshot)
+
+    def stop(self) -> None:
+        if self.stopping:
+            return
+        print(f"\n⏹️  Stopping {len(self.workers)} worker(s)...", flush=True)
+        self.stopping = True
+        self.sock.close()
+        self.due.clear()
+        self._retire(list(self.workers))
+
+    def _retire(self, pids: List[int]) -> None:
+        for pid in pids:
+            if pid in self.workers and pid not in self.retiring:
+                self.retiring[pid] = time.monotonic()
+                _kill(pid, signal.SIGTERM)
+
+    def reload(self) -> None:
+        """Serve a fresh export of the index: start a new generation, then drain the old one."""
+        import ingestion
+
+        print("🔄 Reloading: exporting the index...", flush=True)
+        try:
+            path = export_serving_snapshot(self.args.snapshot_dtype)
+        except Exception as e:
+            print(f"❌ Reload failed, keeping the current workers: {e!r}", flush=True)
+            return
+        if path is None:
+            print("❌ Reload failed, keeping the current workers: the index is empty", flush=True)
+            return
+        if self.exported:
+            self.previous_snapshot = self.snapshot
+        self.snapshot, self.exported = path, True
+        os.environ["RAGBOT_SERVING_SNAPSHOT"] = ingestion.SERVING_SNAPSHOT = path
+        ingestion.reload_retriever()  # forked workers start from this one
+
+        self.previous = [pid for pid in self.workers if pid not in self.retiring]
+        self.generation += 1
+        self.due.clear()
+        for _ in range(self.args.workers):
+            self.spawn()
+
+    def _remove_previous_snapshot(self) -> None:
+        if self.previous_snapshot and os.path.exists(self.previous_snapshot):
+            os.remove(self.previous_snapshot)
+        self.previous_snapshot = None
+
+    def _reap(self) -> None:
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.workers.pop(pid, None)
+            if slot is None:
+                continue  # the export helper
+            uptime = time.time() - self.board.get(slot, "started")
+            self.board.clear(slot)
+            self.progress.pop(pid, None)
+            if self.retiring.pop(pid, None) is not None or self.stopping:
+                continue
+            if pid in self.previous:
+                self.previous.remove(pid)  # being replaced anyway
+                continue
+            self.board.set(slot, restarts=self.board.get(slot, "restarts") + 1)
+            self.failures = self.failures + 1 if uptime < MIN_UPTIME_S else 0
+            delay = min(MAX_BACKOFF_S, 0.5 * 2 ** (self.failures - 1)) if self.failures else 0.0
+            print(
+                f"⚠️  Worker {pid} exited ({os.waitstatus_to_exitcode(status)}) after {uptime:.1f} s; "
+                f"restarting{f' in {delay:.1f} s' if delay else ''}",
+                flush=True,
+            )
+            self._schedule(delay)
+
+    def _schedule(self, delay: float) -> None:
+        self.due.append(time.monotonic() + delay)
+        self.due.sort()
+
+    def _check(self) -> None:
+        now, wall = time.monotonic(), time.time()
+        for pid, slot in list(self.workers.items()):
+            if pid in self.retiring:
+                if now - self.retiring[pid] > self.args.graceful_timeout:
+                    _kill(pid, signal.SIGKILL)
+                continue
+            heartbeat = self.board.get(slot, "heartbeat")
+            if not heartbeat:
+                if wall - self.board.get(slot, "started") > self.args.start_timeout:
+                    self._restart(pid, "did not start")
+                continue
+            if wall - heartbeat > self.args.heartbeat_timeout:
+                self._restart(pid, f"no heartbeat for {wall - heartbeat:.0f} s")
+                continue
+            completed = self.board.get(slot, "completed")
+            last, since = self.progress.get(pid, (None, now))
+            if completed != last or not self.board.get(slot, "in_flight"):
+                self.progress[pid] = (completed, now)
+            elif now - since > self.args.worker_timeout:
+                self._restart(pid, f"no request finished for {now - since:.0f} s")
+
+        if self.previous and all(
+            self.board.get(slot, "heartbeat") for pid, slot in self.workers.items() if pid not in self.previous
+        ):
+            # New generation is up: let the old one finish its requests and exit
+            print(f"✅ Generation {self.generation} serving; stopping {len(self.previous)} old worker(s)", flush=True)
+            self._retire(self.previous)
+            self.previous = []
+            self._remove_previous_snapshot()  # still mapped by the old workers until they exit
+
+    def _restart(self, pid: int, reason: str) -> None:
+        print(f"⚠️  Worker {pid} unhealthy ({reason}); killing it", flush=True)
+        _kill(pid, signal.SIGKILL)  # reaped and replaced by _reap()
+
+
+def _kill(pid: int, signum: int) -> None:
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="RAG Chatbot HTTP server with pre-forked worker processes",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__[__doc__.index("Examples:"):],
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--backlog", type=int, default=128, help="Connections the kernel queues for the workers")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Graph executions running at once, per worker")
+    parser.add_argument("--max-queue", type=int, default=16, help="Requests allowed to wait for a slot before 503, per worker")
+    parser.add_argument("--queue-timeout", type=float, default=30.0, help="Seconds a queued request waits before 503")
+    parser.add_argument("--snapshot", metavar="FILE", help="Serve this snapshot (ingestion.py --export-snapshot) instead of exporting the index")
+    parser.add_argument("--snapshot-dtype", choices=("float32", "float16"), default="float32", help="Vector precision of the exported snapshot")
+    parser.add_argument("--start-timeout", type=float, default=60.0, help="Restart a worker not serving this long after it was started")
+    parser.add_argument("--heartbeat-timeout", type=float, default=10.0, help="Restart a worker silent for this many seconds")
+    parser.add_argument("--worker-timeout", type=float, default=300.0, help="Restart a worker with requests in flight but none finished for this long")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0, help="Seconds a stopping worker gets to finish its requests")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    snapshot, exported = args.snapshot, False
+    if not OPENAI_AVAILABLE:
+        print("⚠️  OFFLINE MODE: OPENAI_API_KEY not set. Serving dummy answers.\n")
+    elif snapshot:
+        from indexing.snapshot import Snapshot
+
+        Snapshot(snapshot).verify()
+    else:
+        print("📦 Exporting the index for the workers...")
+        snapshot = export_serving_snapshot(args.snapshot_dtype)
+        if snapshot is None:
+            parser.exit(1, "❌ Nothing to serve: build the index with ingestion.py first.\n")
+        exported = True
+    if snapshot:
+        os.environ["RAGBOT_SERVING_SNAPSHOT"] = snapshot
+
+    # Imported only now: the retriever is built at import time, from the snapshot
+    import ingestion
+    import server  # noqa: F401  (compiled graph and clients, shared with the workers)
+
+    if OPENAI_AVAILABLE and ingestion.retriever is None:
+        parser.exit(1, f"❌ Could not open the serving snapshot {snapshot}.\n")
+
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    sock.setblocking(False)
+    print(
+        f"🚀 RAG Chatbot server listening on http://{args.host}:{sock.getsockname()[1]} "
+        f"({args.workers} workers, parent pid {os.getpid()})",
+        flush=True,
+    )
+    Supervisor(sock, args, snapshot, exported).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+rate_limit.py - Process-wide rate limiting for LLM and embedding calls
+
+Every provider call (the chains in graph/chains, OpenAIEmbeddings in
+ingestion.py) goes through one shared `limiter`, so concurrent grading,
+batch questions and ingestion are coordinated. The limiter is per model.
+
+Limits:
+  - Token buckets for requests/minute and tokens/minute. They are set with
+    RAGBOT_RATE_LIMITS="gpt-4=500:30000,text-embedding-3-small=3000:1000000"
+    (rpm:tpm; either may be empty). Models without an entry are not metered.
+  - An AIMD concurrency window. It grows by 1/window after every call that
+    finishes within RAGBOT_RATE_LATENCY_TARGET_MS. It shrinks by 10% on a
+    slower call and halves on a 429, at most once per second by default.
+
+Priority and retries:
+  - Interactive calls (questions, query embeddings) are admitted before
+    background calls (ingestion) waiting for the same model.
+  - 429s are retried here with exponential backoff, honouring Retry-After.
+    Transient failures (5xx, 408/409, timeouts, dropped connections) are
+    retried the same way, up to RAGBOT_RATE_TRANSIENT_RETRIES times (2, as
+    the OpenAI client does). Clients are therefore created with
+    max_retries=0: retries are coordinated instead of each client hammering
+    the endpoint on its own.
+
+Disable with RAGBOT_RATE_LIMIT=0.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from time import monotonic, perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from langchain_core.embeddings import Embeddings
+
+from token_usage import record_estimate
+
+T = TypeVar("T")
+
+INTERACTIVE, BACKGROUND = 0, 1
+
+RATE_LIMIT_ENABLED = os.getenv("RAGBOT_RATE_LIMIT", "1") != "0"
+RATE_LIMITS = os.getenv("RAGBOT_RATE_LIMITS", "")
+MAX_CONCURRENCY = int(os.getenv("RAGBOT_RATE_MAX_CONCURRENCY", "16"))
+INITIAL_CONCURRENCY = int(os.getenv("RAGBOT_RATE_INITIAL_CONCURRENCY", "4"))
+LATENCY_TARGET_MS = float(os.getenv("RAGBOT_RATE_LATENCY_TARGET_MS", "0")) or None
+MAX_RETRIES = int(os.getenv("RAGBOT_RATE_MAX_RETRIES", "6"))
+TRANSIENT_RETRIES = int(os.getenv("RAGBOT_RATE_TRANSIENT_RETRIES", "2"))
+# Provider clients leave retries to the limiter when it is on
+CLIENT_MAX_RETRIES = 0 if RATE_LIMIT_ENABLED else 2
+
+
+def parse_limits(text: str) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    """ "model=rpm:tpm,..." -> {model: (rpm, tpm)}; an empty value means unlimited."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        model, sep, values = item.partition("=")
+        if not sep:
+            raise ValueError(f"Bad rate limit {item!r}; expected model=rpm:tpm")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (float(rpm) if rpm else None, float(tpm) if tpm else None)
+    return limits
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) for metering before the call."""
+    return max(1, len(text) // 4)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None) or getattr(exc, "status", None)
+    return status == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Failures the OpenAI client would retry: server errors, timeouts, lost connections."""
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    if isinstance(status, int) and (status >= 500 or status in (408, 409)):
+        return True
+    # By name along the MRO: langchain_openai raises subclasses (OpenAITimeoutError)
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    return isinstance(exc, ConnectionError) or bool(names & {"APITimeoutError", "APIConnectionError", "InternalServerError"})
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers and headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute` / 60 per second up to `burst`. The default burst is
+    one second's worth, because providers enforce per-minute limits over
+    shorter windows.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now, possibly going into debt; returns seconds to wait before using it."""
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class ModelLimiter:
+    """Buckets, AIMD concurrency window and priority admission for one model."""
+
+    def __init__(
+        self,
+        model: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        initial_concurrency: int = INITIAL_CONCURRENCY,
+        latency_target_ms: Optional[float] = LATENCY_TARGET_MS,
+        max_retries: int = MAX_RETRIES,
+        transient_retries: int = TRANSIENT_RETRIES,
+        backoff_s: float = 0.5,
+        decrease_cooldown_s: float = 1.0,
+    ):
+        self.model = model
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.latency_target_ms = latency_target_ms
+        self.max_retries = max_retries
+        self.transient_retries = transient_retries
+        self.backoff_s = backoff_s
+        # One multiplicative decrease per burst of 429s, not one per rejected call
+        self.decrease_cooldown_s = decrease_cooldown_s
+        self.in_flight = 0
+        self.waiting = [0, 0]
+        self.calls = 0
+        self.throttled = 0
+        self.waited_s = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _admit(self, level: int, tokens: int) -> None:
+        start = perf_counter()
+        with self._cond:
+            self.waiting[level] += 1
+            try:
+                while self.in_flight >= int(self.limit) or (level == BACKGROUND and self.waiting[INTERACTIVE]):
+                    self._cond.wait()
+            finally:
+                self.waiting[level] -= 1
+            self.in_flight += 1
+            delay = max(
+                self.requests.reserve(1) if self.requests else 0.0,
+                self.tokens.reserve(tokens) if self.tokens and tokens else 0.0,
+            )
+        if delay:
+            time.sleep(delay)
+        with self._cond:
+            self.waited_s += perf_counter() - start
+
+    def _release(self, latency_s: float, throttled: bool) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+            now = monotonic()
+            if throttled:
+                self.throttled += 1
+                if now - self._last_decrease > self.decrease_cooldown_s:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+            elif self.latency_target_ms and latency_s * 1000 > self.latency_target_ms:
+                self.limit = max(1.0, self.limit * 0.9)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def call(self, fn: Callable[[], T], tokens: int = 0, level: int = INTERACTIVE) -> T:
+        failures = 0
+        for attempt in range(self.max_retries + 1):
+            self._admit(level, tokens)
+            start, throttled = perf_counter(), False
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                if is_rate_limited(e):
+                    throttled = True
+                elif is_transient(e) and failures < self.transient_retries:
+                    failures += 1
+                else:
+                    raise
+                wait = _retry_after(e)
+            finally:
+                self._release(perf_counter() - start, throttled)
+            time.sleep(wait if wait is not None else self.backoff_s * 2**attempt * random.uniform(0.5, 1.5))
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting_interactive": self.waiting[INTERACTIVE],
+                "waiting_background": self.waiting[BACKGROUND],
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "waited_s": round(self.waited_s, 3),
+            }
+
+
+class RateLimiter:
+    """Per-model ModelLimiters, created on first use."""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None, enabled: bool = True, **defaults: Any):
+        self.limits = dict(limits or {})
+        self.enabled = enabled
+        self.defaults = defaults
+        self._models: Dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model: str) -> ModelLimiter:
+        with self._lock:
+            if model not in self._models:
+                rpm, tpm = self.limits.get(model, (None, None))
+                self._models[model] = ModelLimiter(model, rpm, tpm, **self.defaults)
+            return self._models[model]
+
+    def call(self, model: str, fn: Callable[[], T], tokens: int = 0, level: int = INTERACTIVE) -> T:
+        if not self.enabled:
+            return fn()
+        return self.for_model(model).call(fn, tokens, level)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = list(self._models.values())
+        return {m.model: m.stats() for m in models}
+
+
+limiter = RateLimiter(parse_limits(RATE_LIMITS), enabled=RATE_LIMIT_ENABLED)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Embeddings whose calls go through the limiter: documents as background work, queries as interactive."""
+
+    def __init__(self, embeddings: Embeddings, model: str, rate_limiter: Optional[RateLimiter] = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.rate_limiter = rate_limiter or limiter
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.rate_limiter.call(
+            self.model,
+            lambda: self.embeddings.embed_documents(texts),
+            tokens=sum(estimate_tokens(t) for t in texts),
+            level=BACKGROUND,
+        )
+        # The embeddings client does not expose the usage the API reports
+        record_estimate("document_embedding", self.model, texts, "")
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.rate_limiter.call(
+            self.model, lambda: self.embeddings.embed_query(text), tokens=estimate_tokens(text), level=INTERACTIVE
+        )
+        record_estimate("query_embedding", self.model, text, "")
+        return vector
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+server.py - Long-running local HTTP server for RAG Chatbot
+
+Keeps the compiled graph, retriever and LLM clients warm between questions,
+so each question only pays for the graph execution itself. Identical
+in-flight questions are coalesced into one execution, and a concurrency
+limit with a bounded wait queue answers 503 when the server is overloaded.
+
+Endpoints:
+  GET  /health        status, in-flight / queued counts, counters
+  POST /query         {"question": "...", "filters": {...}, "speculative_web": true, "tenant": "acme",
+                       "deadline_s": 8}
+                      -> final answer as JSON; "degraded" lists the stages skipped to meet the deadline
+  POST /query/stream  {"question": "..."} -> NDJSON, one line per node, then the result
+  POST /ingest        {"paths": [...], "urls": [...], "rebuild": false, "tag": null, "tenant": null}
+
+To serve from several processes (one memory-mapped index shared by all),
+run prefork.py instead; it takes the same options plus --workers.
+
+Examples:
+  python server.py --port 8000 --max-concurrency 4 --max-queue 16
+  python server.py --watch docs    # re-index docs/ as files change, answers see it at once
+  curl -s localhost:8000/query -d '{"question": "what is agent memory?"}'
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_AVAILABLE = bool(os.getenv("OPENAI_API_KEY"))
+
+import ingestion
+from graph.chains.llm_cache import get_llm_cache
+from graph.deadline import DEFAULT_DEADLINE_S, Deadline
+from graph.graph import app
+from graph.speculation import speculation_scope
+from indexing import build_where, validate_tenant
+from rate_limit import limiter
+from token_usage import track_usage
+
+
+class Overloaded(Exception):
+    """All concurrency slots are busy and the wait queue is full (or the wait timed out)."""
+
+
+class AdmissionControl:
+    """
+    Allow at most `max_concurrency` graph executions at once.
+
+    Up to `max_queue` further callers wait (for at most `queue_timeout`
+    seconds) for a free slot; anything beyond that is rejected immediately.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 16, queue_timeout: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            if self.active < self.max_concurrency:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded("server at capacity")
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.active >= self.max_concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise Overloaded("timed out waiting for a free slot")
+                    self._cond.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class Coalescer:
+    """
+    Share one execution between identical in-flight requests.
+
+    The first caller for a key runs the work; callers arriving while it is
+    still running wait for and return the same result (or exception).
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def run(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+def _graph_input(payload: Dict[str, Any]) -> Dict[str, Any]:
+    graph_input = {"question": payload["question"]}
+    if payload.get("filters"):
+        build_where(payload["filters"])  # unknown keys, bad dates -> ValueError (400)
+        graph_input["filters"] = payload["filters"]
+    if "speculative_web" in payload:
+        graph_input["speculative_web"] = bool(payload["speculative_web"])
+    if payload.get("tenant") is not None:
+        graph_input["tenant"] = validate_tenant(payload["tenant"])
+    deadline_s = payload.get("deadline_s", DEFAULT_DEADLINE_S)
+    if deadline_s is not None:
+        # Counted from now: time spent waiting for a slot is part of the budget
+        if isinstance(deadline_s, bool) or not isinstance(deadline_s, (int, float)):
+            raise ValueError("'deadline_s' must be a number of seconds")
+        graph_input["deadline"] = Deadline(deadline_s)
+    return graph_input
+
+
+def _coalesce_key(payload: Dict[str, Any]) -> str:
+    graph_input = _graph_input(payload)
+    graph_input["question"] = _normalize_question(graph_input["question"])
+    if "deadline" in graph_input:
+        graph_input["deadline"] = graph_input["deadline"].budget_s
+    return json.dumps(graph_input, sort_keys=True, default=str)
+
+
+def _serialize_documents(documents) -> list:
+    return [
+        {"page_content": d.page_content, "metadata": dict(d.metadata or {})}
+        for d in documents or []
+    ]
+
+
+def serialize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    deadline = result.get("deadline")
+    return {
+        "question": result.get("question"),
+        "generation": result.get("generation", ""),
+        "from_vector": bool(result.get("from_vector", False)),
+        "documents": _serialize_documents(result.get("documents")),
+        "trace": list(result.get("trace") or []),
+        "usage": result.get("usage"),
+        "degraded": list(deadline.degraded) if deadline else [],
+        "deadline": deadline.report() if deadline else None,
+    }
+
+
+class _Stream:
+    """Event iterator that holds an admission slot until closed."""
+
+    def __init__(self, events: Iterator[Dict[str, Any]], release: Callable[[], None]):
+        self._events = events
+        self._release = release
+        self._closed = False
+
+    def __iter__(self):
+        return self._events
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._events.close()
+            self._release()
+
+
+class QueryService:
+    """
+    Graph execution shared by all handler threads: admission control,
+    coalescing, ingestion. `status` adds fields to /health; without
+    `allow_ingest`, /ingest answers 409 (pre-fork workers).
+    """
+
+    def __init__(
+        self,
+        graph=None,
+        max_concurrency: int = 4,
+        max_queue: int = 16,
+        queue_timeout: float = 30.0,
+        allow_ingest: bool = True,
+        status: Callable[[], Dict[str, Any]] | None = None,
+    ):
+        self.graph = graph if graph is not None else app
+        self.admission = AdmissionControl(max_concurrency, max_queue, queue_timeout)
+        self.coalescer = Coalescer()
+        self.started = time.time()
+        self.allow_ingest = allow_ingest
+        self.status = status
+
+    def _execute(self, graph_input: Dict[str, Any]) -> Dict[str, Any]:
+        with self.admission.slot(), track_usage() as usage, speculation_scope(graph_input) as graph_input:
+            result = self.graph.invoke(graph_input)
+        return {**result, "usage": usage.report()}
+
+    def query(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        graph_input = _graph_input(payload)
+        result, shared = self.coalescer.run(_coalesce_key(payload), lambda: self._execute(graph_input))
+        return {**serialize_result(result), "coalesced": shared}
+
+    def stream(self, payload: Dict[str, Any]) -> _Stream:
+        """
+        Reserve a slot (raising Overloaded before anything is sent), then
+        return per-node events followed by the final result. The caller must
+        close() the stream to free the slot. Streams are not coalesced.
+        """
+        self.admission.acquire()
+
+        def events():
+            final: Dict[str, Any] = {}
+            with track_usage() as usage, speculation_scope(_graph_input(payload)) as graph_input:
+                for mode, chunk in self.graph.stream(graph_input, stream_mode=["updates", "values"]):
+                    if mode == "values":
+                        final = chunk
+                        continue
+                    for node, update in chunk.items():
+                        yield {"event": "node", "node": node, "trace": list((update or {}).get("trace") or [])}
+            yield {"event": "result", **serialize_result({**final, "usage": usage.report()})}
+
+        return _Stream(events(), self.admission.release)
+
+    def ingest(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.allow_ingest:
+            raise RuntimeError(
+                "ingestion is disabled in pre-fork workers; run ingestion.py, "
+                "then send SIGHUP to the prefork.py parent to serve the new index"
+            )
+        # Shared with the --watch thread (see ingestion.ingest_lock)
+        if not ingestion.ingest_lock.acquire(blocking=False):
+            raise RuntimeError("ingestion already running")
+        try:
+            start = time.perf_counter()
+            ingestion.build_index(
+                paths=payload.get("paths"),
+                urls=payload.get("urls"),
+                rebuild=bool(payload.get("rebuild", False)),
+                tag=payload.get("tag"),
+                tenant=payload.get("tenant"),
+            )
+            ingestion.reload_retriever(payload.get("tenant"))
+            return {"status": "ok", "seconds": round(time.perf_counter() - start, 3)}
+        finally:
+            ingestion.ingest_lock.release()
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "offline": not OPENAI_AVAILABLE,
+            "retriever": ingestion.retriever is not None,
+            "uptime_s": round(time.time() - self.started, 1),
+            "in_flight": self.admission.active,
+            "queued": self.admission.waiting,
+            "max_concurrency": self.admission.max_concurrency,
+            "max_queue": self.admission.max_queue,
+            "executions": self.admission.admitted,
+            "coalesced": self.coalescer.coalesced,
+            "rejected": self.admission.rejected,
+            "tenants": ingestion.tenant_retrievers.stats(),
+            "embedding_cache": (
+                ingestion.query_embedding_cache.stats() if ingestion.query_embedding_cache else None
+            ),
+            "llm_cache": get_llm_cache().stats() if get_llm_cache() else None,
+            "rate_limits": limiter.stats(),
+            **(self.status() if self.status else {}),
+        }
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "RAGBot/0.1"
+
+    @property
+    def service(self) -> QueryService:
+        return self.server.service
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path not in ("/query", "/query/stream", "/ingest"):
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        try:
+            payload = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"invalid JSON body: {e}"})
+            return
+
+        if path == "/ingest":
+            self._ingest(payload)
+            return
+        if not isinstance(payload.get("question"), str) or not payload["question"].strip():
+            self._send_json(400, {"error": "'question' (non-empty string) is required"})
+            return
+        try:
+            _graph_input(payload)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            if path == "/query":
+                self._send_json(200, self.service.query(payload))
+            else:
+                self._stream(self.service.stream(payload))
+        except Overloaded as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def _ingest(self, payload: Dict[str, Any]) -> None:
+        try:
+            self._send_json(200, self.service.ingest(payload))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except RuntimeError as e:
+            self._send_json(409, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("expected a JSON object")
+        return body
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] | None = None) -> None:
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, events: _Stream) -> None:
+        # HTTP/1.0 response without Content-Length: the body ends when the
+        # connection closes, so each NDJSON line can be flushed as produced.
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for event in events:
+                self.wfile.write(json.dumps(event, default=str).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except Exception as e:
+            self.wfile.write(json.dumps({"event": "error", "error": str(e)}).encode("utf-8") + b"\n")
+        finally:
+            events.close()
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8000, service: QueryService | None = None) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = service or QueryService()
+    return server
+
+
+class SharedSocketServer(ThreadingHTTPServer):
+    """
+    Serves connections from a listening socket shared with other processes
+    (the workers of prefork.py). The socket is non-blocking, so when another
+    process accepted a connection first, this accept() fails and is ignored.
+    While all of its graph slots are busy, the server waits `handoff_s`
+    before accepting, so that idle workers take new connections first.
+    """
+
+    # server_close() waits for the requests in progress (graceful stop)
+    daemon_threads = False
+
+    def __init__(self, sock: socket.socket, service: QueryService, handoff_s: float = 0.02):
+        super().__init__(sock.getsockname(), RequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.server_port = sock.getsockname()[1]
+        self.service = service
+        self.handoff_s = handoff_s
+
+    def get_request(self):
+        admission = self.service.admission
+        if admission.active >= admission.max_concurrency:
+            time.sleep(self.handoff_s)
+        return super().get_request()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="RAG Chatbot HTTP server",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python server.py --port 8000
+  curl -s localhost:8000/query -d '{"question": "what is agent memory?"}'
+  curl -sN localhost:8000/query/stream -d '{"question": "what is agent memory?"}'
+        """,
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Graph executions running at once")
+    parser.add_argument("--max-queue", type=int, default=16, help="Requests allowed to wait for a slot before 503")
+    parser.add_argument("--queue-timeout", type=float, default=30.0, help="Seconds a queued request waits before 503")
+    parser.add_argument("--warmup", action="store_true", help="Run one question at startup to warm clients")
+    parser.add_argument("--watch", nargs="+", metavar="PATH", help="Keep the index in sync with these paths while serving")
+    args = parser.parse_args()
+
+    service = QueryService(
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        queue_timeout=args.queue_timeout,
+    )
+    if not OPENAI_AVAILABLE:
+        print("⚠️  OFFLINE MODE: OPENAI_API_KEY not set. Serving dummy answers.\n")
+    if args.warmup:
+        print("🔥 Warming up...")
+        service.query({"question": "warmup"})
+
+    stop_watching = threading.Event()
+    if args.watch:
+        # Same process as the queries: each applied batch is visible at once
+        threading.Thread(
+            target=ingestion.watch_index, args=(args.watch,), kwargs={"stop": stop_watching}, name="watch", daemon=True
+        ).start()
+
+    server = make_server(args.host, args.port, service)
+    print(f"🚀 RAG Chatbot server listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrupted by user")
+    finally:
+        stop_watching.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -130,4 +130,85 @@ def test_router_to_websearch() -> None:
 
     question = "how to make pizza"
     res: RouteQuery = question_router.invoke({"question": question})
-    assert res.datasource == "websearch"
\ No newline at end of file
+    assert res.datasource == "websearch"
+
+
+def test_llm_response_cache_replays_deterministic_calls(tmp_path, monkeypatch) -> None:
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import RunnableLambda
+
+    from graph.chains import llm_cache
+    from graph.chains.llm_cache import CachedChain, LLMResponseCache, bypass_llm_cache
+
+    class FakeChat(FakeListChatModel):
+        temperature: float = 0.0
+
+        def with_structured_output(self, schema, include_raw=False, **kwargs):
+            def structured(_):
+                message = self.invoke("x")
+                parsed = schema(binary_score=message.content)
+                return {"raw": message, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+
+            return RunnableLambda(structured)
+
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), max_entries=2)
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+    prompt = ChatPromptTemplate.from_messages([("human", "{question}")])
+
+    generation = CachedChain("generation", prompt, FakeChat(responses=["a", "b", "c"]), parser=StrOutputParser())
+    assert generation.invoke({"question": "q1"}) == "a"
+    assert generation.invoke({"question": "q1"}) == "a"  # replayed, the model is not called
+    with bypass_llm_cache():
+        assert generation.invoke({"question": "q1"}) == "b"
+
+    grader = CachedChain("retrieval_grader", prompt, FakeChat(responses=["yes", "no"]), schema=GradeDocuments)
+    assert grader.invoke({"question": "q1"}).binary_score == "yes"  # schema is part of the key
+    assert grader.invoke({"question": "q1"}).binary_score == "yes"
+    assert generation.invoke({"question": "q2"}) == "c"
+
+    stats = cache.stats()
+    assert stats["entries"] == 2  # the least recently used entry was evicted
+    assert (stats["chains"]["generation"]["hits"], stats["chains"]["generation"]["misses"]) == (1, 2)
+    assert stats["chains"]["retrieval_grader"]["hits"] == 1
+
+
+def test_deadline_is_sent_as_the_request_timeout() -> None:
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import pytest
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_openai import ChatOpenAI
+
+    from graph.chains.llm_cache import CachedChain
+    from graph.deadline import Deadline, DeadlineExceeded, call_budget
+
+    class SlowEndpoint(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            time.sleep(3)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowEndpoint)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        llm = ChatOpenAI(
+            model="gpt-4o-mini", api_key="sk-test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0
+        )
+        prompt = ChatPromptTemplate.from_messages([("human", "{question}")])
+        for chain in (
+            CachedChain("generation", prompt, llm, parser=StrOutputParser()),
+            CachedChain("retrieval_grader", prompt, llm, schema=GradeDocuments),
+        ):
+            start = time.perf_counter()
+            with pytest.raises(DeadlineExceeded), call_budget(Deadline(0.6)):
+                chain.invoke({"question": "q"})
+            assert time.perf_counter() - start < 1.5  # the client gave up; no call left running
+    finally:
+        server.shutdown()
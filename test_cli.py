@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from cli import ChatSession, _run_command
+from graph.graph import app
+from loadtest import StubProfile, stub_providers
+
+
+def test_chat_session_caches_chunks_and_web_results(capsys) -> None:
+    profile = StubProfile(time_scale=0.01, web_fraction=0.0)
+    with stub_providers(profile):
+        with ChatSession(app) as session:
+            first, _ = session.ask("what is agent memory?")
+            second, _ = session.ask("What is  agent memory?")
+            assert second["generation"]
+            assert any("chunk_cache=miss" in line for line in first["trace"])
+            assert any("chunk_cache=hit" in line for line in second["trace"])
+            assert session.chunk_cache.hits == 1
+            assert [node for node, _ in session.last_timings][-1] == "generate"
+
+            assert set(session.cache_stats()) >= {"chunks", "web"}
+
+            assert _run_command(session, "/filter tag=manual,faq")
+            assert session.filters == {"tag": ["manual", "faq"]}
+            assert _run_command(session, "/timings")
+            assert _run_command(session, "/history")
+            assert _run_command(session, "/usage")
+            assert session.usage.report()["calls"] == first["usage"]["calls"] + second["usage"]["calls"]
+            assert "what is agent memory?" in capsys.readouterr().out
+            assert not _run_command(session, "/quit")
+        import ingestion
+
+        assert ingestion.retriever.__class__.__name__ == "_StubRetriever"
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import pytest
+
+from graph.graph import app
+from graph.nodes.web_search import discard_speculative_search, speculation_running, start_speculative_search
+from graph.speculation import speculation_scope
+from graph.state import TraceBuffer, append_documents, append_trace
+
+
+def test_trace_reducer_is_bounded_and_does_not_mutate() -> None:
+    current = TraceBuffer(["a", "b"], maxlen=3)
+    merged = append_trace(current, ["c", "d"])
+    assert list(merged) == ["b", "c", "d"]
+    assert list(current) == ["a", "b"]
+    assert list(append_trace(None, "x")) == ["x"]
+
+
+def test_documents_reducer_appends_deltas() -> None:
+    assert append_documents(["a"], ["b"]) == ["a", "b"]
+    assert append_documents(["a"], []) == ["a"]
+
+
+def test_offline_graph_run_has_no_duplicate_state() -> None:
+    result = app.invoke({"question": "what is agent memory?"})
+    trace = list(result["trace"])
+    assert trace.count("Generated answer") == 1
+    assert len(result["documents"]) == 1
+
+
+def test_invalid_filters_fail_instead_of_matching_nothing() -> None:
+    from graph.nodes.retrieve import retrieve
+
+    with pytest.raises(ValueError, match="sorce"):
+        retrieve({"question": "q", "filters": {"sorce": "a.md"}})
+
+
+def test_speculative_web_search_is_used_or_discarded() -> None:
+    from loadtest import StubProfile, stub_providers
+
+    question = {"question": "what is agent memory?", "speculative_web": True}
+    for irrelevant, expected in ((1.0, "Speculative web search used"), (0.0, "1 extra web call")):
+        profile = StubProfile(time_scale=0.01, web_fraction=0.0, irrelevant=irrelevant, low_confidence=1.0, regenerate=0.0)
+        with stub_providers(profile), speculation_scope(question) as graph_input:
+            trace = list(app.invoke(graph_input)["trace"])
+        assert any(line.startswith("Speculative web search running (router confidence 0.30)") for line in trace)
+        assert any(expected in line for line in trace), trace
+
+
+def test_speculations_belong_to_their_request() -> None:
+    state = {"question": "same question", "speculative_web": True}
+    with speculation_scope(state) as first, speculation_scope(state) as second:
+        assert start_speculative_search(first, "first") and start_speculative_search(second, "second")
+        assert not start_speculative_search(first, "again")
+        # Another request discarding its search leaves this one running
+        assert "second" in discard_speculative_search(second)
+        assert speculation_running(first) == "first" and speculation_running(second) is None
+        handle = first["speculation"]
+    # Ending the request discards what it left and refuses new searches
+    assert handle.reason is None and not handle.start(lambda: None, reason="late")
+    assert not start_speculative_search(state, "no handle")
+
+
+def test_early_exit_grading_policies(monkeypatch) -> None:
+    import importlib
+
+    from loadtest import StubProfile, stub_providers
+
+    grade_module = importlib.import_module("graph.nodes.grade_documents")
+    cases = [
+        # (policy, stop after N relevant, chance irrelevant, expected trace, documents kept before web/generate)
+        ("stop-on-irrelevant", 0, 1.0, "3 grader call(s) skipped", 0),
+        ("overlap", 0, 1.0, "Speculative web search used (grader found an irrelevant doc)", 0),
+        ("all", 2, 0.0, "2 grader call(s) skipped", 2),
+    ]
+    for policy, stop_after, irrelevant, expected, kept in cases:
+        monkeypatch.setattr(grade_module, "GRADE_POLICY", policy)
+        monkeypatch.setattr(grade_module, "GRADE_STOP_AFTER_RELEVANT", stop_after)
+        profile = StubProfile(time_scale=0.01, web_fraction=0.0, irrelevant=irrelevant, regenerate=0.0)
+        with stub_providers(profile), speculation_scope({"question": "what is agent memory?"}) as graph_input:
+            result = app.invoke(graph_input)
+        trace = list(result["trace"])
+        assert any(expected in line for line in trace), trace
+        stub_docs = [d for d in result["documents"] if d.page_content.startswith("Stub chunk")]
+        assert len(stub_docs) == kept
+
+
+def test_token_usage_is_attributed_per_node_and_aggregated() -> None:
+    from loadtest import StubProfile, stub_providers
+    from token_usage import UsageRecorder, track_usage
+
+    profile = StubProfile(time_scale=0.01, web_fraction=0.0, irrelevant=0.0, regenerate=0.0)
+    session = UsageRecorder()
+    with stub_providers(profile):
+        for _ in range(2):
+            with track_usage() as usage:
+                app.invoke({"question": "what is agent memory?"})
+            session.merge(usage.report())
+
+    report = usage.report()
+    assert report["chains"]["retrieval_grader"]["calls"] == profile.k
+    assert report["nodes"]["route"]["calls"] == 1
+    # The hallucination check runs inside the generate task
+    assert report["nodes"]["generate"]["calls"] == 2
+    assert report["estimated_calls"] == report["calls"]
+    assert report["prompt_tokens"] > 0 and report["cost_usd"] > 0
+    assert session.report()["total_tokens"] == 2 * report["total_tokens"]
+
+
+def test_deadline_degrades_and_marks_the_result(monkeypatch) -> None:
+    import time
+
+    from graph import deadline as deadline_module
+    from graph.deadline import Deadline, DeadlineExceeded, call_budget, call_timeout
+    from loadtest import StubProfile, stub_providers
+
+    costs = deadline_module.STAGE_COST_S
+    for stage in costs:
+        monkeypatch.setitem(costs, stage, 0.0)
+    monkeypatch.setitem(costs, "websearch", 60.0)
+    monkeypatch.setitem(costs, "check", 60.0)
+    profile = StubProfile(time_scale=0.01, web_fraction=0.0, irrelevant=1.0, regenerate=0.0)
+    with stub_providers(profile):
+        result = app.invoke({"question": "what is agent memory?", "deadline": Deadline(30)})
+        assert result["deadline"].degraded == [
+            "web search skipped: answered from the current context",
+            "hallucination check skipped",
+        ]
+        assert not any(line.startswith("Web search") for line in result["trace"])
+
+        monkeypatch.setitem(costs, "grade", 60.0)
+        result = app.invoke({"question": "what is agent memory?", "deadline": Deadline(30)})
+    assert result["deadline"].degraded[0] == f"grading stopped: {profile.k} of {profile.k} documents kept ungraded"
+    assert len(result["documents"]) == profile.k
+
+    assert call_timeout() is None
+    with call_budget(Deadline(0.6)):
+        assert 0 < call_timeout() <= 0.6
+        time.sleep(0.65)
+        with pytest.raises(DeadlineExceeded):
+            call_timeout()
+
+    # A web search still running at the deadline is cancelled, not waited for
+    from concurrent.futures import Future
+
+    from graph.nodes.web_search import _wait
+
+    search = Future()
+    with pytest.raises(DeadlineExceeded):
+        _wait(search, Deadline(0.1))
+    assert search.cancelled()
@@ -0,0 +1,417 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from indexing.adaptive import choose_k
+from indexing.embedding_cache import CachedQueryEmbeddings
+from indexing.jobs import IngestJob, read_active, write_active
+from indexing.maintenance import index_stats, plan_cleanup
+from indexing.mapped import MappedIndex
+from indexing.metadata import build_where, matches, normalize_metadata
+from indexing.parse_cache import ParsedDocumentCache, file_sha256
+from indexing.pdf import PdfExtractor, loader_version
+from indexing.mmr import mmr_select
+from indexing.profiling import StageProfiler
+from indexing.quantization import QuantizedIndex, dequantize, quantize
+from indexing.sharding import ShardedSearcher, shard_for
+from indexing.snapshot import Snapshot, write_snapshot
+from indexing.tenants import TenantPool, validate_tenant
+from indexing.watch import InotifyWatcher, PollingWatcher, static_prefix, watch_files
+
+
+def _vectors(n: int = 200, dim: int = 64, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_int8_roundtrip_error_is_small() -> None:
+    v = _vectors()
+    codes, scales = quantize(v, "int8")
+    assert codes.dtype == np.int8
+    assert np.abs(dequantize(codes, scales) - v).max() < 0.01
+
+
+def test_quantized_index_save_load_and_rescore(tmp_path) -> None:
+    v = _vectors()
+    texts = [f"chunk {i}" for i in range(len(v))]
+    index = QuantizedIndex.build(v, texts, [{"i": i} for i in range(len(v))], mode="int8", dim=16)
+    index.save(tmp_path)
+
+    loaded = QuantizedIndex.load(tmp_path)
+    assert len(loaded) == len(v)
+    assert loaded.resident_bytes < v.nbytes / 3
+
+    hits = loaded.search(v[7], k=3, rescore_k=20)
+    assert hits[0].document.page_content == "chunk 7"
+    assert hits[0].document.metadata == {"i": 7}
+    assert abs(hits[0].score - 1.0) < 1e-5
+
+
+def test_mmr_prefers_new_content_over_near_duplicates() -> None:
+    base = _vectors(3, 16, seed=1)
+    # candidates 0-2 are near-copies of one passage, 3 is a different one
+    cands = np.stack([base[0], base[0] + 0.01, base[0] - 0.01, base[1]])
+    relevance = np.array([0.9, 0.89, 0.88, 0.6])
+
+    assert mmr_select(relevance, cands, k=2, lambda_mult=0.5) == [0, 3]
+    assert mmr_select(relevance, cands, k=4, lambda_mult=0.5, dedup_threshold=0.95) == [0, 3]
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+
+def test_query_embedding_cache_hits_and_persists(tmp_path) -> None:
+    inner = _CountingEmbeddings()
+    path = str(tmp_path / "cache.sqlite")
+    cache = CachedQueryEmbeddings(inner, "m", max_entries=2, path=path)
+
+    assert cache.embed_query_with_info("What is  memory?")[1]["embed_cache"] == "miss"
+    vector, info = cache.embed_query_with_info("what is memory?")
+    assert info["embed_cache"] == "hit" and vector == [16.0, 1.0]
+    assert inner.calls == 1
+    assert cache.stats()["hits"] == 1
+
+    reopened = CachedQueryEmbeddings(inner, "m", path=path)
+    assert reopened.embed_query_with_info("what is memory?")[1]["embed_cache"] == "hit"
+    assert CachedQueryEmbeddings(inner, "other-model", path=path).embed_query_with_info("what is memory?")[1]["embed_cache"] == "miss"
+
+    # The file holds at most max_entries too; the least recently used go first
+    bounded = CachedQueryEmbeddings(inner, "m", max_entries=2, path=path)
+    bounded.embed_query("another question")
+    assert bounded.stats()["disk_entries"] == 2
+    assert CachedQueryEmbeddings(inner, "m", path=path).embed_query_with_info("what is memory?")[1]["embed_cache"] == "miss"
+
+
+def test_choose_k_cuts_at_gap_ratio_and_bounds() -> None:
+    assert choose_k([0.9, 0.7, 0.69], min_k=1, max_k=6) == (1, "score_gap")
+    assert choose_k([0.9, 0.89, 0.88, 0.8], min_k=1, max_k=6, gap=None) == (3, "relative_threshold")
+    assert choose_k([0.9, 0.7], min_k=2, max_k=6) == (2, "exhausted")
+    assert choose_k([0.9] * 10, min_k=1, max_k=4) == (4, "max_k")
+
+
+def test_metadata_filters_match_normalized_metadata() -> None:
+    md = normalize_metadata({"source": "./docs/manuals/acme.pdf", "page": 3}, "pdf", 1_700_000_000, tag="acme")
+    assert md["source"] == "docs/manuals/acme.pdf"
+    assert md["path_1"] == "docs" and md["path_2"] == "docs/manuals"
+
+    where = build_where({"path_prefix": "docs/manuals/", "source_type": ["pdf", "md"], "tag": "acme"})
+    assert where == {"$and": [{"source_type": {"$in": ["pdf", "md"]}}, {"tag": "acme"}, {"path_2": "docs/manuals"}]}
+    assert matches(md, where)
+    assert not matches(md, build_where({"ingested_after": 1_800_000_000}))
+    assert build_where({}) is None
+
+
+def test_sharded_search_matches_single_index() -> None:
+    v = _vectors(300)
+    sources = [f"doc-{i % 40}.md" for i in range(len(v))]
+    owner = np.array([shard_for(s, 3) for s in sources])
+    assert [shard_for(s, 3) for s in sources] == owner.tolist()  # stable across calls
+    assert len(set(owner.tolist())) == 3
+
+    def build(rows):
+        return QuantizedIndex.build(v[rows], [""] * len(rows), [{}] * len(rows), mode="float32", ids=[str(i) for i in rows])
+
+    single = build(np.arange(len(v)))
+    sharded = ShardedSearcher([build(np.flatnonzero(owner == i)) for i in range(3)])
+    try:
+        for q in v[:10]:
+            expected = [h.document.id for h in single.search(q, k=5)]
+            assert [h.document.id for h in sharded.search(q, k=5)] == expected
+    finally:
+        sharded.close()
+
+
+def test_snapshot_roundtrip_and_checksum(tmp_path) -> None:
+    v = _vectors(50)
+    path = tmp_path / "index.snap"
+    ids = [f"id-{i}" for i in range(len(v))]
+    texts = [f"chunk {i} \u00e9" for i in range(len(v))]
+    write_snapshot(path, ids, texts, [{"page": i} for i in range(len(v))], v, model="test-model")
+
+    snapshot = Snapshot(path)
+    snapshot.verify()
+    assert snapshot.model == "test-model" and len(snapshot) == 50
+    assert isinstance(snapshot.vectors, np.memmap)
+    assert np.array_equal(snapshot.vectors, v)
+    assert snapshot.ids == ids and snapshot.texts == texts
+    assert snapshot.metadatas[3] == {"page": 3}
+
+    data = bytearray(path.read_bytes())
+    data[-10] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="checksum"):
+        Snapshot(path).verify()
+
+
+def test_mapped_index_matches_exact_search(tmp_path) -> None:
+    v = _vectors(300) * np.linspace(0.5, 2.0, 300, dtype=np.float32)[:, None]  # stored vectors need not be unit length
+    sources = [f"doc-{i % 3}.md" for i in range(len(v))]
+    path = tmp_path / "serving.snap"
+    write_snapshot(path, [str(i) for i in range(len(v))], [f"chunk {i}" for i in range(len(v))], [{"source": s} for s in sources], v, "m", dtype="float16")
+
+    index = MappedIndex(path)
+    exact = QuantizedIndex.build(v, [""] * len(v), [{"source": s} for s in sources], mode="float32", ids=[str(i) for i in range(len(v))])
+    assert isinstance(index.vectors, np.memmap) and index.resident_bytes == 4 * len(v)
+    for q in v[:10]:
+        assert [h.document.id for h in index.search(q, k=5)] == [h.document.id for h in exact.search(q, k=5)]
+
+    hit = index.search(v[4], k=1, with_embeddings=True)[0]
+    assert (hit.document.page_content, hit.document.metadata) == ("chunk 4", {"source": "doc-1.md"})
+    assert abs(hit.score - 1.0) < 1e-3 and hit.embedding.shape == (64,)
+    filtered = index.search(v[4], k=200, where={"source": "doc-2.md"})
+    assert len(filtered) == 100 and {h.document.metadata["source"] for h in filtered} == {"doc-2.md"}
+    assert index.search(v[4], k=3, where={"source": "missing.md"}) == []
+
+
+def test_mapped_index_filters_on_columns(tmp_path, monkeypatch) -> None:
+    v = _vectors(60)
+    metadatas = [
+        normalize_metadata({"source": f"docs/{'a' if i % 2 else 'b'}/{i % 5}.md"}, "md", 1000 + i % 3, tag="x" if i % 4 == 0 else None)
+        for i in range(len(v))
+    ]
+    path = tmp_path / "serving.snap"
+    write_snapshot(path, [str(i) for i in range(len(v))], [""] * len(v), metadatas, v, "m")
+    clauses = [
+        build_where({"source": ["docs/a/1.md", "docs/b/2.md"], "tag": "x"}),
+        build_where({"path_prefix": "docs/a", "ingested_after": 1001}),
+        {"$or": [{"tag": {"$ne": "x"}}, {"source_type": "pdf"}]},
+        {"tag": {"$nin": ["x"]}},
+    ]
+    expected = [[i for i, md in enumerate(metadatas) if matches(md, where)] for where in clauses]
+
+    index = MappedIndex(path)
+    with monkeypatch.context() as m:
+        m.setattr(Snapshot, "metadatas", property(lambda self: pytest.fail("decoded every row")))
+        assert [index.rows_matching(where).tolist() for where in clauses] == expected
+    # Other keys fall back to the metadata
+    assert index.rows_matching({"page": 1}).tolist() == []
+
+
+def test_ingest_job_resumes_after_last_committed_batch(tmp_path) -> None:
+    chunks = [Document(page_content=f"chunk {i}", metadata={"source": "a.md"}) for i in range(10)]
+    job = IngestJob.create(tmp_path / "job", chunks, batch_size=4, job_id="j1", target="col")
+    job.commit(0, np.ones((4, 3)))
+    job.commit(1, np.full((4, 3), 2.0))
+
+    resumed = IngestJob.load(tmp_path / "job")
+    docs = resumed.chunks()
+    assert [d.id for d in docs[:2]] == ["j1-0", "j1-1"]
+    assert [(b, len(part)) for b, part in resumed.pending(docs)] == [(2, 2)]
+    resumed.commit(2, np.zeros((2, 3)))
+    assert resumed.vectors()[:, 0].tolist() == [1.0] * 4 + [2.0] * 4 + [0.0] * 2
+
+    assert read_active(tmp_path) is None
+    write_active(tmp_path, "col-j1", shards=2, storage="int8")
+    assert read_active(tmp_path) == {"collection": "col-j1", "shards": 2, "storage": "int8"}
+
+
+def test_stage_profiler_accumulates_repeated_stages(tmp_path) -> None:
+    profiler = StageProfiler()
+    with profiler.run():
+        for _ in range(3):
+            with profiler.stage("embed", items=10):
+                blob = bytearray(2_000_000)
+        with profiler.stage("write"):
+            pass
+    del blob
+    report = profiler.report()
+    assert report["stages"]["embed"]["calls"] == 3
+    assert report["stages"]["embed"]["items"] == 30
+    assert report["stages"]["embed"]["peak_alloc_bytes"] >= 2_000_000
+    assert report["wall_s"] >= report["stages"]["embed"]["wall_s"]
+    profiler.write_json(str(tmp_path / "profile.json"), chunks=30)
+    assert "embed" in profiler.format_table()
+
+    disabled = StageProfiler(enabled=False)
+    with disabled.run(), disabled.stage("embed", items=1):
+        pass
+    assert disabled.report()["stages"] == {}
+
+
+def test_tenant_pool_evicts_lru_over_memory_budget() -> None:
+    opened, closed = [], []
+    sizes = {"a": 40, "b": 40, "c": 40, "big": 500}
+
+    def open_tenant(tenant):
+        opened.append(tenant)
+        return f"retriever-{tenant}"
+
+    pool = TenantPool(open_tenant, lambda t, _: sizes[t], close_fn=closed.append, max_bytes=100)
+    for tenant in ("a", "b", "a"):
+        with pool.lease(tenant) as retriever:
+            assert retriever == f"retriever-{tenant}"
+    assert opened == ["a", "b"]
+
+    with pool.lease("c"):  # 120 bytes open: "b" is least recently used
+        pass
+    assert closed == ["retriever-b"] and "a" in pool and "c" in pool
+
+    # An evicted entry still in use is closed when its lease ends
+    with pool.lease("a"):
+        with pool.lease("big"):
+            assert "a" not in pool and closed == ["retriever-b", "retriever-c"]
+        assert closed == ["retriever-b", "retriever-c"]
+    assert closed[-1] == "retriever-a"
+    stats = pool.stats()
+    assert stats["open"] == 1 and stats["evictions"] == 3 and stats["misses"] == 4
+
+    with pytest.raises(ValueError):
+        validate_tenant("../other")
+
+
+def _write_pdf(path, pages) -> None:
+    """Minimal PDF with one line of text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+            "/Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(out)
+
+
+def test_parallel_pdf_extraction_matches_loader_and_is_cached(tmp_path) -> None:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    pdf = tmp_path / "handbook.pdf"
+    _write_pdf(pdf, [f"Page number {i} of the handbook" for i in range(7)])
+    expected = PyPDFLoader(str(pdf)).load()
+    with PdfExtractor(workers=3, min_pages=2) as extractor:
+        docs = extractor.load(pdf)
+    assert [d.page_content for d in docs] == [d.page_content for d in expected]
+    assert [d.metadata for d in docs] == [d.metadata for d in expected]
+    assert docs[6].page_content == "Page number 6 of the handbook"
+
+    single = tmp_path / "single.pdf"
+    _write_pdf(single, ["Only page"])
+    for min_pages in (0, 1):
+        with PdfExtractor(workers=3, min_pages=min_pages) as extractor:
+            assert [d.page_content for d in extractor.load(single)] == ["Only page"]
+
+    cache = ParsedDocumentCache(tmp_path / "cache")
+    content_hash = file_sha256(pdf)
+    assert cache.get(pdf, content_hash, loader_version()) is None
+    cache.put(content_hash, loader_version(), docs, parse_s=0.5)
+    assert list((tmp_path / "cache").rglob("*.json.gz"))
+
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(pdf.read_bytes())
+    cached = cache.get(copy, file_sha256(copy), loader_version())
+    assert [d.page_content for d in cached] == [d.page_content for d in docs]
+    assert cached[0].metadata["source"] == str(copy)
+    assert cache.get(pdf, content_hash, "other-parser") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "saved_s": 0.5}
+
+
+def test_cleanup_plan_finds_superseded_duplicate_and_orphaned_chunks() -> None:
+    def md(source, run, source_type="md"):
+        return {"source": source, "source_type": source_type, "ingested_at": run}
+
+    texts = ["old a", "a1", "a1", "a2", "gone", "page"]
+    metadatas = [md("a.md", 1), md("a.md", 2), md("a.md", 2), md("a.md", 2), md("gone.md", 2), md("https://x.io", 1, "web")]
+    plan = plan_cleanup(texts, metadatas, exists=lambda source: source == "a.md")
+    assert (plan.keep, plan.superseded, plan.duplicates, plan.orphans) == ([1, 3, 5], [0], [2], [4])
+    assert plan.missing_sources == ["gone.md"] and plan.removed == 3
+
+    # Nothing local exists: probably the wrong working directory, so no orphans
+    plan = plan_cleanup(texts, metadatas, exists=lambda source: False)
+    assert plan.orphan_check_skipped and not plan.orphans
+
+    stats = index_stats(texts, metadatas)
+    assert stats["chunks"] == 6 and stats["sources"] == 3
+    assert stats["duplicate_ratio"] == round(1 / 6, 4)
+    assert stats["top_sources"][0] == ("a.md", 4)
+
+
+def test_hnsw_parameters_apply_to_new_collections(tmp_path) -> None:
+    from langchain_chroma import Chroma
+
+    from indexing.search import ChromaSearcher, hnsw_configuration
+
+    assert hnsw_configuration() is None
+    config = hnsw_configuration("cosine", m=8, ef_construction=50)
+    assert config == {"hnsw": {"space": "cosine", "max_neighbors": 8, "ef_construction": 50}}
+
+    store = Chroma("hnsw-test", persist_directory=str(tmp_path), collection_configuration=config)
+    store._collection.add(ids=["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+    stored = store._client.get_collection("hnsw-test").configuration_json["hnsw"]
+    searcher = ChromaSearcher(store)
+    hnsw = store._collection.configuration_json["hnsw"]
+    assert (hnsw["space"], hnsw["max_neighbors"], hnsw["ef_construction"]) == ("cosine", 8, 50)
+    # Opening a searcher never rewrites the stored configuration
+    assert store._client.get_collection("hnsw-test").configuration_json["hnsw"] == stored
+    assert searcher.space == "cosine"
+    assert searcher.search([1.0, 0.0], k=1)[0].document.id == "a"
+    searcher.close()
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+def test_watch_batches_debounced_changes(tmp_path, inotify) -> None:
+    import os
+    import threading
+    import time
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "old.md").write_text("old")
+    batches = []
+    stop = threading.Event()
+    watcher = InotifyWatcher([str(docs)]) if inotify else PollingWatcher(0.05)
+    thread = threading.Thread(
+        target=watch_files,
+        args=(lambda: sorted(str(p) for p in docs.rglob("*.md")), batches.append, watcher),
+        kwargs={"debounce_s": 0.3, "max_delay_s": 5.0, "stop": stop},
+    )
+    thread.start()
+    time.sleep(0.2)  # initial scan
+
+    def settle(count: int) -> None:
+        deadline = time.monotonic() + 5
+        while len(batches) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)  # nothing more may follow
+
+    try:
+        # A burst of changes, including a new subdirectory, is one batch
+        (docs / "a.md").write_text("a")
+        (docs / "sub").mkdir()
+        (docs / "sub" / "b.md").write_text("b")
+        (docs / "old.md").unlink()
+        settle(1)
+        assert len(batches) == 1
+        assert batches[0].added == [str(docs / "a.md"), str(docs / "sub" / "b.md")]
+        assert batches[0].deleted == [str(docs / "old.md")]
+
+        (docs / "a.md").write_text("a, edited")
+        settle(2)
+        assert len(batches) == 2 and batches[1].modified == [str(docs / "a.md")] and not batches[1].added
+
+        os.utime(docs / "a.md", ns=(1, 1))  # touched, same content
+        time.sleep(0.8)
+        assert len(batches) == 2
+    finally:
+        stop.set()
+        thread.join(5)
+    assert static_prefix("docs/**/*.md") == "docs"
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+
+import numpy as np
+import pytest
+
+import ingestion
+from indexing.jobs import read_active
+from indexing.quantization import QuantizedIndex
+
+
+class _HashEmbeddings:
+    """Deterministic stand-in for the embedding model (no network)."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(16).tolist()
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ingestion, "PERSIST_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(ingestion, "OPENAI_AVAILABLE", True)
+    monkeypatch.setattr(ingestion, "PARSE_CACHE", False)
+    monkeypatch.setattr(ingestion, "_embeddings", _HashEmbeddings)
+    # The tiktoken encoding cannot be downloaded here
+    splitter = ingestion.RecursiveCharacterTextSplitter
+    monkeypatch.setattr(splitter, "from_tiktoken_encoder", classmethod(lambda cls, **kw: cls(chunk_size=60, chunk_overlap=0)))
+    (tmp_path / "docs").mkdir()
+    return tmp_path / "index"
+
+
+def test_quantized_appends_swap_generations_and_retire_the_old_one(index_dir) -> None:
+    def shard_dir(collection: str) -> str:
+        return ingestion._quantized_dir(0, 1, collection)
+
+    for name in ("a", "b", "c"):
+        (index_dir.parent / "docs" / f"{name}.md").write_text(f"document {name} " * 20)
+
+    ingestion.build_index(["docs/a.md"], None, rebuild=True, storage="int8")
+    first = read_active(index_dir)["collection"]
+    ingestion.build_index(["docs/b.md"], None)
+    active = read_active(index_dir)
+    second = active["collection"]
+    # The append is a new generation; the one queries read before stays intact
+    assert second != first and active["retired"]["collection"] == first
+    assert {m["source"] for m in QuantizedIndex.load(shard_dir(second)).metadatas} == {"docs/a.md", "docs/b.md"}
+    assert {m["source"] for m in QuantizedIndex.load(shard_dir(first)).metadatas} == {"docs/a.md"}
+
+    # The next swap drops it
+    ingestion.build_index(["docs/c.md"], None)
+    assert read_active(index_dir)["retired"]["collection"] == second
+    assert not QuantizedIndex.exists(shard_dir(first)) and QuantizedIndex.exists(shard_dir(second))
+    third = QuantizedIndex.load(shard_dir(read_active(index_dir)["collection"]))
+    assert {m["source"] for m in third.metadatas} == {"docs/a.md", "docs/b.md", "docs/c.md"}
+
+
+def test_apply_file_changes_upserts_then_deletes(index_dir, monkeypatch) -> None:
+    docs = index_dir.parent / "docs"
+    (docs / "keep.md").write_text("unchanged text " * 10)
+    (docs / "edit.md").write_text("first version " * 10)
+    (docs / "gone.md").write_text("soon deleted " * 10)
+    ingestion.build_index(["docs/*.md"], None, rebuild=True)
+    collection = read_active(index_dir)["collection"]
+
+    def chunks():
+        data = ingestion._chroma(collection)._collection.get(include=["documents", "metadatas"])
+        return [(m["source"], text) for m, text in zip(data["metadatas"], data["documents"])]
+
+    before = chunks()
+    writes = []
+    upsert = ingestion._upsert
+
+    def recording_upsert(store, part, vectors):
+        # Old chunks of the edited file are still there when the new ones land
+        writes.append(sum(source == "docs/edit.md" for source, _ in chunks()))
+        upsert(store, part, vectors)
+
+    monkeypatch.setattr(ingestion, "_upsert", recording_upsert)
+    (docs / "edit.md").write_text("second version " * 10)
+    (docs / "gone.md").unlink()
+    stats = ingestion.apply_file_changes(["docs/edit.md"], ["docs/gone.md"])
+
+    after = chunks()
+    assert writes and writes[0] > 0
+    assert stats["collection"] == collection and stats["chunks_added"] > 0
+    assert stats["chunks_removed"] == sum(s in ("docs/edit.md", "docs/gone.md") for s, _ in before)
+    assert {s for s, _ in after} == {"docs/keep.md", "docs/edit.md"}
+    assert all("second" in text for s, text in after if s == "docs/edit.md")
+    assert [c for c in after if c[0] == "docs/keep.md"] == [c for c in before if c[0] == "docs/keep.md"]
+    assert not ingestion.ingest_lock.locked()
+
+
+def test_stats_work_without_full_precision_vectors(index_dir, monkeypatch) -> None:
+    monkeypatch.setattr(ingestion, "RESCORE_K", 0)  # keep only the reduced vectors
+    docs = index_dir.parent / "docs"
+    (docs / "a.md").write_text("same text " * 10)
+    (docs / "b.md").write_text("other text " * 10)
+    ingestion.build_index(["docs/*.md"], None, rebuild=True, storage="int8", dim=8)
+
+    report = ingestion.maintain_index()
+    before = report["before"]
+    assert before["stats"]["chunks"] > 0 and before["sizes"]["disk_bytes"] > 0
+    assert before["latency"] is None
+    with pytest.raises(ValueError, match="dimension-reduced"):
+        ingestion.maintain_index(compact=True)
+
+
+def test_search_ef_is_set_explicitly(index_dir) -> None:
+    (index_dir.parent / "docs" / "a.md").write_text("some text " * 10)
+    ingestion.build_index(["docs/a.md"], None, rebuild=True)
+    collection = read_active(index_dir)["collection"]
+
+    def ef_search():
+        return ingestion._chroma(collection)._collection.configuration_json["hnsw"]["ef_search"]
+
+    built = ef_search()
+    ingestion._build_retriever()
+    assert ef_search() == built
+    ingestion.set_hnsw_ef_search(40)
+    assert ef_search() == 40
+
+
+def test_pca_shards_share_one_basis(index_dir, monkeypatch) -> None:
+    monkeypatch.setattr(ingestion, "RESCORE_K", 0)  # results carry the reduced vectors
+    docs = index_dir.parent / "docs"
+    for i in range(6):
+        (docs / f"{i}.md").write_text(f"document number {i} " * 15)
+    ingestion.build_index([f"docs/{i}.md" for i in range(5)], None, rebuild=True, storage="int8", dim=4, reduction="pca", shards=2)
+
+    def components():
+        active = read_active(index_dir)
+        shards = [QuantizedIndex.load(ingestion._quantized_dir(s, 2, active["collection"])) for s in range(2)]
+        assert all(len(shard) for shard in shards)
+        return [shard.reducer.components for shard in shards]
+
+    first = components()
+    assert np.array_equal(first[0], first[1])
+    # Appending keeps the basis
+    ingestion.build_index(["docs/5.md"], None)
+    assert all(np.array_equal(c, first[0]) for c in components())
+
+
+def test_apply_file_changes_gives_up_when_generations_keep_swapping(index_dir, monkeypatch) -> None:
+    (index_dir.parent / "docs" / "a.md").write_text("some text " * 10)
+    ingestion.build_index(["docs/a.md"], None, rebuild=True)
+    calls = []
+
+    def swapped_meanwhile(changed, deleted, tag, tenant):
+        calls.append(changed)
+        return {"collection": f"replaced-{len(calls)}"}
+
+    monkeypatch.setattr(ingestion, "_apply_file_changes", swapped_meanwhile)
+    with pytest.raises(RuntimeError, match="replaced-3"):
+        ingestion.apply_file_changes(["docs/a.md"], [])
+    assert len(calls) == ingestion._SWAP_ATTEMPTS
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import threading
+
+from graph.graph import app
+from loadtest import StubProfile, _in_process_request, _server_request, run_load, stub_providers
+from server import QueryService, make_server
+
+
+def test_in_process_and_server_load_with_stub_providers() -> None:
+    profile = StubProfile(time_scale=0.01, web_fraction=0.5)
+    questions = ["what is agent memory?", "who won the cup?"]
+    with stub_providers(profile):
+        result = run_load(lambda q: _in_process_request(app, q), questions, concurrency=4, requests=8)
+        assert result["errors"] == 0 and result["requests"] == 8
+        assert result["throughput_qps"] > 0
+        assert {"route", "generate"} <= set(result["nodes_ms"])
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+
+        server = make_server("127.0.0.1", 0, QueryService())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}"
+            result = run_load(lambda q: _server_request(url, q), questions, concurrency=2, requests=4)
+        finally:
+            server.shutdown()
+        assert result["errors"] == 0
+        assert "generate" in result["nodes_ms"]
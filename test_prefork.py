@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from indexing.embedding_cache import CachedQueryEmbeddings
+from indexing.snapshot import write_snapshot
+
+ROOT = Path(__file__).resolve().parent
+
+
+def _wait_for(condition, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.2)
+    raise AssertionError("timed out")
+
+
+def _workers(base: str):
+    try:
+        with urllib.request.urlopen(base + "/health", timeout=5) as response:
+            workers = json.loads(response.read())["pool"]["workers"]
+    except OSError:
+        return None
+    return workers if all(w["heartbeat_age_s"] is not None for w in workers) else None
+
+
+def _start(tmp_path, env, *args):
+    """Run prefork.py with two workers; returns (process, log, base URL) once every worker is up."""
+    log = open(tmp_path / "prefork.log", "w")
+    parent = subprocess.Popen(
+        [sys.executable, "-u", str(ROOT / "prefork.py"), "--workers", "2", "--port", "0", *args],
+        cwd=tmp_path,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    try:
+        port = _wait_for(lambda: re.search(r"listening on http://127.0.0.1:(\d+)", (tmp_path / "prefork.log").read_text()))
+        base = f"http://127.0.0.1:{port.group(1)}"
+        _wait_for(lambda: _workers(base))
+    except BaseException:
+        parent.kill()
+        log.close()
+        raise
+    return parent, log, base
+
+
+def _query(base: str, payload: dict) -> dict:
+    request = urllib.request.Request(base + "/query", data=json.dumps(payload).encode(), method="POST")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+class _ChatEndpoint(BaseHTTPRequestHandler):
+    """Stand-in chat completions API: routes to the vector store and grades every answer "yes"."""
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        message = {"role": "assistant", "content": "Answer from the snapshot."}
+        if body.get("tools"):
+            arguments = json.dumps({"datasource": "vectorstore", "confidence": 1.0, "binary_score": "yes"})
+            call = {"id": "call", "type": "function", "function": {"name": body["tools"][0]["function"]["name"], "arguments": arguments}}
+            message = {"role": "assistant", "content": None, "tool_calls": [call]}
+        data = json.dumps(
+            {
+                "id": "completion",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-fork workers need os.fork")
+def test_prefork_serves_and_replaces_dead_workers(tmp_path) -> None:
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    parent, log, base = _start(tmp_path, env, "--heartbeat-timeout", "3")
+    try:
+        workers = _workers(base)
+        assert len(workers) == 2
+        assert "OFFLINE MODE" in _query(base, {"question": "q"})["generation"]
+
+        # A killed worker is replaced, and a stopped one is killed once its heartbeat is overdue
+        os.kill(workers[0]["pid"], signal.SIGKILL)
+        os.kill(workers[1]["pid"], signal.SIGSTOP)
+        old = {w["pid"] for w in workers}
+        replaced = _wait_for(lambda: (w := _workers(base)) and len(w) == 2 and not old & {x["pid"] for x in w} and w)
+        assert sorted(w["restarts"] for w in replaced) == [1, 1]
+
+        parent.send_signal(signal.SIGTERM)
+        assert parent.wait(timeout=30) == 0
+    finally:
+        if parent.poll() is None:
+            parent.kill()
+        log.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-fork workers need os.fork")
+def test_prefork_workers_search_the_mapped_snapshot(tmp_path) -> None:
+    vectors = np.random.default_rng(0).standard_normal((40, 8)).astype(np.float32)
+    sources = [f"docs/{'a' if i % 2 else 'b'}.md" for i in range(len(vectors))]
+    write_snapshot(
+        tmp_path / "index.snap",
+        [str(i) for i in range(len(vectors))],
+        [f"chunk {i}" for i in range(len(vectors))],
+        [{"source": s} for s in sources],
+        vectors,
+        model="test-embeddings",
+    )
+
+    # The question's vector comes from the query embedding cache; the
+    # embedding API is never called
+    class _Embeddings:
+        def embed_query(self, text):
+            return vectors[3].tolist()
+
+    CachedQueryEmbeddings(_Embeddings(), "test-embeddings", path=str(tmp_path / "embeddings.db")).embed_query("chunk 3?")
+
+    chat = ThreadingHTTPServer(("127.0.0.1", 0), _ChatEndpoint)
+    chat.daemon_threads = True
+    threading.Thread(target=chat.serve_forever, daemon=True).start()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-test",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{chat.server_port}/v1",
+        "RAGBOT_EMBEDDING_MODEL": "test-embeddings",
+        "RAGBOT_EMBED_CACHE_PATH": str(tmp_path / "embeddings.db"),
+    }
+    parent, log, base = _start(tmp_path, env, "--snapshot", "index.snap")
+    try:
+        result = _query(base, {"question": "chunk 3?", "filters": {"source": "docs/a.md"}})
+        assert result["generation"] == "Answer from the snapshot."
+        assert result["documents"][0]["page_content"] == "chunk 3"
+        assert {d["metadata"]["source"] for d in result["documents"]} == {"docs/a.md"}
+        assert _query(base, {"question": "chunk 3?"})["documents"][0]["page_content"] == "chunk 3"
+
+        parent.send_signal(signal.SIGTERM)
+        assert parent.wait(timeout=30) == 0
+    finally:
+        if parent.poll() is None:
+            parent.kill()
+        log.close()
+        chat.shutdown()
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rate_limit import BACKGROUND, INTERACTIVE, ModelLimiter, RateLimitedEmbeddings, RateLimiter, TokenBucket
+
+
+class _Endpoint(ThreadingHTTPServer):
+    """Stand-in provider: answers 429 above `max_concurrency` in flight or `per_second` requests."""
+
+    daemon_threads = True
+
+    def __init__(self, max_concurrency: int, per_second: float, latency_s: float):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(per_second * 60)
+        self.latency_s = latency_s
+        self.in_flight = self.ok = self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        server: _Endpoint = self.server
+        with server.lock:
+            allowed = server.in_flight < server.max_concurrency and server.bucket.reserve(1) == 0
+            if not allowed and server.bucket.tokens < 0:
+                server.bucket.tokens += 1  # a rejected request does not use up quota
+            server.in_flight += allowed
+            server.ok += allowed
+            server.rejected += not allowed
+        if not allowed:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.05")
+            self.end_headers()
+            return
+        time.sleep(server.latency_s)
+        with server.lock:
+            server.in_flight -= 1
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _serve(endpoint: _Endpoint) -> None:
+    threading.Thread(target=endpoint.serve_forever, daemon=True).start()
+
+
+def _get(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.read()
+
+
+def test_limiter_stays_under_provider_limits() -> None:
+    endpoint = _Endpoint(max_concurrency=16, per_second=100, latency_s=0.01)
+    _serve(endpoint)
+    try:
+        limiter = RateLimiter({"stand-in": (80 * 60, None)}, max_concurrency=8, initial_concurrency=8, backoff_s=0.01)
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(lambda _: limiter.call("stand-in", lambda: _get(endpoint.url)), range(60)))
+    finally:
+        endpoint.shutdown()
+    assert results == [b"ok"] * 60
+    assert endpoint.rejected == 0
+    assert limiter.stats()["stand-in"]["calls"] == 60
+
+
+def test_aimd_backs_off_on_429_and_retries() -> None:
+    endpoint = _Endpoint(max_concurrency=2, per_second=1000, latency_s=0.02)
+    _serve(endpoint)
+    try:
+        model = ModelLimiter(
+            "stand-in", max_concurrency=16, initial_concurrency=16, max_retries=50, backoff_s=0.01, decrease_cooldown_s=0.02
+        )
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(lambda _: model.call(lambda: _get(endpoint.url)), range(40)))
+    finally:
+        endpoint.shutdown()
+    assert results == [b"ok"] * 40
+    stats = model.stats()
+    assert stats["throttled"] == endpoint.rejected > 0
+    assert stats["concurrency_limit"] < 16
+
+
+def test_interactive_calls_go_before_background_and_embeddings_are_metered() -> None:
+    model = ModelLimiter("m", max_concurrency=1, initial_concurrency=1)
+    order, gate = [], threading.Event()
+    blocker = threading.Thread(target=model.call, args=(gate.wait,))
+    blocker.start()
+    while model.in_flight == 0:
+        time.sleep(0.001)
+
+    def run(name: str, level: int) -> None:
+        model.call(lambda: order.append(name), level=level)
+
+    threads = [threading.Thread(target=run, args=(f"background-{i}", BACKGROUND)) for i in range(3)]
+    threads.append(threading.Thread(target=run, args=("interactive", INTERACTIVE)))
+    for t in threads:
+        t.start()
+        time.sleep(0.01)
+    gate.set()
+    for t in [blocker, *threads]:
+        t.join()
+    assert order[0] == "interactive"
+
+    class Fake:
+        def embed_documents(self, texts):
+            return [[1.0]] * len(texts)
+
+        def embed_query(self, text):
+            return [1.0]
+
+    limiter = RateLimiter()
+    embeddings = RateLimitedEmbeddings(Fake(), "embed", limiter)
+    assert embeddings.embed_documents(["a", "b"]) == [[1.0], [1.0]]
+    assert embeddings.embed_query("a") == [1.0]
+    assert limiter.stats()["embed"]["calls"] == 2
+
+
+def test_transient_errors_are_retried_but_not_forever() -> None:
+    class ServerError(Exception):
+        status_code = 503
+
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ServerError()
+        return "ok"
+
+    model = ModelLimiter("m", transient_retries=2, backoff_s=0.001)
+    assert model.call(flaky) == "ok"
+    assert len(calls) == 3 and model.stats()["throttled"] == 0
+
+    class APITimeoutError(Exception):
+        pass
+
+    class OpenAITimeoutError(APITimeoutError):
+        pass
+
+    def timed_out_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OpenAITimeoutError()  # matched through its base class name
+        return "ok"
+
+    calls.clear()
+    assert model.call(timed_out_once) == "ok" and len(calls) == 2
+
+    def broken():
+        calls.append(1)
+        raise ConnectionResetError()
+
+    calls.clear()
+    with pytest.raises(ConnectionResetError):
+        model.call(broken)
+    assert len(calls) == 3
+
+    def invalid():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        model.call(invalid)
+    assert len(calls) == 1
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from server import QueryService, make_server
+
+
+class _SlowGraph:
+    """Stand-in for the compiled app that counts executions."""
+
+    def __init__(self, delay: float = 0.3):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, graph_input):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"question": graph_input["question"], "generation": "ok", "trace": ["slow"]}
+
+
+def _serve(service: QueryService):
+    server = make_server("127.0.0.1", 0, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _post(url: str, body: dict):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_query_and_stream_with_offline_graph() -> None:
+    server, base = _serve(QueryService())
+    try:
+        status, body = _post(base + "/query", {"question": "what is agent memory?"})
+        assert status == 200
+        assert "OFFLINE MODE" in json.loads(body)["generation"]
+        assert json.loads(body)["degraded"] == []
+
+        status, body = _post(base + "/query", {"question": "what is agent memory?", "deadline_s": 0.01})
+        result = json.loads(body)
+        assert status == 200 and result["deadline"]["budget_s"] == 0.01
+        assert "routing skipped: answered from the vector store" in result["degraded"]
+        assert _post(base + "/query", {"question": "q", "deadline_s": "soon"})[0] == 400
+        status, body = _post(base + "/query", {"question": "q", "filters": {"sorce": "a.md"}})
+        assert status == 400 and "sorce" in json.loads(body)["error"]
+        assert _post(base + "/query/stream", {"question": "q", "filters": {"ingested_after": "last week"}})[0] == 400
+
+        status, body = _post(base + "/query/stream", {"question": "what is agent memory?"})
+        events = [json.loads(line) for line in body.splitlines()]
+        assert status == 200
+        assert events[-1]["event"] == "result"
+        assert [e["node"] for e in events[:-1]][-1] == "generate"
+
+        with urllib.request.urlopen(base + "/health", timeout=10) as response:
+            assert json.loads(response.read())["in_flight"] == 0
+    finally:
+        server.shutdown()
+
+
+def test_identical_questions_share_one_execution() -> None:
+    graph = _SlowGraph()
+    server, base = _serve(QueryService(graph=graph))
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda q: _post(base + "/query", {"question": q}), ["Hi  there"] * 3 + ["hi there"]))
+        assert all(status == 200 for status, _ in results)
+        assert graph.calls == 1
+        assert sum(json.loads(body)["coalesced"] for _, body in results) == 3
+    finally:
+        server.shutdown()
+
+
+def test_overload_returns_503() -> None:
+    graph = _SlowGraph()
+    server, base = _serve(QueryService(graph=graph, max_concurrency=1, max_queue=0))
+    try:
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(_post, base + "/query", {"question": "first"})
+            time.sleep(0.1)
+            second = pool.submit(_post, base + "/query", {"question": "second"})
+            assert second.result()[0] == 503
+            assert first.result()[0] == 200
+    finally:
+        server.shutdown()
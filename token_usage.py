@@ -0,0 +1,206 @@
+"""
+token_usage.py - Token and cost accounting for chain and embedding calls
+
+Every chain invocation reports the prompt and completion tokens it used to
+the recorder of the current request. Real calls report the provider's
+usage metadata. Offline stand-in chains and stubs report a tiktoken
+estimate of their inputs and output, flagged as estimated. Calls are
+attributed to the LangGraph node they ran in. The entry router shows up as
+"route", and the hallucination check runs inside "generate".
+
+    with track_usage() as usage:
+        result = app.invoke({"question": "..."})
+    print(format_usage(usage.report()))
+
+A recorder is thread-safe and can be shared by many requests (load tests,
+interactive sessions); merge() adds up the report of another run.
+
+Cost uses USD per million prompt / completion tokens. Defaults are built in
+and can be overridden with
+RAGBOT_MODEL_PRICES="gpt-4=30:60,text-embedding-ada-002=0.1:0".
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+DEFAULT_PRICES = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "text-embedding-ada-002": (0.1, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+
+def _parse_prices(text: str) -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        model, sep, values = item.partition("=")
+        prompt, _, completion = values.partition(":")
+        if not sep or not prompt:
+            raise ValueError(f"Bad model price {item!r}; expected model=prompt:completion")
+        prices[model.strip()] = (float(prompt), float(completion or 0))
+    return prices
+
+
+MODEL_PRICES = {**DEFAULT_PRICES, **_parse_prices(os.getenv("RAGBOT_MODEL_PRICES", ""))}
+
+_recorder: contextvars.ContextVar[Optional["UsageRecorder"]] = contextvars.ContextVar("usage_recorder", default=None)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """tiktoken count for `model`, falling back to ~4 characters per token when encodings are unavailable."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text))
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def current_node() -> str:
+    """The LangGraph node the caller runs in ("route" for the entry router), or "-" outside a graph."""
+    try:
+        from langgraph.config import get_config
+
+        node = get_config().get("metadata", {}).get("langgraph_node", "-")
+    except Exception:
+        return "-"
+    return "route" if node == "__start__" else node
+
+
+class UsageRecorder:
+    """Per (node, chain, model) call and token counters."""
+
+    _FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_calls", "estimated_calls")
+
+    def __init__(self):
+        self._rows: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        node: str,
+        chain: str,
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_calls: int = 0,
+        estimated_calls: int = 0,
+        calls: int = 1,
+    ) -> None:
+        with self._lock:
+            row = self._rows.setdefault((node, chain, model), dict.fromkeys(self._FIELDS, 0))
+            row["calls"] += calls
+            row["prompt_tokens"] += prompt_tokens
+            row["completion_tokens"] += completion_tokens
+            row["cached_calls"] += cached_calls
+            row["estimated_calls"] += estimated_calls
+
+    def merge(self, report: Dict[str, Any]) -> None:
+        """Add the rows of another recorder's report()."""
+        for row in report.get("rows", []):
+            self.add(**{k: row[k] for k in ("node", "chain", "model", *self._FIELDS)})
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = [{"node": n, "chain": c, "model": m, **dict(r)} for (n, c, m), r in self._rows.items()]
+        for row in rows:
+            row["cost_usd"] = cost_usd(row["model"], row["prompt_tokens"], row["completion_tokens"])
+
+        def group(key: str) -> Dict[str, Dict[str, Any]]:
+            out: Dict[str, Dict[str, Any]] = {}
+            for row in rows:
+                agg = out.setdefault(row[key], {**dict.fromkeys(self._FIELDS, 0), "cost_usd": 0.0})
+                for field in (*self._FIELDS, "cost_usd"):
+                    agg[field] += row[field]
+            return out
+
+        total = {**dict.fromkeys(self._FIELDS, 0), "cost_usd": 0.0}
+        for row in rows:
+            for field in total:
+                total[field] += row[field]
+        total["total_tokens"] = total["prompt_tokens"] + total["completion_tokens"]
+        return {**total, "nodes": group("node"), "chains": group("chain"), "rows": rows}
+
+
+@contextlib.contextmanager
+def track_usage(recorder: Optional[UsageRecorder] = None) -> Iterator[UsageRecorder]:
+    """Record the usage of calls made in this context (LangGraph copies it into node threads)."""
+    recorder = recorder if recorder is not None else UsageRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def record_usage(chain: str, model: str, prompt_tokens: int, completion_tokens: int, cached: bool = False, estimated: bool = False) -> None:
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.add(
+            current_node(), chain, model, prompt_tokens, completion_tokens,
+            cached_calls=int(cached), estimated_calls=int(estimated),
+        )
+
+
+def record_estimate(chain: str, model: str, prompt: Any, completion: Any) -> None:
+    """Record a tiktoken estimate (offline stand-ins, stubs, providers that report no usage)."""
+    if _recorder.get() is None:
+        return
+    record_usage(chain, model, count_tokens(_text(prompt), model), count_tokens(_text(completion), model), estimated=True)
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(_text(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_text(v) for v in value)
+    if hasattr(value, "page_content"):
+        return value.page_content
+    if hasattr(value, "model_dump_json"):
+        return value.model_dump_json()
+    return str(value)
+
+
+def format_usage(report: Dict[str, Any], requests: int = 1) -> str:
+    """Per-node table (per request when `requests` > 1) plus the total."""
+    per = f" per request (avg of {requests})" if requests > 1 else ""
+    lines = [f"{'node':<18}{'calls':>7}{'prompt':>9}{'compl.':>9}{'cost $':>10}{per}"]
+    for name, s in [*report["nodes"].items(), ("total", report)]:
+        lines.append(
+            f"{name:<18}{s['calls'] / requests:>7.1f}{s['prompt_tokens'] / requests:>9.0f}"
+            f"{s['completion_tokens'] / requests:>9.0f}{s['cost_usd'] / requests:>10.4f}"
+        )
+    notes = []
+    if report["estimated_calls"]:
+        notes.append(f"{report['estimated_calls']} of {report['calls']} calls estimated with tiktoken")
+    if report["cached_calls"]:
+        notes.append(f"{report['cached_calls']} served from the LLM cache")
+    if notes:
+        lines.append("(" + "; ".join(notes) + ")")
+    return "\n".join(lines)